@@ -1,6 +1,10 @@
+import fakeredis
 import pytest
+from django.core.cache import cache
+from django.urls import reverse
 from rest_framework.test import APIClient
 
+from apps.jwt_auth.token_store import token_store
 from apps.products.tests.factories import (
     CategoryFactory,
     ImageFactory,
@@ -27,11 +31,74 @@ def mock_image_save(monkeypatch):
     )
 
 
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """Store the files written by the test in a temporary MEDIA_ROOT."""
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def run_background_jobs_inline(settings):
+    """
+    Run the work done after a commit in the test's own thread: the test
+    transaction is never committed, so other threads and processes would
+    not see its data.
+    """
+    settings.IMAGE_VARIANT_WORKERS = 0
+    settings.FILE_CLEANUP_IN_BACKGROUND = False
+
+
+@pytest.fixture
+def clear_cache():
+    """
+    Start and finish the test with an empty cache, so versioned entries
+    left by other tests, whose writes were rolled back, are not served.
+    """
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
 
 
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Point the refresh token store at an in-memory Redis of its own, so its
+    tests start empty and need no server.
+    """
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(token_store, "client", client)
+    return client
+
+
+@pytest.fixture
+def user_password():
+    return "x9-Florist-pass"
+
+
+@pytest.fixture
+def user(django_user_model, user_password):
+    return django_user_model.objects.create_user(
+        username="florist", email="florist@example.com", password=user_password
+    )
+
+
+@pytest.fixture
+def logged_in_client(api_client, user, user_password):
+    """An API client holding the JWT cookies of `user`."""
+    response = api_client.post(
+        reverse("auth:login"),
+        {"username": user.username, "password": user_password},
+    )
+    assert response.status_code == 200
+    return api_client
+
+
 @pytest.fixture
 def product(db):
     return ProductFactory()
@@ -77,7 +144,7 @@ def product_serializer_write_data(db, image_no_save_file) -> dict:
 
 
 @pytest.fixture
-def image(db):
+def image(db, media_root):
     return ImageFactory()
 
 
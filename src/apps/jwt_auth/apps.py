@@ -7,3 +7,4 @@ class AuthConfig(AppConfig):
 
     def ready(self):
         import apps.jwt_auth.schema  # noqa
+        import apps.jwt_auth.signals  # noqa
@@ -0,0 +1,27 @@
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.jwt_auth.user_cache import user_cache
+
+
+class CachedJWTCookieAuthentication(JWTCookieAuthentication):
+    """
+    `JWTCookieAuthentication` taking the user of the token from
+    `apps.jwt_auth.user_cache` rather than from the database.
+
+        Only active users are cached, a user that is deactivated or deleted
+    is dropped from the cache and then rejected by simplejwt as before.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or api_settings.CHECK_REVOKE_TOKEN:
+            # Rejected by simplejwt, or checked against the password hash,
+            # which is not cached
+            return super().get_user(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            version = user_cache.get_version(user_id)
+            user = super().get_user(validated_token)
+            user_cache.set(user, version)
+        return user
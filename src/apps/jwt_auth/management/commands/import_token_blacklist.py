@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from redis.exceptions import RedisError
+
+from apps.jwt_auth.token_store import token_store
+
+# The tables of simplejwt's token_blacklist app, read directly so they can
+# be imported once the app is no longer installed
+BLACKLISTED_TABLE = "token_blacklist_blacklistedtoken"
+OUTSTANDING_TABLE = "token_blacklist_outstandingtoken"
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the unexpired refresh tokens revoked in the token_blacklist "
+        "tables to the Redis token store, and drop the tables with --drop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the token_blacklist tables and forget their "
+            "migrations once the tokens are imported",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tokens read and revoked together",
+        )
+
+    def handle(self, *args, **options):
+        tables = set(connection.introspection.table_names())
+        if not {BLACKLISTED_TABLE, OUTSTANDING_TABLE} <= tables:
+            raise CommandError("There are no token_blacklist tables.")
+
+        found = revoked = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT outstanding.jti,
+                       EXTRACT(EPOCH FROM outstanding.expires_at)::bigint
+                FROM {BLACKLISTED_TABLE} blacklisted
+                JOIN {OUTSTANDING_TABLE} outstanding
+                  ON outstanding.id = blacklisted.token_id
+                WHERE outstanding.expires_at > NOW()
+                """
+            )
+            while batch := cursor.fetchmany(options["batch_size"]):
+                found += len(batch)
+                try:
+                    revoked += token_store.revoke_many(batch)
+                except RedisError as error:
+                    # Before the tables are dropped
+                    raise CommandError(f"Revoking failed: {error}")
+        summary = f"Imported {found} revoked tokens, {revoked} new"
+
+        if options["drop"]:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DROP TABLE {BLACKLISTED_TABLE}, {OUTSTANDING_TABLE}"
+                )
+                cursor.execute(
+                    "DELETE FROM django_migrations WHERE app = %s",
+                    ["token_blacklist"],
+                )
+            summary += ", dropped the tables"
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -22,15 +22,10 @@ class MoveJWTCookieIntoTheBody(MiddlewareMixin):
     for Django Rest Framework JWT's POST "/token-verify" endpoint --- check
     for an access token in the request.COOKIES and if, add it to the body
     payload.
-    """
-
-    def __init__(self, get_response):  # noqa
-        self.get_response = get_response
 
-    def __call__(self, request):
-        # sourcery skip: inline-immediately-returned-variable
-        response = self.get_response(request)
-        return response
+        Only `process_view` is defined, so `MiddlewareMixin` runs the
+    middleware as sync or async as the rest of the stack.
+    """
 
     def process_view(self, request, view_func, *view_args, **view_kwargs):
         # sourcery skip: remove-pass-body, remove-redundant-pass,
@@ -67,13 +67,15 @@ logout_response_serializer = OpenApiResponse(
 
 class LogoutViewSchema(OpenApiViewExtension):
     target_class = "dj_rest_auth.views.LogoutView"
+    match_subclasses = True
 
     def view_replacement(self):
         @extend_schema_view(
             post=extend_schema(
                 summary="Invalidate JWT Token and log out",
                 description="""This endpoint also clears the `access-token`
-                and `refresh-token` cookies from the client's browser.
+                and `refresh-token` cookies from the client's browser, and
+                revokes the refresh token.
                 <br>
                 After successful logout, the client should no longer have
                 access to protected resources until a new valid token is
@@ -0,0 +1,32 @@
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.serializers import TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from apps.jwt_auth.token_store import token_store
+from apps.jwt_auth.tokens import StoredRefreshToken
+
+
+class RefreshSerializer(CookieTokenRefreshSerializer):
+    """
+    `CookieTokenRefreshSerializer` rotating the refresh tokens revoked in
+    `apps.jwt_auth.token_store`.
+    """
+
+    token_class = StoredRefreshToken
+
+
+class VerifySerializer(TokenVerifySerializer):
+    """`TokenVerifySerializer` rejecting the revoked refresh tokens."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        token = UntypedToken(attrs["token"])
+        token_type = token.get(api_settings.TOKEN_TYPE_CLAIM)
+        jti = token.get(api_settings.JTI_CLAIM)
+        if token_type == StoredRefreshToken.token_type and (
+            token_store.is_revoked(jti)
+        ):
+            raise ValidationError("Token is blacklisted")
+        return data
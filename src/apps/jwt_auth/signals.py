@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.jwt_auth.user_cache import user_cache
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(user_logged_out)
+def invalidate_cached_user(sender, **kwargs):
+    """
+    Drop the cached user once the transaction that saved or deleted it
+    commits, among others on a password change, and when it logs out.
+    Done before the commit, a concurrent request could cache the row about
+    to be replaced under the new token version.
+    """
+    user = kwargs.get("instance", kwargs.get("user"))
+    if user is None:
+        return
+    user_id = getattr(user, api_settings.USER_ID_FIELD)
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
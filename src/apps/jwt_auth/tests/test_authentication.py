@@ -0,0 +1,191 @@
+import pytest
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.jwt_auth.user_cache import UserCache, user_cache
+
+
+def count_user_queries(queries):
+    return sum('"auth_user"' in query["sql"] for query in queries)
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache(clear_cache):
+    user_cache.clear_local()
+    yield
+    user_cache.clear_local()
+
+
+@pytest.mark.django_db
+class TestCachedAuthentication:
+    def test_cached_user_skips_the_query(self, logged_in_client):
+        url = reverse("auth:user-details")
+        logged_in_client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = logged_in_client.get(url)
+
+        assert response.status_code == 200
+        assert response.data["username"] == "florist"
+        assert count_user_queries(queries) == 0
+
+    def test_redis_entry_is_used_by_other_processes(self, logged_in_client):
+        url = reverse("auth:user-details")
+        logged_in_client.get(url)
+        user_cache.clear_local()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = logged_in_client.get(url)
+
+        assert response.status_code == 200
+        assert count_user_queries(queries) == 0
+
+    def test_update_keeps_the_password(
+        self,
+        logged_in_client,
+        user,
+        user_password,
+        django_capture_on_commit_callbacks,
+    ):
+        url = reverse("auth:user-details")
+        logged_in_client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = logged_in_client.patch(url, {"first_name": "Rose"})
+
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.first_name == "Rose"
+        assert user.check_password(user_password)
+        assert logged_in_client.get(url).data["first_name"] == "Rose"
+
+    def test_password_change_invalidates(
+        self, logged_in_client, user, django_capture_on_commit_callbacks
+    ):
+        url = reverse("auth:user-details")
+        logged_in_client.get(url)
+        password = "y8-Florist-pass"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = logged_in_client.post(
+                reverse("auth:password_change"),
+                {"new_password1": password, "new_password2": password},
+            )
+
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.check_password(password)
+        assert user_cache.get(user.pk) is None
+
+    def test_logout_invalidates(
+        self, logged_in_client, user, django_capture_on_commit_callbacks
+    ):
+        logged_in_client.get(reverse("auth:user-details"))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = logged_in_client.post(reverse("auth:logout"))
+
+        assert response.status_code == 200
+        assert user_cache.get(user.pk) is None
+
+    def test_deactivated_user_is_rejected(
+        self,
+        api_client,
+        logged_in_client,
+        user,
+        django_capture_on_commit_callbacks,
+    ):
+        url = reverse("auth:user-details")
+        token = logged_in_client.cookies["access-token"].value
+        logged_in_client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_active = False
+            user.save()
+
+        api_client.cookies["access-token"] = token
+        assert api_client.get(url).status_code == 401
+
+    def test_change_during_the_load_is_not_cached_over(
+        self, logged_in_client, user, monkeypatch
+    ):
+        get_user = JWTCookieAuthentication.get_user
+
+        def get_user_then_deactivate(self, validated_token):
+            loaded = get_user(self, validated_token)
+            # Committed by another request once the row is loaded
+            user.is_active = False
+            user.save()
+            user_cache.invalidate(user.pk)
+            return loaded
+
+        monkeypatch.setattr(
+            JWTCookieAuthentication, "get_user", get_user_then_deactivate
+        )
+        url = reverse("auth:user-details")
+        assert logged_in_client.get(url).status_code == 200
+        monkeypatch.undo()
+
+        assert user_cache.get(user.pk) is None
+        assert logged_in_client.get(url).status_code == 401
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_cache")
+class TestUserCache:
+    def test_password_is_not_cached(
+        self, user, user_password, django_assert_num_queries
+    ):
+        cache = UserCache()
+        cache.set(user, cache.get_version(user.pk))
+
+        cached = cache.get(user.pk)
+
+        assert cached.username == user.username
+        assert "password" in cached.get_deferred_fields()
+        with django_assert_num_queries(1):
+            assert cached.check_password(user_password)
+
+    def test_local_cache_is_bounded(self, settings, django_user_model):
+        settings.JWT_USER_LOCAL_CACHE_SIZE = 2
+        cache = UserCache()
+        users = [
+            django_user_model.objects.create_user(username=f"user-{i}")
+            for i in range(3)
+        ]
+        for user in users:
+            cache.set(user, cache.get_version(user.pk))
+
+        assert cache._get_local(users[0].pk) is None
+        assert cache._get_local(users[2].pk) is not None
+
+    def test_local_entries_expire(self, settings, user):
+        settings.JWT_USER_LOCAL_CACHE_TIMEOUT = 0
+        cache = UserCache()
+        cache.set(user, cache.get_version(user.pk))
+
+        assert cache._get_local(user.pk) is None
+        assert cache.get(user.pk).pk == user.pk
+
+    def test_bulk_update_is_invalidated_by_id(self, django_user_model):
+        cache = UserCache()
+        users = [
+            django_user_model.objects.create_user(username=f"user-{i}")
+            for i in range(2)
+        ]
+        for user in users:
+            cache.set(user, cache.get_version(user.pk))
+
+        django_user_model.objects.update(is_active=False)
+        cache.invalidate_many([user.pk for user in users])
+
+        assert all(cache.get(user.pk) is None for user in users)
+
+    def test_entries_expire_with_the_access_token(self, settings):
+        lifetime = settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]
+        settings.JWT_USER_CACHE_TIMEOUT = 2 * lifetime.total_seconds()
+        cache = UserCache()
+
+        assert cache.timeout == lifetime.total_seconds()
@@ -0,0 +1,147 @@
+from io import StringIO
+
+import fakeredis
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+
+from apps.jwt_auth.token_store import token_store
+from apps.jwt_auth.tokens import StoredRefreshToken
+
+REFRESH_COOKIE = settings.REST_AUTH["JWT_AUTH_REFRESH_COOKIE"]
+
+
+def refresh(client, token=None):
+    data = {} if token is None else {"refresh": token}
+    return client.post(reverse("auth:token-refresh"), data, format="json")
+
+
+def get_jti(token):
+    return StoredRefreshToken(token, verify=False)["jti"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("fake_redis")
+class TestRefreshTokenRotation:
+    def test_refresh_rotates_the_token(self, logged_in_client, fake_redis):
+        token = logged_in_client.cookies[REFRESH_COOKIE].value
+
+        response = refresh(logged_in_client)
+
+        assert response.status_code == 200
+        assert response.cookies[REFRESH_COOKIE].value != token
+        ttl = fake_redis.ttl(token_store.make_key(get_jti(token)))
+        lifetime = settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"]
+        assert 0 < ttl <= lifetime.total_seconds()
+
+    def test_rotated_token_is_rejected(self, logged_in_client):
+        token = logged_in_client.cookies[REFRESH_COOKIE].value
+        refresh(logged_in_client)
+
+        assert refresh(logged_in_client, token).status_code == 401
+        assert refresh(logged_in_client).status_code == 200
+
+    def test_refresh_makes_no_queries(self, logged_in_client):
+        with CaptureQueriesContext(connection) as queries:
+            response = refresh(logged_in_client)
+
+        assert response.status_code == 200
+        assert len(queries) == 0
+
+    def test_token_is_revoked_once(self, user):
+        token = StoredRefreshToken.for_user(user)
+
+        token.blacklist()
+
+        with pytest.raises(TokenError):
+            token.blacklist()
+
+    def test_unreachable_redis_refuses_refresh(
+        self, logged_in_client, monkeypatch
+    ):
+        server = fakeredis.FakeServer()
+        server.connected = False
+        monkeypatch.setattr(
+            token_store, "client", fakeredis.FakeRedis(server=server)
+        )
+
+        assert refresh(logged_in_client).status_code == 401
+
+    def test_logout_revokes_the_token(self, logged_in_client):
+        token = logged_in_client.cookies[REFRESH_COOKIE].value
+
+        response = logged_in_client.post(reverse("auth:logout"))
+
+        assert response.status_code == 200
+        assert token_store.is_revoked(get_jti(token))
+        assert refresh(logged_in_client, token).status_code == 401
+
+    def test_verify_rejects_revoked_token(self, logged_in_client):
+        token = logged_in_client.cookies[REFRESH_COOKIE].value
+        refresh(logged_in_client)
+
+        response = APIClient().post(
+            reverse("auth:token-verify"), {"token": token}, format="json"
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.fixture
+def blacklist_tables(db):
+    """The tables of simplejwt's token_blacklist app, with three tokens."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE token_blacklist_outstandingtoken (
+                id bigserial PRIMARY KEY,
+                jti varchar(255) UNIQUE NOT NULL,
+                expires_at timestamp with time zone NOT NULL
+            );
+            CREATE TABLE token_blacklist_blacklistedtoken (
+                id bigserial PRIMARY KEY,
+                token_id bigint UNIQUE NOT NULL
+                    REFERENCES token_blacklist_outstandingtoken (id)
+            );
+            INSERT INTO token_blacklist_outstandingtoken (jti, expires_at)
+            VALUES ('revoked', NOW() + interval '1 day'),
+                   ('expired', NOW() - interval '1 day'),
+                   ('outstanding', NOW() + interval '1 day');
+            INSERT INTO token_blacklist_blacklistedtoken (token_id)
+            SELECT id FROM token_blacklist_outstandingtoken
+            WHERE jti IN ('revoked', 'expired');
+            """
+        )
+
+
+@pytest.mark.usefixtures("fake_redis", "blacklist_tables")
+class TestImportTokenBlacklist:
+    def test_unexpired_revoked_tokens_are_imported(self):
+        out = StringIO()
+
+        call_command("import_token_blacklist", stdout=out)
+
+        assert token_store.is_revoked("revoked")
+        assert not token_store.is_revoked("expired")
+        assert not token_store.is_revoked("outstanding")
+        assert "Imported 1 revoked tokens, 1 new" in out.getvalue()
+
+    def test_tables_are_dropped(self):
+        call_command("import_token_blacklist", "--drop", stdout=StringIO())
+
+        tables = connection.introspection.table_names()
+        assert "token_blacklist_outstandingtoken" not in tables
+        assert "token_blacklist_blacklistedtoken" not in tables
+        assert token_store.is_revoked("revoked")
+
+
+@pytest.mark.django_db
+def test_import_without_tables():
+    with pytest.raises(CommandError):
+        call_command("import_token_blacklist", stdout=StringIO())
@@ -0,0 +1,91 @@
+"""
+Redis store of the revoked refresh tokens.
+
+With `ROTATE_REFRESH_TOKENS` every refresh hands out a new refresh token,
+and with `BLACKLIST_AFTER_ROTATION` the one it was given is revoked so it
+can't be used again. simplejwt keeps the revoked tokens in the database
+with its `token_blacklist` app: a write per refresh and per login, and
+tables that only grow until they are pruned. `RefreshTokenStore` keeps
+them in Redis instead, one key per token id, set to expire with the token:
+- `revoke` sets the key only if it isn't set yet, so of two requests
+  refreshing with the same token only one gets a new pair,
+- `is_revoked` checks that the key exists.
+    Nothing is stored when a token is issued, and expired tokens go away
+on their own. `StoredRefreshToken` in `apps.jwt_auth.tokens` is the token
+checked against the store, and the `import_token_blacklist` command moves
+the tokens revoked in the database to it.
+    The store fails closed: while Redis can't be reached every token is
+taken as revoked, refusing the refreshes rather than letting a revoked
+token through.
+"""
+import logging
+import time
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenStore:
+    """
+    Revoked refresh tokens, by token id.
+
+    Attributes:
+        prefix: The prefix of the keys, followed by the token id.
+        alias: The cache whose Redis server keeps the keys.
+        client: The Redis client used instead of the one of `alias` when
+         set, e.g. a fake one in tests.
+    """
+
+    def __init__(self, prefix="jwt-auth:revoked-refresh", alias="default"):
+        self.prefix = prefix
+        self.alias = alias
+        self.client = None
+
+    def get_client(self):
+        if self.client is not None:
+            return self.client
+        return get_redis_connection(self.alias)
+
+    def make_key(self, jti):
+        return f"{self.prefix}:{jti}"
+
+    def is_revoked(self, jti):
+        """Return whether the token `jti` is revoked."""
+        try:
+            return bool(self.get_client().exists(self.make_key(jti)))
+        except RedisError:
+            logger.warning("Checking a refresh token failed", exc_info=True)
+            return True
+
+    def revoke(self, jti, exp):
+        """
+        Revoke the token `jti` until its expiration time `exp`, a Unix
+        timestamp. Return False when it was revoked already, or when Redis
+        can't be reached.
+        """
+        try:
+            return self.revoke_many([(jti, exp)]) == 1
+        except RedisError:
+            logger.warning("Revoking a refresh token failed", exc_info=True)
+            return False
+
+    def revoke_many(self, tokens):
+        """
+        Revoke the `(jti, exp)` pairs of `tokens` and return how many were
+        not revoked yet. Expired tokens are counted without being stored.
+        Unlike the methods above it raises the errors of Redis.
+        """
+        now = int(time.time())
+        revoked = 0
+        pipeline = self.get_client().pipeline(transaction=False)
+        for jti, exp in tokens:
+            if exp <= now:
+                revoked += 1
+                continue
+            pipeline.set(self.make_key(jti), 1, ex=exp - now, nx=True)
+        return revoked + sum(map(bool, pipeline.execute()))
+
+
+token_store = RefreshTokenStore()
@@ -0,0 +1,24 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.jwt_auth.token_store import token_store
+
+
+class StoredRefreshToken(RefreshToken):
+    """
+    `RefreshToken` revoked in `apps.jwt_auth.token_store` rather than in
+    the blacklist tables of simplejwt.
+    """
+
+    def verify(self):
+        # Expired tokens are rejected before Redis is asked
+        super().verify()
+        if token_store.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        """Revoke the token, raising `TokenError` if it already was."""
+        if not token_store.revoke(self[api_settings.JTI_CLAIM], self["exp"]):
+            raise TokenError(_("Token is blacklisted"))
@@ -1,12 +1,7 @@
-from dj_rest_auth.jwt_auth import get_refresh_view
-from dj_rest_auth.views import (
-    LoginView,
-    LogoutView,
-    PasswordChangeView,
-    UserDetailsView,
-)
+from dj_rest_auth.views import LoginView, PasswordChangeView, UserDetailsView
 from django.urls import path
-from rest_framework_simplejwt.views import TokenVerifyView
+
+from apps.jwt_auth.views import LogoutView, RefreshView, VerifyView
 
 app_name = "jwt-auth"
 urlpatterns = [
@@ -20,12 +15,12 @@ urlpatterns = [
     path("api/auth/user/", UserDetailsView.as_view(), name="user-details"),
     path(
         "api/auth/token/verify/",
-        TokenVerifyView.as_view(),
+        VerifyView.as_view(),
         name="token-verify",
     ),
     path(
         "api/auth/token/refresh/",
-        get_refresh_view().as_view(),
+        RefreshView.as_view(),
         name="token-refresh",
     ),
 ]
@@ -0,0 +1,167 @@
+"""
+Cache of the users authenticated by their access token.
+
+simplejwt loads the user of every authenticated request from the database
+once the token is validated, see `CachedJWTCookieAuthentication` in
+`apps.jwt_auth.authentication`. `UserCache` keeps the field values of the
+users it loaded at two levels:
+- in the process, for `JWT_USER_LOCAL_CACHE_TIMEOUT` seconds and at most
+  `JWT_USER_LOCAL_CACHE_SIZE` users, the least recently used going first,
+- in Redis, for `JWT_USER_CACHE_TIMEOUT` seconds but no longer than the
+  lifetime of an access token, under the user id along with the token
+  version of the user it was cached at.
+    The token version is bumped by the signal handlers of
+`apps.jwt_auth.signals` when the user is saved, its password and active
+flag included, and when it logs out. A Redis entry is only used while its
+version is the current one, the two are read with a single multi-get, so
+the bump drops it for every process at once. The entry in the memory of
+the process doing the write is dropped with it, the other processes may
+serve theirs until it expires, which is why it is kept for a few seconds
+only.
+    Writes that send no signals, like `update()` on a queryset of users,
+leave the cached users as they were: the code making them has to call
+`invalidate_many` with their ids once it commits. Otherwise a user
+deactivated that way still authenticates until its entry expires, at most
+the lifetime of the access token it was cached for.
+    The password hash is never cached: the users are rebuilt with the
+password deferred, so it is loaded only when it is checked or changed,
+and saving such a user leaves the column alone.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.products.cache import bump_version, get_version
+
+# The password hash stays out of the cache
+UNCACHED_FIELDS = {"password"}
+
+
+class UserCache:
+    """
+    Users cached by the value of `USER_ID_FIELD`, the id their tokens
+    carry.
+
+    Attributes:
+        prefix: The prefix of the cache keys.
+    """
+
+    def __init__(self, prefix="jwt-auth"):
+        self.prefix = prefix
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_version_key(self, user_id):
+        return f"{self.prefix}:token-version:{user_id}"
+
+    def make_key(self, user_id):
+        return f"{self.prefix}:user:{user_id}"
+
+    def get(self, user_id):
+        """Return the cached user of `user_id`, or None."""
+        values = self._get_local(user_id)
+        if values is None:
+            key, version_key = (
+                self.make_key(user_id),
+                self.get_version_key(user_id),
+            )
+            found = cache.get_many([key, version_key])
+            version, values = found.get(key, (None, None))
+            if version is None or version != found.get(version_key):
+                return None
+            self._set_local(user_id, values)
+        return self._build(values)
+
+    def get_version(self, user_id):
+        """Return the current token version of `user_id`."""
+        return get_version(self.get_version_key(user_id))
+
+    def set(self, user, version):
+        """
+        Cache `user` under `version`, the token version read before the
+        user was loaded from the database.
+
+            Read after, the version could already be the one bumped by a
+        change committed in between, and the row loaded before the change
+        would then be served under it.
+        """
+        user_id = getattr(user, api_settings.USER_ID_FIELD)
+        values = {
+            field.attname: getattr(user, field.attname)
+            for field in self._get_fields()
+        }
+        cache.set(self.make_key(user_id), (version, values), self.timeout)
+        # The entry in memory isn't checked against the version
+        if self.get_version(user_id) == version:
+            self._set_local(user_id, values)
+
+    def invalidate(self, user_id):
+        """Bump the token version of `user_id`, dropping its cached user."""
+        self.invalidate_many([user_id])
+
+    def invalidate_many(self, user_ids):
+        """`invalidate` the users of `user_ids`."""
+        user_ids = list(user_ids)
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(str(user_id), None)
+        for user_id in user_ids:
+            bump_version(self.get_version_key(user_id))
+
+    @property
+    def timeout(self):
+        """The seconds an entry is kept in Redis."""
+        return min(
+            settings.JWT_USER_CACHE_TIMEOUT,
+            int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()),
+        )
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._local.get(str(user_id))
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires <= time.monotonic():
+                del self._local[str(user_id)]
+                return None
+            self._local.move_to_end(str(user_id))
+            return values
+
+    def _set_local(self, user_id, values):
+        expires = time.monotonic() + settings.JWT_USER_LOCAL_CACHE_TIMEOUT
+        with self._lock:
+            # Ids from the token and from the model compare as strings
+            self._local[str(user_id)] = (expires, values)
+            self._local.move_to_end(str(user_id))
+            while len(self._local) > settings.JWT_USER_LOCAL_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+    def _get_fields(self):
+        return [
+            field
+            for field in get_user_model()._meta.concrete_fields
+            if field.attname not in UNCACHED_FIELDS
+        ]
+
+    def _build(self, values):
+        # A new instance every time, a request may change the one it gets
+        fields = self._get_fields()
+        return get_user_model().from_db(
+            DEFAULT_DB_ALIAS,
+            [field.attname for field in fields],
+            [values[field.attname] for field in fields],
+        )
+
+
+user_cache = UserCache()
@@ -0,0 +1,41 @@
+from dj_rest_auth import views
+from dj_rest_auth.app_settings import api_settings
+from dj_rest_auth.jwt_auth import get_refresh_view
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.views import TokenVerifyView
+
+from apps.jwt_auth.serializers import RefreshSerializer, VerifySerializer
+from apps.jwt_auth.tokens import StoredRefreshToken
+
+
+class RefreshView(get_refresh_view()):
+    """
+    The refresh view of dj-rest-auth, revoking the refresh token it is
+    given when `ROTATE_REFRESH_TOKENS` hands out a new one.
+    """
+
+    serializer_class = RefreshSerializer
+
+
+class VerifyView(TokenVerifyView):
+    serializer_class = VerifySerializer
+
+
+class LogoutView(views.LogoutView):
+    """
+    `LogoutView` revoking the refresh token of the request, taken from the
+    body or else from the cookie.
+    """
+
+    def logout(self, request):
+        response = super().logout(request)
+        raw_token = request.data.get("refresh") or request.COOKIES.get(
+            api_settings.JWT_AUTH_REFRESH_COOKIE
+        )
+        if raw_token:
+            try:
+                StoredRefreshToken(raw_token).blacklist()
+            except TokenError:
+                # Expired, invalid or revoked already
+                pass
+        return response
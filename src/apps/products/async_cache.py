@@ -0,0 +1,96 @@
+"""
+Non-blocking access to the Redis cache for the async read views.
+
+django-redis only has a blocking client, and the `aget_many` of Django's
+cache runs it in a thread. `get_many` and `set_many` below send the same
+commands with `redis.asyncio` instead, building the keys and encoding the
+values with the configured django-redis client, so they read and write
+the entries of `django.core.cache.cache`.
+
+A `redis.asyncio` connection belongs to the event loop it was opened in,
+so every loop gets its own client, kept for as long as the loop lives. Its
+pool holds at most `ASYNC_READ_CONCURRENCY` connections, and a command
+waits for a free one rather than opening a connection per request.
+Redis errors are logged and ignored, as `IGNORE_EXCEPTIONS` does for the
+blocking client: a read finds nothing and a write is dropped.
+"""
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from apps.telemetry.metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        location = settings.CACHES["default"]["LOCATION"]
+        if isinstance(location, str):
+            location = location.split(",")
+        pool = BlockingConnectionPool.from_url(
+            location[0], max_connections=settings.ASYNC_READ_CONCURRENCY
+        )
+        client = _clients[loop] = Redis(connection_pool=pool)
+    return client
+
+
+async def get_many(keys):
+    """Return a mapping of the `keys` found in the cache to their value."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    backend = cache.client
+    try:
+        values = await get_client().mget(
+            [backend.make_key(key) for key in keys]
+        )
+    except RedisError:
+        logger.warning("Reading from the cache failed", exc_info=True)
+        values = [None] * len(keys)
+    found = {
+        key: backend.decode(value)
+        for key, value in zip(keys, values)
+        if value is not None
+    }
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache_calls += 1
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+    return found
+
+
+async def set_many(data, timeout, nx=False):
+    """
+    Store the `{key: value}` mapping `data` for `timeout` seconds, only the
+    keys not set yet with `nx`.
+    """
+    if not data:
+        return
+    backend = cache.client
+    pipeline = get_client().pipeline(transaction=False)
+    for key, value in data.items():
+        pipeline.set(
+            backend.make_key(key),
+            backend.encode(value),
+            ex=timeout,
+            nx=nx,
+        )
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.cache_calls += 1
+    try:
+        await pipeline.execute()
+    except RedisError:
+        logger.warning("Writing to the cache failed", exc_info=True)
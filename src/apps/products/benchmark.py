@@ -0,0 +1,239 @@
+"""
+Latency, query count and memory of the catalog endpoints.
+
+`benchmark_routes` requests every read route of `apps.products.urls`
+against the current database and measures each one twice:
+- cold, with the cache emptied before every request, so every query the
+  endpoint needs is executed, see `empty_cache`,
+- warm, repeating the request with whatever the first one cached.
+Latency is reported as percentiles over the repeated requests, peak memory
+as the largest Python allocation seen by `tracemalloc` during one cold
+request.
+    Run against catalogs of different sizes, the cold query counts must not
+change: `find_query_growth` reports the routes whose count grows with the
+number of products, the usual sign of a query run per object.
+"""
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+
+from apps.products import urls
+from apps.products.models import Category, Image, Product, Size
+
+# Routes that only accept writes, left out of the benchmark.
+WRITE_ONLY_ROUTES = {
+    "product-import-catalog",
+    "productimages-bulk",
+    "productsizes-bulk",
+    "productcategories-bulk",
+    "productcategories-detail",
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def get_routes():
+    """
+    Return the requests benchmarked for the catalog in the database, as
+    `(label, route name, URL)` tuples. Several labels may share a route,
+    e.g. the product list with different filters.
+    """
+    product = Product.objects.filter(
+        preview_image__isnull=False, productsize__isnull=False
+    ).first()
+    category = Category.objects.filter(parent_category=None).first()
+    size = product.productsize_set.first()
+    image = product.productimage_set.first()
+    nested = {"product_id": product.pk}
+
+    def url(name, params="", **kwargs):
+        return reverse(f"api:{name}", kwargs=kwargs or None) + params
+
+    return [
+        ("api-root", "api-root", url("api-root")),
+        ("category-list", "category-list", url("category-list")),
+        ("category-tree", "category-tree", url("category-tree")),
+        (
+            "category-detail",
+            "category-detail",
+            url("category-detail", pk=category.pk),
+        ),
+        ("size-list", "size-list", url("size-list")),
+        (
+            "size-detail",
+            "size-detail",
+            url("size-detail", pk=Size.objects.first().pk),
+        ),
+        ("image-list", "image-list", url("image-list")),
+        (
+            "image-detail",
+            "image-detail",
+            url("image-detail", pk=Image.objects.first().pk),
+        ),
+        ("product-list", "product-list", url("product-list")),
+        (
+            "product-list-db-rendered",
+            "product-list",
+            url("product-list", "?render=db"),
+        ),
+        (
+            "product-list-by-price",
+            "product-list",
+            url("product-list", "?ordering=price&price_max=5000"),
+        ),
+        (
+            "product-list-search",
+            "product-list",
+            url("product-list", "?search=rose%20bouquet"),
+        ),
+        (
+            "product-list-category-tree",
+            "product-list",
+            url("product-list", f"?categories_tree={category.pk}"),
+        ),
+        ("product-facets", "product-facets", url("product-facets")),
+        (
+            "product-detail",
+            "product-detail",
+            url("product-detail", pk=product.pk),
+        ),
+        (
+            "productimages-list",
+            "productimages-list",
+            url("productimages-list", **nested),
+        ),
+        (
+            "productimages-detail",
+            "productimages-detail",
+            url("productimages-detail", image_id=image.image_id, **nested),
+        ),
+        (
+            "productsizes-list",
+            "productsizes-list",
+            url("productsizes-list", **nested),
+        ),
+        (
+            "productsizes-detail",
+            "productsizes-detail",
+            url("productsizes-detail", size_id=size.size_id, **nested),
+        ),
+        (
+            "productcategories-list",
+            "productcategories-list",
+            url("productcategories-list", **nested),
+        ),
+    ]
+
+
+def get_route_names(patterns=None):
+    """Return the names of every route of `apps.products.urls`."""
+    names = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def benchmark_routes(products, repeat=20, routes=None):
+    """
+    Measure every route of `routes`, by default `get_routes()`, and return
+    one result per route for the `products` count of the current catalog.
+    """
+    client = Client()
+    results = []
+    for label, name, url in get_routes() if routes is None else routes:
+        result = {"route": label, "name": name, "url": url}
+        result["products"] = products
+        result["cold"] = measure(client, url, repeat, cold=True)
+        result["warm"] = measure(client, url, repeat, cold=False)
+        results.append(result)
+    return results
+
+
+def measure(client, url, repeat, cold):
+    if cold:
+        empty_cache()
+    else:
+        request(client, url)
+    with CaptureQueriesContext(connection) as queries:
+        status = request(client, url)
+    # Read before the next request resets the query log
+    query_count = len(queries)
+
+    if cold:
+        empty_cache()
+    tracemalloc.start()
+    try:
+        request(client, url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            empty_cache()
+        start = time.perf_counter()
+        request(client, url)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "status": status,
+        "queries": query_count,
+        **{
+            f"p{percentile}_ms": round(
+                get_percentile(timings, percentile) * 1000, 3
+            )
+            for percentile in PERCENTILES
+        },
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+    }
+
+
+def empty_cache():
+    """
+    Delete the keys of the cache, cachalot's included. Unlike
+    `cache.clear()`, which empties the whole Redis database, only the keys
+    under the cache's `KEY_PREFIX` are deleted.
+    """
+    cache.delete_pattern("*")
+
+
+def request(client, url):
+    """Request `url`, read the whole response and return its status."""
+    response = client.get(url)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response.status_code
+
+
+def get_percentile(values, percentile):
+    """Return the nearest-rank `percentile` of `values`."""
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * percentile // 100) - 1)
+    return ordered[index]
+
+
+def find_query_growth(results):
+    """
+    Return the routes of `results` whose cold query count is higher for a
+    larger catalog than for the smallest one, as `{route: {products:
+    queries}}`.
+    """
+    counts = {}
+    for result in results:
+        by_products = counts.setdefault(result["route"], {})
+        by_products[result["products"]] = result["cold"]["queries"]
+    growth = {}
+    for route, by_products in counts.items():
+        smallest = by_products[min(by_products)]
+        if any(queries > smallest for queries in by_products.values()):
+            growth[route] = dict(sorted(by_products.items()))
+    return growth
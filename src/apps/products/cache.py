@@ -0,0 +1,47 @@
+"""
+Versioned keys for data cached in Redis.
+
+A cached value is stored under a key that embeds the current version of
+the data it was built from. Writes bump the version instead of deleting
+keys, so every reader switches to a fresh key at once and stale entries
+simply expire.
+"""
+import time
+
+from django.core.cache import cache
+
+CATEGORY_TREE_VERSION_KEY = "products:category-tree:version"
+
+# Entries under an outdated version are never read again, this only bounds
+# how long they take up memory.
+VERSIONED_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_version(version_key):
+    """
+    Return the current version stored under `version_key`.
+
+        A missing version is initialized from the clock rather than from 1,
+    so if the version key is evicted while old entries survive, the new
+    version can never point back at them.
+    """
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key, time.time_ns())
+    return version
+
+
+def bump_version(version_key):
+    """
+    Move `version_key` to a new version, orphaning every entry cached
+    under the previous one.
+    """
+    if not cache.add(version_key, time.time_ns(), timeout=None):
+        cache.incr(version_key)
+
+
+def versioned_key(version_key, *parts):
+    return ":".join(
+        [version_key, str(get_version(version_key)), *map(str, parts)]
+    )
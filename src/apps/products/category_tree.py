@@ -0,0 +1,90 @@
+"""
+The nested category tree used by the catalog navigation.
+
+The whole tree is read with a single recursive query, nested in Python and
+rendered to JSON once. The rendered document and its ETag are cached under
+a versioned key that every category write bumps.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connection
+
+from apps.products.cache import (
+    CATEGORY_TREE_VERSION_KEY,
+    VERSIONED_CACHE_TIMEOUT,
+    versioned_key,
+)
+
+CATEGORY_TREE_SQL = """
+    WITH RECURSIVE tree AS (
+        SELECT id, parent_category_id, name, slug, description, is_active,
+               0 AS depth
+        FROM products_category
+        WHERE parent_category_id IS NULL {root_filter}
+        UNION ALL
+        SELECT category.id, category.parent_category_id, category.name,
+               category.slug, category.description, category.is_active,
+               tree.depth + 1
+        FROM products_category category
+        JOIN tree ON category.parent_category_id = tree.id
+        {child_filter}
+    )
+    SELECT id, parent_category_id, name, slug, description, is_active
+    FROM tree
+    ORDER BY depth, name, id
+"""
+
+
+def build_category_tree(active_only=False):
+    """
+    Return the list of root categories, each with its nested `children`.
+
+        With `active_only`, the recursion does not descend into inactive
+    categories, so a hidden category hides its whole branch.
+    """
+    sql = CATEGORY_TREE_SQL.format(
+        root_filter="AND is_active" if active_only else "",
+        child_filter="WHERE category.is_active" if active_only else "",
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+
+    nodes = {}
+    roots = []
+    for category_id, parent_id, name, slug, description, is_active in rows:
+        node = {
+            "id": category_id,
+            "name": name,
+            "slug": slug,
+            "description": description,
+            "is_active": is_active,
+            "children": [],
+        }
+        nodes[category_id] = node
+        if parent_id is None:
+            roots.append(node)
+        else:
+            # Rows come level by level, so the parent is always known.
+            nodes[parent_id]["children"].append(node)
+    return roots
+
+
+def get_category_tree(active_only=False):
+    """
+    Return the `(etag, content)` of the rendered category tree, building
+    and caching it on the first request after a category write.
+    """
+    key = versioned_key(CATEGORY_TREE_VERSION_KEY, int(active_only))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    content = json.dumps(
+        build_category_tree(active_only), separators=(",", ":")
+    ).encode()
+    etag = hashlib.md5(content).hexdigest()
+    cache.set(key, (etag, content), VERSIONED_CACHE_TIMEOUT)
+    return etag, content
@@ -0,0 +1,203 @@
+"""
+Deletion of media files after the transactions that stop using them.
+
+Files are never deleted from inside a request's transaction. The deletion
+is recorded in `FileCleanup` together with the other writes, so a rollback
+keeps the file, and the queue is processed in batches after the commit by
+a background thread of the process. With `FILE_CLEANUP_IN_BACKGROUND =
+False` the queue is processed inline after the commit instead.
+
+`find_orphans` walks the image directory in step with the file names
+stored in the database, both in the same order, to find the files nothing
+refers to without holding either list in memory.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from apps.products.storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+# Both sides sorted by code point, which is how Python compares strings
+REFERENCED_NAMES_SQL = """
+    SELECT img COLLATE "C" AS name FROM products_image
+    WHERE starts_with(img, %(prefix)s)
+    UNION
+    SELECT file COLLATE "C" FROM products_imagevariant
+    WHERE starts_with(file, %(prefix)s)
+    ORDER BY name
+"""
+
+
+class CleanupWorker(threading.Thread):
+    """
+    A daemon thread processing the cleanup queue every time it is woken
+    up. Wake-ups that arrive while it is busy are merged into one more run.
+    """
+
+    def __init__(self):
+        super().__init__(name="file-cleanup", daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                process_queue()
+            except Exception:
+                logger.exception("Cannot process the file cleanup queue")
+            finally:
+                connections.close_all()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = CleanupWorker()
+            _worker.start()
+    return _worker
+
+
+def process_file_cleanup():
+    """
+    Process the queue in the background, or right away when background
+    processing is disabled. Meant to run once a transaction that queued
+    files has committed.
+    """
+    if settings.FILE_CLEANUP_IN_BACKGROUND:
+        get_worker().wakeup.set()
+    else:
+        process_queue()
+
+
+def process_queue(batch_size=None, storage=image_storage):
+    """
+    Delete the queued files batch by batch and return the number of queue
+    entries processed.
+
+        A batch is locked with SKIP LOCKED, so several processes can drain
+    the queue together. Content-addressed files that were acquired again
+    since they were queued are kept, see `StoredFileManager.delete_unused`.
+    Files that cannot be deleted are logged and left to the orphan
+    sweeper.
+    """
+    FileCleanup = apps.get_model("products", "FileCleanup")
+    StoredFile = apps.get_model("products", "StoredFile")
+    batch_size = batch_size or settings.FILE_CLEANUP_BATCH_SIZE
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                FileCleanup.objects.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", "name")[:batch_size]
+            )
+            if not batch:
+                return processed
+            names = sorted({name for _, name in batch})
+            for name in StoredFile.objects.delete_unused(names):
+                try:
+                    storage.delete(name)
+                except OSError:
+                    logger.exception("Cannot delete the file %s", name)
+            # Entries queued again for the same files are done as well
+            FileCleanup.objects.filter(name__in=names).delete()
+        processed += len(batch)
+
+
+def iter_files(storage, directory):
+    """
+    Yield the (name, modification time) of every file under `directory`
+    of the storage, sorted by name.
+
+        Entries of a directory are sorted with a trailing slash on the
+    subdirectories, so `a.jpg` comes before the files of `a/` as it does in
+    a plain string comparison of the full names. Only one directory listing
+    is held at a time.
+    """
+    path = storage.path(directory)
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.name + "/" * entry.is_dir())
+    for entry in entries:
+        name = f"{directory}/{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_files(storage, name)
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry.stat().st_mtime
+
+
+def iter_referenced_names(directory, chunk_size=2000):
+    """
+    Yield the names under `directory` used by images and their variants,
+    sorted by name, through a server-side cursor.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(REFERENCED_NAMES_SQL, {"prefix": f"{directory}/"})
+        while rows := cursor.fetchmany(chunk_size):
+            for (name,) in rows:
+                yield name
+
+
+def find_orphans(directory="images", min_age=3600, storage=image_storage):
+    """
+    Yield the names of the files under `directory` that no image or
+    variant refers to, merging the sorted files with the sorted names.
+
+        Files modified less than `min_age` seconds ago are skipped, as their
+    image may not be committed yet.
+    """
+    newest = time.time() - min_age
+    referenced = iter_referenced_names(directory)
+    current = next(referenced, None)
+    for name, modified_at in iter_files(storage, directory):
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if name != current and modified_at < newest:
+            yield name
+
+
+def delete_orphans(names):
+    """
+    Queue the files of `names` for deletion unless an image started using
+    them since they were found.
+
+        The stored files are locked first, so an upload of the same content
+    that is being committed is waited for and seen by the check. Their
+    references are reset, as nothing uses them, which also reclaims the
+    references of uploads whose image was never saved.
+    """
+    Image = apps.get_model("products", "Image")
+    ImageVariant = apps.get_model("products", "ImageVariant")
+    StoredFile = apps.get_model("products", "StoredFile")
+    FileCleanup = apps.get_model("products", "FileCleanup")
+
+    with transaction.atomic():
+        stored = StoredFile.objects.filter(name__in=names)
+        list(stored.select_for_update().values_list("pk", flat=True))
+        in_use = set(
+            Image.objects.filter(img__in=names).values_list("img", flat=True)
+        ) | set(
+            ImageVariant.objects.filter(file__in=names).values_list(
+                "file", flat=True
+            )
+        )
+        orphans = [name for name in names if name not in in_use]
+        stored.filter(name__in=orphans).update(reference_count=0)
+        FileCleanup.objects.enqueue(orphans)
+    return orphans
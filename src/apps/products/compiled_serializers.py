@@ -0,0 +1,238 @@
+from collections.abc import Mapping
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager
+from rest_framework import fields, relations
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.settings import api_settings
+
+# Fields whose `to_representation` returns database values unchanged.
+PASSTHROUGH_FIELDS = (
+    fields.BooleanField,
+    fields.CharField,
+    fields.IntegerField,
+    fields.ReadOnlyField,
+    fields.SlugField,
+)
+
+
+class CompiledSerializer:
+    """
+    A read-only rendering plan precomputed from a serializer instance.
+
+        DRF resolves every field of every object through the generic field
+    machinery: `get_attribute` with its error handling, `PKOnlyObject`
+    wrappers for related keys, `.all()` clones for prefetched relations and
+    a fresh nested serializer call for each child. This class walks the
+    serializer's readable fields once and builds a flat list of accessors,
+    so rendering an object is one small function call per field.
+        Plain model fields are returned as loaded, related keys are read from
+    the `<field>_id` attribute, prefetched relations are read from the
+    prefetch cache and nested serializers are compiled recursively. Any other
+    field falls back to its own `to_representation`, so the output is always
+    the same as the serializer's.
+        With `from_mapping=True` the plan reads `.values()`-style rows, where
+    nested relations are already lists of rows and related keys are ids.
+
+    Attributes:
+        serializer: The serializer instance the plan is built from. Its
+         context (e.g. the request for absolute file URLs) is used as is.
+    """
+
+    def __init__(self, serializer, from_mapping=False):
+        self.serializer = serializer
+        self.from_mapping = from_mapping
+        self.accessors = [
+            (field.field_name, self.compile_field(field))
+            for field in serializer._readable_fields
+        ]
+
+    def to_representation(self, instance):
+        return {name: accessor(instance) for name, accessor in self.accessors}
+
+    def compile_field(self, field):
+        if isinstance(field, ListSerializer):
+            child = CompiledSerializer(field.child, self.from_mapping)
+            get_items = self.get_many_getter(field.source_attrs)
+            return lambda instance: [
+                child.to_representation(item) for item in get_items(instance)
+            ]
+
+        if isinstance(field, BaseSerializer):
+            child = CompiledSerializer(field, self.from_mapping)
+            get_value = self.get_getter(field.source_attrs)
+
+            def nested(instance):
+                value = get_value(instance)
+                if value is None:
+                    return None
+                return child.to_representation(value)
+
+            return nested
+
+        if isinstance(field, relations.ManyRelatedField) and isinstance(
+            field.child_relation, relations.PrimaryKeyRelatedField
+        ):
+            get_items = self.get_many_getter(field.source_attrs)
+            if self.from_mapping:
+                return lambda instance: list(get_items(instance))
+            if field.child_relation.pk_field:
+                to_representation = field.child_relation.to_representation
+                return lambda instance: [
+                    to_representation(item) for item in get_items(instance)
+                ]
+            return lambda instance: [item.pk for item in get_items(instance)]
+
+        model_field = self.get_model_field(field)
+        if (
+            isinstance(field, relations.PrimaryKeyRelatedField)
+            and not field.pk_field
+            and model_field is not None
+        ):
+            if self.from_mapping:
+                return self.get_getter(field.source_attrs)
+            return self.get_getter([model_field.attname])
+
+        if type(field) in PASSTHROUGH_FIELDS:
+            return self.get_getter(field.source_attrs)
+
+        if (
+            isinstance(field, fields.FileField)
+            and getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+            and model_field is not None
+        ):
+            return self.compile_file_field(field, model_field)
+
+        return self.compile_fallback(field)
+
+    def compile_file_field(self, field, model_field):
+        """
+        Build the file URL from the stored name without going through
+        `FieldFile`, resolving the request host once instead of per object.
+        The same file is usually shared by many objects of a list (category
+        images, for instance), so URLs are remembered by name for the
+        lifetime of the plan.
+        """
+        get_value = self.get_getter(field.source_attrs)
+        storage_url = model_field.storage.url
+        request = field.context.get("request", None)
+        host = request.build_absolute_uri("/")[:-1] if request else ""
+        urls = {}
+
+        def file_url(instance):
+            value = get_value(instance)
+            name = getattr(value, "name", value)
+            if not name:
+                return None
+            try:
+                return urls[name]
+            except KeyError:
+                pass
+            url = storage_url(name)
+            if url.startswith("/"):
+                url = host + url
+            elif request:
+                url = request.build_absolute_uri(url)
+            urls[name] = url
+            return url
+
+        return file_url
+
+    def compile_fallback(self, field):
+        if self.from_mapping:
+            get_value = self.get_getter(field.source_attrs)
+        else:
+            get_value = field.get_attribute
+
+        def fallback(instance):
+            value = get_value(instance)
+            check_for_none = (
+                value.pk
+                if isinstance(value, relations.PKOnlyObject)
+                else value
+            )
+            if check_for_none is None:
+                return None
+            return field.to_representation(value)
+
+        return fallback
+
+    def get_getter(self, source_attrs):
+        if len(source_attrs) == 1:
+            (attr,) = source_attrs
+            if self.from_mapping:
+                return lambda instance: instance[attr]
+            return lambda instance: getattr(instance, attr)
+
+        def getter(instance):
+            for attr in source_attrs:
+                if instance is None:
+                    return None
+                if self.from_mapping:
+                    instance = instance[attr]
+                else:
+                    instance = getattr(instance, attr)
+            return instance
+
+        return getter
+
+    def get_many_getter(self, source_attrs):
+        """
+        Return a function reading a to-many relation, straight from the
+        prefetch cache when the relation was prefetched.
+        """
+        if self.from_mapping:
+            get_value = self.get_getter(source_attrs)
+            return lambda instance: get_value(instance) or ()
+
+        *parent_attrs, cache_name = source_attrs
+        get_parent = self.get_getter(parent_attrs) if parent_attrs else None
+
+        def get_items(instance):
+            parent = get_parent(instance) if get_parent else instance
+            if parent is None or parent.pk is None:
+                return ()
+            try:
+                return parent._prefetched_objects_cache[cache_name]
+            except (AttributeError, KeyError):
+                value = getattr(parent, cache_name)
+                return value.all() if isinstance(value, Manager) else value
+
+        return get_items
+
+    @staticmethod
+    def get_model_field(field):
+        """
+        Return the model field a serializer field reads directly from its
+        parent's model, or None when the source is not a plain model field.
+        """
+        model = getattr(getattr(field.parent, "Meta", None), "model", None)
+        if model is None or len(field.source_attrs) != 1:
+            return None
+        try:
+            return model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+
+
+class CompiledListSerializer(ListSerializer):
+    """
+    A list serializer that renders its items with a `CompiledSerializer`.
+
+        Used as `list_serializer_class` for the catalog read serializers, so
+    every `many=True` read takes the compiled path while writes and single
+    object reads keep using the regular serializer. The plan is built once
+    per list, from the first item's type.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        compiled = None
+        representation = []
+        for item in iterable:
+            if compiled is None:
+                compiled = CompiledSerializer(
+                    self.child, from_mapping=isinstance(item, Mapping)
+                )
+            representation.append(compiled.to_representation(item))
+        return representation
@@ -0,0 +1,145 @@
+"""
+Throughput of the catalog reads under many concurrent connections.
+
+`measure_throughput` keeps `connections` clients requesting one route back
+to back, each sending its next request as soon as the previous response is
+read, until `requests` responses are in, and reports the requests per
+second and the latency percentiles. The application is called in-process,
+without sockets, so the numbers are those of the Django stack:
+- under ASGI every client is a task awaiting the application, the way an
+  ASGI server runs one task per connection,
+- under WSGI the clients wait for a thread of a fixed pool, the way a
+  threaded WSGI server queues the connections it has no thread for.
+    Whether the catalog reads are served by the async views is decided by
+`ASYNC_READ_VIEWS` when the URLconf is loaded, so each server mode has to
+be measured in its own process, see the `benchmark_concurrency` command.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.urls import resolve
+
+from apps.products.benchmark import PERCENTILES, get_percentile, get_routes
+from apps.products.mixins import AsyncReadMixin
+from apps.products.warmup import make_wsgi_request
+
+HOST = "testserver"
+
+
+def get_async_routes():
+    """
+    Return the routes of `get_routes()` served by the async handlers of
+    `AsyncReadMixin`, the ones whose throughput depends on the server mode.
+    """
+    routes = []
+    for label, name, url in get_routes():
+        view = resolve(urlsplit(url).path).func
+        if issubclass(view.cls, AsyncReadMixin) and (
+            view.actions.get("get") in AsyncReadMixin.async_actions
+        ):
+            routes.append((label, name, url))
+    return routes
+
+
+def measure_throughput(application, url, connections, requests, threads=0):
+    """
+    Measure `requests` GETs of `url` sent by `connections` concurrent
+    clients to the ASGI `application`, or to the WSGI one when `threads`,
+    the size of its thread pool, is given.
+    """
+    if threads:
+        executor = ThreadPoolExecutor(max_workers=threads)
+        wsgi_request = make_wsgi_request(application, url, f"http://{HOST}")
+
+        async def send():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, wsgi_request)
+
+    else:
+        executor = None
+        send = make_asgi_request(application, url)
+
+    try:
+        return asyncio.run(run_clients(send, connections, requests))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+async def run_clients(send, connections, requests):
+    """
+    Await `send` from `connections` concurrent clients until `requests`
+    responses are in, and summarize them.
+    """
+    timings = []
+    errors = 0
+    remaining = requests
+
+    async def client():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            if await send() != 200:
+                errors += 1
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        **{
+            f"p{percentile}_ms": round(
+                get_percentile(timings, percentile) * 1000, 3
+            )
+            for percentile in PERCENTILES
+        },
+    }
+
+
+def make_asgi_request(application, url):
+    """
+    Return a coroutine function sending a GET of `url` to the ASGI
+    `application`, reading the whole response and returning its status.
+    """
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", HOST.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": (HOST, 80),
+    }
+
+    async def send_request():
+        received = []
+        status = None
+
+        async def receive():
+            if received:
+                return {"type": "http.disconnect"}
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await application(dict(scope), receive, send)
+        return status
+
+    return send_request
@@ -0,0 +1,129 @@
+"""
+SQL expressions that render catalog objects to JSON inside PostgreSQL.
+
+The documents built here have the same shape as the output of the
+matching serializers in `apps.products.serializers`, so a list endpoint can
+hand the text produced by the database straight to the client without
+building model instances or serializer fields for every row.
+"""
+from django.db.models import TextField
+from django.db.models.expressions import RawSQL
+
+from apps.products.models import Image
+
+IMAGE_JSON_SQL = """
+    json_build_object(
+        'id', {alias}.id,
+        'img', CASE WHEN {alias}.img = '' THEN NULL
+                    ELSE %s || {alias}.img END,
+        'size_description', {alias}.size_description,
+        'srcset', COALESCE((
+            SELECT json_object_agg(srcset.format, srcset.sources)
+            FROM (
+                SELECT v.format,
+                       string_agg(%s || v.file || ' ' || v.width || 'w', ', '
+                                  ORDER BY v.width) AS sources
+                FROM products_imagevariant v
+                WHERE v.image_id = {alias}.id
+                GROUP BY v.format
+            ) srcset
+        ), '{{}}'::json)
+    )
+"""
+
+PRODUCT_JSON_SQL = """
+    json_build_object(
+        'id', products_product.id,
+        'categories', COALESCE((
+            SELECT json_agg(
+                json_build_object(
+                    'id', c.id,
+                    'child_categories', COALESCE((
+                        SELECT json_agg(cc.id ORDER BY cc.id)
+                        FROM products_category cc
+                        WHERE cc.parent_category_id = c.id
+                    ), '[]'::json),
+                    'image', CASE WHEN ci.id IS NULL THEN NULL
+                                  ELSE {category_image} END,
+                    'name', c.name,
+                    'slug', c.slug,
+                    'is_active', c.is_active,
+                    'description', c.description,
+                    'parent_category', c.parent_category_id
+                )
+                ORDER BY c.id
+            )
+            FROM products_product_categories pc
+            JOIN products_category c ON c.id = pc.category_id
+            LEFT JOIN products_image ci ON ci.id = c.image_id
+            WHERE pc.product_id = products_product.id
+        ), '[]'::json),
+        'sizes', COALESCE((
+            SELECT json_agg(
+                json_build_object(
+                    'size', json_build_object('id', s.id, 'name', s.name),
+                    'price', ps.price,
+                    'is_active', ps.is_active
+                )
+                ORDER BY ps.id
+            )
+            FROM products_productsize ps
+            JOIN products_size s ON s.id = ps.size_id
+            WHERE ps.product_id = products_product.id
+        ), '[]'::json),
+        'images', COALESCE((
+            SELECT json_agg(
+                json_build_object(
+                    'image', {product_image},
+                    'is_preview', pi.is_preview
+                )
+                ORDER BY pi.id
+            )
+            FROM products_productimage pi
+            JOIN products_image i ON i.id = pi.image_id
+            WHERE pi.product_id = products_product.id
+        ), '[]'::json),
+        'preview_image', (
+            SELECT {product_image}
+            FROM products_image i
+            WHERE i.id = products_product.preview_image_id
+        ),
+        'name', products_product.name,
+        'slug', products_product.slug,
+        'is_active', products_product.is_active,
+        'description', products_product.description,
+        'is_archived', products_product.is_archived,
+        'min_price', products_product.min_price,
+        'max_price', products_product.max_price
+    )::text
+"""
+
+
+def get_image_base_url(request=None):
+    """
+    Return the prefix that turns a stored image name into the URL produced
+    by `ImageSerializer`, absolute when a request is available.
+    """
+    base_url = Image._meta.get_field("img").storage.base_url
+    if request is not None:
+        return request.build_absolute_uri(base_url)
+    return base_url
+
+
+def product_json(request=None):
+    """
+    Return an expression rendering a `products_product` row as the JSON
+    text `ProductSerializer` would produce for it.
+
+        Nested collections are aggregated by correlated subqueries in the
+    select list. PostgreSQL evaluates them only for the rows that survive
+    the LIMIT of the page, so the whole page is one round trip no matter how
+    many categories, sizes and images the products have.
+    """
+    sql = PRODUCT_JSON_SQL.format(
+        category_image=IMAGE_JSON_SQL.format(alias="ci"),
+        product_image=IMAGE_JSON_SQL.format(alias="i"),
+    )
+    # Every placeholder of the document is the media base URL
+    params = (get_image_base_url(request),) * sql.count("%s")
+    return RawSQL(sql, params, output_field=TextField())
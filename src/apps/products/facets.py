@@ -0,0 +1,130 @@
+"""
+Facet counts for the catalog filter sidebar.
+
+The products matching a filter set are selected once in a CTE, and the
+counts per category, per available size and per price bucket are
+aggregated from it in the same statement. The result is cached under the
+normalized filter set and the time of the last write to the catalog
+tables, as recorded by cachalot, which also covers bulk links, imports
+and the columns maintained by triggers, as those writes invalidate the
+products explicitly.
+"""
+import hashlib
+import json
+
+from cachalot.api import get_last_invalidation
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from apps.products.models import Category, Product, ProductSize
+
+FACETS_CACHE_KEY = "products:facets:{version}:{filters}"
+
+# Entries under an outdated version are never read again, this only bounds
+# how long they take up memory.
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+# The categories of a product include the ancestors of its categories, so a
+# category counts the products of its whole branch.
+FACETS_SQL = """
+    WITH matching AS MATERIALIZED ({products})
+    SELECT 'total' AS facet, NULL AS value, count(*) FROM matching
+    UNION ALL
+    SELECT 'category', link.category_id, count(*)
+    FROM matching
+    JOIN products_product_categories link ON link.product_id = matching.id
+    GROUP BY link.category_id
+    UNION ALL
+    SELECT 'size', size.size_id, count(DISTINCT size.product_id)
+    FROM matching
+    JOIN products_productsize size
+      ON size.product_id = matching.id AND size.is_active
+    GROUP BY size.size_id
+    UNION ALL
+    SELECT 'price', width_bucket(product.min_price, %s::integer[]), count(*)
+    FROM matching
+    JOIN products_product product ON product.id = matching.id
+    WHERE product.min_price IS NOT NULL
+    GROUP BY 2
+"""
+
+
+def get_filter_key(filterset):
+    """
+    Return a digest of the validated filters of `filterset` that is the
+    same for every spelling of the same filter set: parameter order,
+    repeated values, blank parameters and spacing do not matter.
+    """
+    filters = {}
+    for name, value in filterset.form.cleaned_data.items():
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        elif isinstance(value, (list, tuple)):
+            value = sorted(set(value))
+        if value in (None, "", []):
+            continue
+        filters[name] = value
+    normalized = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+
+def get_facets(filterset):
+    """
+    Return the facet counts of the products matching the valid
+    `filterset`, from the cache when the catalog has not changed since they
+    were counted.
+    """
+    version = get_last_invalidation(
+        Product, ProductSize, Category, Product.categories.through
+    )
+    key = FACETS_CACHE_KEY.format(
+        version=version, filters=get_filter_key(filterset)
+    )
+    facets = cache.get(key)
+    if facets is None:
+        facets = count_facets(filterset.qs)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def count_facets(queryset, buckets=None):
+    """
+    Count the products of `queryset` in total, per category, per size with
+    an active offer and per price bucket, with a single query.
+
+        `buckets` are the ascending bounds of the price buckets, by default
+    `PRODUCT_PRICE_BUCKETS`. A product falls into the bucket of its lowest
+    price, the first and last buckets are open-ended, and empty buckets are
+    reported with a zero count.
+    """
+    buckets = list(
+        settings.PRODUCT_PRICE_BUCKETS if buckets is None else buckets
+    )
+    products, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            FACETS_SQL.format(products=products), (*params, buckets)
+        )
+        rows = cursor.fetchall()
+
+    facets = {"total": 0, "categories": [], "sizes": [], "prices": []}
+    price_counts = {}
+    for facet, value, count in rows:
+        if facet == "total":
+            facets["total"] = count
+        elif facet == "category":
+            facets["categories"].append({"id": value, "count": count})
+        elif facet == "size":
+            facets["sizes"].append({"id": value, "count": count})
+        else:
+            price_counts[value] = count
+
+    bounds = [None, *buckets, None]
+    facets["prices"] = [
+        {"min": low, "max": high, "count": price_counts.get(index, 0)}
+        for index, (low, high) in enumerate(zip(bounds, bounds[1:]))
+    ]
+    facets["categories"].sort(key=lambda item: item["id"])
+    facets["sizes"].sort(key=lambda item: item["id"])
+    return facets
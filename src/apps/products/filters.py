@@ -1,7 +1,9 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters import BaseInFilter, NumberFilter
 
-from apps.products.models import Product
+from apps.products.models import CategoryClosure, Product
+from apps.products.search import search_products
 
 
 class NumberInFilter(BaseInFilter, NumberFilter):
@@ -9,11 +11,42 @@ class NumberInFilter(BaseInFilter, NumberFilter):
 
 
 class ProductFilter(django_filters.FilterSet):
+    """
+    Filters of the product list.
+
+        The category filters are EXISTS semi-joins on the category links
+    rather than joins, so a product linked to several of the categories is
+    returned once without a DISTINCT over the whole row.
+    """
+
     uncategorized = django_filters.BooleanFilter(
-        field_name="categories", lookup_expr="isnull", distinct=True
+        method="filter_uncategorized",
+        help_text="Only products without categories, or only products "
+        "with categories when false",
     )
     categories = NumberInFilter(
-        field_name="categories", lookup_expr="in", distinct=True
+        method="filter_categories",
+        help_text="Only products linked to any of the categories",
+    )
+    categories_tree = NumberInFilter(
+        method="filter_categories_tree",
+        help_text="Only products linked to any of the categories or to "
+        "their subcategories at any depth",
+    )
+    price_min = NumberFilter(
+        field_name="max_price",
+        lookup_expr="gte",
+        help_text="Only products with an active size at this price or above",
+    )
+    price_max = NumberFilter(
+        field_name="min_price",
+        lookup_expr="lte",
+        help_text="Only products with an active size at this price or below",
+    )
+    search = django_filters.CharFilter(
+        method="filter_search",
+        help_text="Words to look for in the name and description, ranked "
+        "by relevance. Misspelled words of the name are matched too.",
     )
 
     class Meta:
@@ -21,7 +54,43 @@ class ProductFilter(django_filters.FilterSet):
         fields = [
             "uncategorized",
             "categories",
+            "categories_tree",
             "slug",
             "is_active",
             "is_archived",
         ]
+
+    @staticmethod
+    def category_links():
+        return Product.categories.through.objects.filter(
+            product_id=OuterRef("pk")
+        )
+
+    def filter_uncategorized(self, queryset, name, value):
+        has_categories = Exists(self.category_links())
+        return queryset.filter(~has_categories if value else has_categories)
+
+    def filter_categories(self, queryset, name, value):
+        return queryset.filter(
+            Exists(self.category_links().filter(category_id__in=value))
+        )
+
+    def filter_categories_tree(self, queryset, name, value):
+        """
+        Match the links to the descendants of the categories, found with
+        the (ancestor, descendant) index of the closure table, so the
+        result does not depend on the links to ancestor categories the
+        `m2m_changed` handler adds.
+        """
+        descendants = CategoryClosure.objects.filter(
+            ancestor_id__in=value
+        ).values("descendant_id")
+        return queryset.filter(
+            Exists(self.category_links().filter(category_id__in=descendants))
+        )
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_products(queryset, value)
@@ -0,0 +1,44 @@
+"""
+Resizing of uploaded images into the variants served to browsers.
+
+This module only depends on Pillow, so it can be imported by the worker
+processes of `apps.products.variants` without setting up Django.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# Pillow format names of the variant formats, by file extension
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def render_variants(content, widths, formats, quality=80):
+    """
+    Resize the image given as bytes to every width of `widths` and encode
+    each size in every format of `formats`.
+
+        Images are never upscaled: the widths larger than the original are
+    replaced by a single variant at the original width. Returns a list of
+    (width, format, bytes).
+    """
+    with Image.open(io.BytesIO(content)) as original:
+        original = ImageOps.exif_transpose(original).convert("RGB")
+
+        targets = sorted({width for width in widths if width < original.width})
+        if max(widths) >= original.width:
+            targets.append(original.width)
+
+        variants = []
+        for width in targets:
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            for file_format in formats:
+                buffer = io.BytesIO()
+                resized.save(
+                    buffer,
+                    PIL_FORMATS[file_format],
+                    quality=quality,
+                    optimize=True,
+                )
+                variants.append((width, file_format, buffer.getvalue()))
+        return variants
@@ -0,0 +1,137 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.serializers import ListSerializer
+from rest_framework.test import APIRequestFactory
+
+from apps.products.compiled_serializers import CompiledListSerializer
+from apps.products.models import (
+    Category,
+    Image,
+    Product,
+    ProductImage,
+    ProductSize,
+    Size,
+)
+from apps.products.serializers import ProductSerializer
+
+
+def build_products(count, seed=0):
+    """
+    Build `count` unsaved products with their categories, sizes and images
+    set up the way `ProductViewSet` prefetches them, so serialization can be
+    measured without a database.
+    """
+    rng = random.Random(seed)
+    images = [
+        Image(id=pk, img=f"images/image-{pk}.jpg", size_description="")
+        for pk in range(1, 201)
+    ]
+    sizes = [Size(id=pk, name=f"size-{pk}") for pk in range(1, 11)]
+    categories = []
+    for pk in range(1, 51):
+        category = Category(
+            id=pk,
+            name=f"category-{pk}",
+            slug=f"category-{pk}",
+            image=rng.choice(images),
+            parent_category_id=rng.randint(1, pk - 1) if pk > 1 else None,
+        )
+        categories.append(category)
+    for category in categories:
+        category._prefetched_objects_cache = {
+            "child_categories": [
+                child
+                for child in categories
+                if child.parent_category_id == category.id
+            ]
+        }
+
+    products = []
+    for pk in range(1, count + 1):
+        product = Product(
+            id=pk,
+            name=f"product-{pk}",
+            slug=f"product-{pk}",
+            description="A bouquet " * 20,
+        )
+        product._prefetched_objects_cache = {
+            "categories": rng.sample(categories, 3),
+            "productsize_set": [
+                ProductSize(
+                    product=product, size=size, price=rng.randint(500, 9000)
+                )
+                for size in rng.sample(sizes, 4)
+            ],
+            "productimage_set": [
+                ProductImage(product=product, image=image, is_preview=not i)
+                for i, image in enumerate(rng.sample(images, 4))
+            ],
+        }
+        products.append(product)
+    return products
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the time the regular DRF serializer and the compiled "
+        "serializer take to serialize a list of products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1000, 10000],
+            help="Numbers of products to serialize",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Keep the best time out of this many runs",
+        )
+
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        context = {"request": APIRequestFactory().get("/api/products/")}
+        for count in options["sizes"]:
+            products = build_products(count)
+            drf_time = self.measure(
+                lambda: self.serialize_with_drf(products, context),
+                options["repeat"],
+            )
+            compiled_time = self.measure(
+                lambda: ProductSerializer(
+                    products, many=True, context=context
+                ).data,
+                options["repeat"],
+            )
+            self.stdout.write(
+                f"products={count} drf={drf_time:.3f}s "
+                f"compiled={compiled_time:.3f}s "
+                f"speedup={drf_time / compiled_time:.1f}x"
+            )
+
+    @staticmethod
+    def serialize_with_drf(products, context):
+        to_representation = CompiledListSerializer.to_representation
+        CompiledListSerializer.to_representation = (
+            ListSerializer.to_representation
+        )
+        try:
+            return ProductSerializer(products, many=True, context=context).data
+        finally:
+            CompiledListSerializer.to_representation = to_representation
+
+    @staticmethod
+    def measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
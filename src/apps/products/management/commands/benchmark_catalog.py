@@ -0,0 +1,108 @@
+import json
+
+from cachalot.api import invalidate
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from apps.products.benchmark import benchmark_routes, find_query_growth
+from apps.products.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed catalogs of the given sizes into a test database and measure "
+        "the latency, query count and peak memory of every catalog "
+        "endpoint. Fails when a query count grows with the catalog size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1000, 10000, 100000],
+            help="Numbers of products to seed",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of timed requests per endpoint",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the generated catalogs",
+        )
+        parser.add_argument(
+            "--label",
+            default="",
+            help="Recorded in the output, e.g. the commit being measured",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the JSON results to this file instead of stdout",
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Destroy a leftover test database without asking",
+        )
+
+    def handle(self, *args, **options):
+        # The test database is created under its usual name, and the cache
+        # keys get their own prefix, so the data of the configured database
+        # and cache is left alone.
+        caches = {
+            alias: {**config, "KEY_PREFIX": "benchmark"}
+            for alias, config in settings.CACHES.items()
+        }
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=not options["interactive"]
+        )
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=["testserver"], CACHES=caches
+            ):
+                results = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        growth = find_query_growth(results)
+        output = {
+            "label": options["label"],
+            "repeat": options["repeat"],
+            "seed": options["seed"],
+            "results": results,
+            "query_growth": growth,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(output, file, indent=2)
+        else:
+            self.stdout.write(json.dumps(output, indent=2))
+
+        if growth:
+            raise CommandError(
+                "The query count grows with the number of products: "
+                + ", ".join(
+                    f"{route} {counts}" for route, counts in growth.items()
+                )
+            )
+
+    def run_benchmarks(self, options):
+        results = []
+        for count in options["sizes"]:
+            call_command("flush", interactive=False, verbosity=0)
+            invalidate()
+            self.stderr.write(f"Seeding {count} products")
+            seed_catalog(count, seed=options["seed"])
+            self.stderr.write(f"Measuring {count} products")
+            results.extend(benchmark_routes(count, repeat=options["repeat"]))
+        return results
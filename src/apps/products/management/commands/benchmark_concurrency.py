@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import override_settings
+
+from apps.products.benchmark import empty_cache
+from apps.products.concurrency import get_async_routes, measure_throughput
+from apps.products.seeding import seed_catalog
+
+MODES = ("wsgi", "asgi")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a catalog into a test database and compare the throughput of "
+        "the catalog reads served by WSGI and by ASGI with the async views, "
+        "under many concurrent connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=10000,
+            help="Number of products to seed",
+        )
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=500,
+            help="Number of concurrent connections",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=5000,
+            help="Number of requests per endpoint",
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=32,
+            help="Number of threads serving the WSGI connections",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the generated catalog",
+        )
+        parser.add_argument(
+            "--label",
+            default="",
+            help="Recorded in the output, e.g. the commit being measured",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the JSON results to this file instead of stdout",
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Destroy a leftover test database without asking",
+        )
+        # Set on the processes measuring one server mode
+        parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["serve"]:
+            self.serve(options)
+            return
+
+        old_name = settings.DATABASES["default"]["NAME"]
+        test_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=not options["interactive"]
+        )
+        try:
+            self.stderr.write(f"Seeding {options['products']} products")
+            seed_catalog(options["products"], seed=options["seed"])
+            # The seeded rows are committed, the measuring processes see
+            # them through their own connections
+            connection.close()
+            measured = {
+                mode: self.run_mode(mode, test_name, options) for mode in MODES
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = []
+        for wsgi, asgi in zip(measured["wsgi"], measured["asgi"]):
+            results.append(
+                {
+                    "route": wsgi["route"],
+                    "url": wsgi["url"],
+                    "wsgi": wsgi["throughput"],
+                    "asgi": asgi["throughput"],
+                    "speedup": round(
+                        asgi["throughput"]["requests_per_second"]
+                        / wsgi["throughput"]["requests_per_second"],
+                        2,
+                    ),
+                }
+            )
+        output = {
+            "label": options["label"],
+            "products": options["products"],
+            "connections": options["connections"],
+            "requests": options["requests"],
+            "wsgi_threads": options["wsgi_threads"],
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(output, file, indent=2)
+        else:
+            self.stdout.write(json.dumps(output, indent=2))
+
+    def run_mode(self, mode, database_name, options):
+        """Measure `mode` in a new process, see `apps.products.concurrency`."""
+        self.stderr.write(f"Measuring {mode}")
+        command = [
+            sys.executable,
+            "-m",
+            "django",
+            "benchmark_concurrency",
+            f"--serve={mode}",
+            f"--connections={options['connections']}",
+            f"--requests={options['requests']}",
+            f"--wsgi-threads={options['wsgi_threads']}",
+        ]
+        env = {
+            **os.environ,
+            "POSTGRES_DB": database_name,
+            "DJANGO_ASYNC_READ_VIEWS": str(mode == "asgi"),
+        }
+        process = subprocess.run(
+            command,
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        if process.returncode:
+            raise CommandError(f"Measuring {mode} failed")
+        return json.loads(process.stdout)
+
+    def serve(self, options):
+        # The cache keys get their own prefix, so the data of the configured
+        # cache is left alone
+        caches = {
+            alias: {**config, "KEY_PREFIX": "benchmark"}
+            for alias, config in settings.CACHES.items()
+        }
+        with override_settings(ALLOWED_HOSTS=["testserver"], CACHES=caches):
+            empty_cache()
+            if options["serve"] == "asgi":
+                application, threads = get_asgi_application(), 0
+            else:
+                application = get_wsgi_application()
+                threads = options["wsgi_threads"]
+
+            results = []
+            for label, _, url in get_async_routes():
+                # Fills the caches, so the cold start is not measured
+                measure_throughput(application, url, 1, 1, threads)
+                results.append(
+                    {
+                        "route": label,
+                        "url": url,
+                        "throughput": measure_throughput(
+                            application,
+                            url,
+                            options["connections"],
+                            options["requests"],
+                            threads,
+                        ),
+                    }
+                )
+            empty_cache()
+        self.stdout.write(json.dumps(results))
@@ -0,0 +1,70 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.importers import FORMATS, CatalogImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products with their sizes, images and categories from a "
+        "JSONL or CSV file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Path to the catalog file, or - to read stdin"
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows validated and written together",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=100,
+            help="Number of rejected rows to report",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+        if file_format is None:
+            raise CommandError(
+                "Cannot guess the format of the file, pass --format."
+            )
+
+        importer = CatalogImporter(
+            chunk_size=options["chunk_size"],
+            max_errors=options["max_errors"],
+        )
+        if path == "-":
+            result = importer.run(sys.stdin, file_format, self.report)
+        else:
+            with open(path, encoding="utf-8", newline="") as stream:
+                result = importer.run(stream, file_format, self.report)
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created} products, skipped "
+                f"{result.skipped} rows in {result.elapsed:.1f}s "
+                f"({result.rows_per_second:.0f} rows/s)"
+            )
+        )
+
+    def report(self, result):
+        if self.verbosity > 1:
+            self.stdout.write(
+                f"{result.created + result.skipped} rows "
+                f"({result.rows_per_second:.0f} rows/s)"
+            )
@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from apps.products.imaging import render_variants
+from apps.products.variants import (
+    generate_variants,
+    images_needing_variants,
+    read_original,
+    render_options,
+    save_variants,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the missing or stale resized variants of every image. "
+        "Images whose variants are up to date are skipped, so an "
+        "interrupted run can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes, 0 renders in this process",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of images fetched from the database at once",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.done = self.failed = 0
+        workers = options["workers"]
+
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self.render_in_pool(executor, workers, options["batch_size"])
+        else:
+            for image in self.iter_images(options["batch_size"]):
+                self.report(image, generate_variants(image))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated the variants of {self.done} images, "
+                f"{self.failed} failed"
+            )
+        )
+
+    def iter_images(self, batch_size):
+        """
+        Walk the images needing variants in primary key order, one batch
+        per query, so the images done meanwhile drop out of later batches.
+        """
+        last_id = 0
+        while True:
+            batch = list(
+                images_needing_variants()
+                .filter(pk__gt=last_id)
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1].pk
+
+    def render_in_pool(self, executor, workers, batch_size):
+        """
+        Keep every worker busy while holding at most two originals per
+        worker in memory, and save the variants as soon as they are ready.
+        """
+        pending = {}
+        for image in self.iter_images(batch_size):
+            content = read_original(image)
+            if content is None:
+                self.report(image, False)
+                continue
+            future = executor.submit(
+                render_variants, content, *render_options()
+            )
+            pending[future] = image
+            if len(pending) >= workers * 2:
+                self.collect(pending, FIRST_COMPLETED)
+        self.collect(pending)
+
+    def collect(self, pending, return_when="ALL_COMPLETED"):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            image = pending.pop(future)
+            try:
+                save_variants(image.pk, image.img.name, future.result())
+            except Exception as exc:
+                # A broken original must not stop the others
+                self.report(image, False, exc)
+                continue
+            self.report(image, True)
+
+    def report(self, image, success, error=None):
+        if success:
+            self.done += 1
+        else:
+            self.failed += 1
+            message = f"Cannot generate the variants of {image}"
+            if error is not None:
+                message += f": {error!r}"
+            self.stderr.write(message)
+        if self.verbosity > 1 and success:
+            self.stdout.write(f"{image}")
@@ -0,0 +1,185 @@
+import argparse
+import os
+import time
+
+from cachalot.api import invalidate
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.products.cache import CATEGORY_TREE_VERSION_KEY, bump_version
+from apps.products.models import (
+    Category,
+    CategoryClosure,
+    FileCleanup,
+    Image,
+    ImageVariant,
+    Product,
+    Size,
+    StoredFile,
+)
+from apps.products.object_cache import product_cache
+from apps.products.seeding import CatalogShape, seed_catalog
+
+# Emptied by --clear, the link tables go with them
+CATALOG_MODELS = [
+    Product,
+    Category,
+    CategoryClosure,
+    Size,
+    Image,
+    ImageVariant,
+    StoredFile,
+    FileCleanup,
+]
+
+
+def count_range(value):
+    """Parse `N` or `MIN-MAX` into an inclusive `(min, max)` pair."""
+    low, _, high = value.partition("-")
+    try:
+        bounds = (int(low), int(high or low))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid range: {value}")
+    if bounds[0] < 0 or bounds[0] > bounds[1]:
+        raise argparse.ArgumentTypeError(f"Invalid range: {value}")
+    return bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic catalog of the given size. The "
+        "same seed and options always produce the same catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "products", type=int, help="Number of products to create"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the catalog"
+        )
+        parser.add_argument(
+            "--category-depth",
+            type=int,
+            default=3,
+            help="Number of levels of the category tree",
+        )
+        parser.add_argument(
+            "--category-fan-out",
+            type=int,
+            default=5,
+            help="Number of roots and of children of every inner category",
+        )
+        parser.add_argument(
+            "--sizes", type=int, default=10, help="Number of sizes"
+        )
+        parser.add_argument(
+            "--images",
+            type=int,
+            help="Number of images shared by the products, a quarter of "
+            "the products by default",
+        )
+        parser.add_argument(
+            "--categories-per-product",
+            type=count_range,
+            default=(1, 3),
+            help="Categories of a product, as N or MIN-MAX",
+        )
+        parser.add_argument(
+            "--sizes-per-product",
+            type=count_range,
+            default=(2, 5),
+            help="Sizes of a product, as N or MIN-MAX",
+        )
+        parser.add_argument(
+            "--images-per-product",
+            type=count_range,
+            default=(1, 4),
+            help="Images of a product, as N or MIN-MAX",
+        )
+        parser.add_argument(
+            "--no-image-files",
+            action="store_false",
+            dest="image_files",
+            help="Do not store placeholder files for the images",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of processes writing the rows, 0 writes them in "
+            "this process",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of rows written together",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete the whole catalog first, and restart the ids so "
+            "the catalog is the same as on a fresh database. The files "
+            "left behind are removed by sweep_orphan_files",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        shape = CatalogShape(
+            category_depth=options["category_depth"],
+            category_fan_out=options["category_fan_out"],
+            sizes=options["sizes"],
+            images=options["images"],
+            categories_per_product=options["categories_per_product"],
+            sizes_per_product=options["sizes_per_product"],
+            images_per_product=options["images_per_product"],
+            image_files=options["image_files"],
+        )
+        if options["clear"]:
+            self.clear_catalog()
+        elif Product.objects.exists():
+            self.stderr.write(
+                "The database already has products, the new ones are added "
+                "with the next free ids."
+            )
+
+        self.written = {"images": 0, "products": 0}
+        start = time.perf_counter()
+        images = seed_catalog(
+            options["products"],
+            seed=options["seed"],
+            shape=shape,
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            progress=self.report,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {options['products']} products and {images} "
+                f"images in {elapsed:.1f}s"
+            )
+        )
+
+    def report(self, kind, written):
+        self.written[kind] += written
+        if self.verbosity > 1:
+            self.stdout.write(f"{kind}: {self.written[kind]}")
+
+    @staticmethod
+    def clear_catalog():
+        tables = ", ".join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in CATALOG_MODELS
+        )
+        with connection.cursor() as cursor:
+            # Inside a transaction, TRUNCATE refuses to run while deferred
+            # foreign key checks of earlier writes are pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        # TRUNCATE sends no signals, and the restarted ids are given to new
+        # objects, which must not get the cached representations of the old
+        invalidate()
+        product_cache.clear()
+        transaction.on_commit(lambda: bump_version(CATEGORY_TREE_VERSION_KEY))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.cleanup import delete_orphans, find_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Find the files under MEDIA_ROOT/images/ that no image or image "
+        "variant refers to, and delete them with --delete."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Queue the orphaned files for deletion instead of listing "
+            "them",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Ignore files modified less than this many seconds ago",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of files checked and queued together",
+        )
+
+    def handle(self, *args, **options):
+        found = deleted = 0
+        batch = []
+        for name in find_orphans(min_age=options["min_age"]):
+            found += 1
+            if not options["delete"]:
+                self.stdout.write(name)
+                continue
+            batch.append(name)
+            if len(batch) >= options["batch_size"]:
+                deleted += len(delete_orphans(batch))
+                batch = []
+        if batch:
+            deleted += len(delete_orphans(batch))
+
+        if options["delete"]:
+            summary = f"Found {found} orphaned files, queued {deleted}"
+        else:
+            summary = f"Found {found} orphaned files"
+        self.stdout.write(self.style.SUCCESS(summary))
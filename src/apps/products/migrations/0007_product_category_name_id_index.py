@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0006_alter_category_slug_alter_product_slug"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["name", "id"], name="products_category_name_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["name", "id"], name="products_product_name_id"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+POPULATE_CLOSURE_SQL = """
+    WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM products_category
+        UNION ALL
+        SELECT tree.ancestor_id, category.id, tree.depth + 1
+        FROM tree
+        JOIN products_category category
+          ON category.parent_category_id = tree.descendant_id
+    )
+    INSERT INTO products_categoryclosure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, depth FROM tree
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0007_product_category_name_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "depth",
+                    models.PositiveIntegerField(
+                        help_text="Number of levels between the ancestor and the descendant"
+                    ),
+                ),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="products.category",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="products.category",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"],
+                        name="products_closure_desc_depth",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="categoryclosure",
+            constraint=models.UniqueConstraint(
+                fields=("ancestor", "descendant"),
+                name="products_categoryclosure_unique",
+            ),
+        ),
+        migrations.RunSQL(POPULATE_CLOSURE_SQL, migrations.RunSQL.noop),
+    ]
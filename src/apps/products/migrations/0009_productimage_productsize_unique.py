@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+# Keep the first link when a product is linked to the same image or size
+# more than once, so the constraints can be created.
+DELETE_DUPLICATES_SQL = """
+    DELETE FROM {table} duplicate
+    USING {table} original
+    WHERE duplicate.product_id = original.product_id
+      AND duplicate.{column} = original.{column}
+      AND duplicate.id > original.id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0008_category_closure"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            DELETE_DUPLICATES_SQL.format(
+                table="products_productimage", column="image_id"
+            ),
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            DELETE_DUPLICATES_SQL.format(
+                table="products_productsize", column="size_id"
+            ),
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="productimage",
+            constraint=models.UniqueConstraint(
+                fields=("product", "image"),
+                name="products_productimage_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productsize",
+            constraint=models.UniqueConstraint(
+                fields=("product", "size"), name="products_productsize_unique"
+            ),
+        ),
+    ]
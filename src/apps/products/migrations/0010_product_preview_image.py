@@ -0,0 +1,117 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Before the constraint existed a failed save could leave several previews,
+# keep the most recently linked one.
+CLEAR_EXTRA_PREVIEWS_SQL = """
+    UPDATE products_productimage extra
+    SET is_preview = false
+    FROM products_productimage latest
+    WHERE extra.product_id = latest.product_id
+      AND extra.is_preview AND latest.is_preview
+      AND extra.id < latest.id
+"""
+
+# Statement level triggers see all the rows of a bulk insert, update or
+# delete at once through their transition tables, so a COPY of many rows
+# updates the affected products in one statement. Only rows that are or
+# were a preview can move the pointer.
+PREVIEW_TRIGGER_SQL = """
+    CREATE FUNCTION products_sync_preview_image() RETURNS trigger AS $$
+    DECLARE
+        product_ids bigint[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT product_id) INTO product_ids
+            FROM new_rows WHERE is_preview;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT product_id) INTO product_ids
+            FROM old_rows WHERE is_preview;
+        ELSE
+            SELECT array_agg(DISTINCT product_id) INTO product_ids FROM (
+                SELECT product_id FROM old_rows WHERE is_preview
+                UNION ALL
+                SELECT product_id FROM new_rows WHERE is_preview
+            ) changed;
+        END IF;
+
+        IF product_ids IS NOT NULL THEN
+            UPDATE products_product product
+            SET preview_image_id = link.image_id
+            FROM unnest(product_ids) AS changed (id)
+            LEFT JOIN products_productimage link
+              ON link.product_id = changed.id AND link.is_preview
+            WHERE product.id = changed.id
+              AND product.preview_image_id IS DISTINCT FROM link.image_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER products_productimage_preview_insert
+        AFTER INSERT ON products_productimage
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_preview_image();
+
+    CREATE TRIGGER products_productimage_preview_update
+        AFTER UPDATE ON products_productimage
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_preview_image();
+
+    CREATE TRIGGER products_productimage_preview_delete
+        AFTER DELETE ON products_productimage
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_preview_image();
+
+    UPDATE products_product product
+    SET preview_image_id = link.image_id
+    FROM products_productimage link
+    WHERE link.product_id = product.id AND link.is_preview;
+"""
+
+DROP_PREVIEW_TRIGGER_SQL = """
+    DROP TRIGGER products_productimage_preview_insert
+        ON products_productimage;
+    DROP TRIGGER products_productimage_preview_update
+        ON products_productimage;
+    DROP TRIGGER products_productimage_preview_delete
+        ON products_productimage;
+    DROP FUNCTION products_sync_preview_image();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0009_productimage_productsize_unique"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CLEAR_EXTRA_PREVIEWS_SQL,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="preview_image",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                help_text="The preview among the product images, kept up to date by a database trigger on ProductImage",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="products.image",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productimage",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_preview", True)),
+                fields=("product",),
+                name="products_productimage_one_preview",
+            ),
+        ),
+        migrations.RunSQL(PREVIEW_TRIGGER_SQL, DROP_PREVIEW_TRIGGER_SQL),
+    ]
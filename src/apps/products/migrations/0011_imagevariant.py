@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0010_product_preview_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageVariant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        help_text="Name of the original file it was made from",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "width",
+                    models.PositiveIntegerField(help_text="Width in pixels"),
+                ),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("webp", "WebP"), ("jpeg", "JPEG")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        max_length=255, upload_to="images/variants/"
+                    ),
+                ),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="variants",
+                        to="products.image",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="imagevariant",
+            constraint=models.UniqueConstraint(
+                fields=("image", "width", "format"),
+                name="products_imagevariant_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:00
+
+import apps.products.storage
+from django.db import migrations, models
+
+# Files uploaded before keep their names, they are tracked like the new ones
+TRACK_EXISTING_FILES_SQL = """
+    INSERT INTO products_storedfile (name, reference_count)
+    SELECT img, count(*) FROM products_image WHERE img <> '' GROUP BY img
+"""
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0011_imagevariant"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("reference_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="image",
+            name="img",
+            field=models.ImageField(
+                storage=apps.products.storage.ContentAddressedStorage(),
+                upload_to="images/",
+            ),
+        ),
+        migrations.RunSQL(TRACK_EXISTING_FILES_SQL, migrations.RunSQL.noop),
+    ]
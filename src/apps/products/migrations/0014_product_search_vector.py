@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:22
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# The vector is computed by a row trigger, so bulk inserts, COPY and
+# queryset updates keep it current as well. The configuration must match
+# `apps.products.search.SEARCH_CONFIG`.
+SEARCH_VECTOR_TRIGGER_SQL = """
+    CREATE FUNCTION products_product_search_vector(name text, description text)
+    RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('english', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE FUNCTION products_update_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := products_product_search_vector(
+            NEW.name, NEW.description
+        );
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER products_product_search_vector
+    BEFORE INSERT OR UPDATE OF name, description, search_vector
+    ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_update_search_vector();
+
+    UPDATE products_product
+    SET search_vector = products_product_search_vector(name, description);
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER_SQL = """
+    DROP TRIGGER products_product_search_vector ON products_product;
+    DROP FUNCTION products_update_search_vector();
+    DROP FUNCTION products_product_search_vector(text, text);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0013_filecleanup"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Weighted words of the name and description, kept up to date by a database trigger, see apps.products.search",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="products_product_search"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    "name", name="gin_trgm_ops"
+                ),
+                name="products_product_name_trgm",
+            ),
+        ),
+        migrations.RunSQL(
+            SEARCH_VECTOR_TRIGGER_SQL, DROP_SEARCH_VECTOR_TRIGGER_SQL
+        ),
+    ]
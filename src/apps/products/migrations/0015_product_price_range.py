@@ -0,0 +1,121 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+# Statement level triggers, as for the preview image: the prices of the
+# products touched by a statement are aggregated again from their active
+# sizes, using the index on the product of ProductSize, so a COPY of many
+# sizes updates each product once.
+PRICE_RANGE_TRIGGER_SQL = """
+    CREATE FUNCTION products_sync_price_range() RETURNS trigger AS $$
+    DECLARE
+        product_ids bigint[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT product_id) INTO product_ids
+            FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT product_id) INTO product_ids
+            FROM old_rows;
+        ELSE
+            SELECT array_agg(DISTINCT product_id) INTO product_ids FROM (
+                SELECT product_id FROM old_rows
+                UNION ALL
+                SELECT product_id FROM new_rows
+            ) changed;
+        END IF;
+
+        IF product_ids IS NOT NULL THEN
+            UPDATE products_product product
+            SET min_price = prices.min_price, max_price = prices.max_price
+            FROM (
+                SELECT changed.id,
+                       min(size.price) AS min_price,
+                       max(size.price) AS max_price
+                FROM unnest(product_ids) AS changed (id)
+                LEFT JOIN products_productsize size
+                  ON size.product_id = changed.id AND size.is_active
+                GROUP BY changed.id
+            ) prices
+            WHERE product.id = prices.id
+              AND (product.min_price, product.max_price)
+                  IS DISTINCT FROM (prices.min_price, prices.max_price);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER products_productsize_price_insert
+        AFTER INSERT ON products_productsize
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_price_range();
+
+    CREATE TRIGGER products_productsize_price_update
+        AFTER UPDATE ON products_productsize
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_price_range();
+
+    CREATE TRIGGER products_productsize_price_delete
+        AFTER DELETE ON products_productsize
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION products_sync_price_range();
+
+    UPDATE products_product product
+    SET min_price = prices.min_price, max_price = prices.max_price
+    FROM (
+        SELECT product_id, min(price) AS min_price, max(price) AS max_price
+        FROM products_productsize
+        WHERE is_active
+        GROUP BY product_id
+    ) prices
+    WHERE prices.product_id = product.id;
+"""
+
+DROP_PRICE_RANGE_TRIGGER_SQL = """
+    DROP TRIGGER products_productsize_price_insert ON products_productsize;
+    DROP TRIGGER products_productsize_price_update ON products_productsize;
+    DROP TRIGGER products_productsize_price_delete ON products_productsize;
+    DROP FUNCTION products_sync_price_range();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0014_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="max_price",
+            field=models.PositiveIntegerField(
+                editable=False,
+                help_text="The highest price of the active sizes, kept up to date by a database trigger on ProductSize",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.PositiveIntegerField(
+                editable=False,
+                help_text="The lowest price of the active sizes, kept up to date by a database trigger on ProductSize",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["min_price", "id"], name="products_product_min_price"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["max_price"], name="products_product_max_price"
+            ),
+        ),
+        migrations.RunSQL(
+            PRICE_RANGE_TRIGGER_SQL, DROP_PRICE_RANGE_TRIGGER_SQL
+        ),
+    ]
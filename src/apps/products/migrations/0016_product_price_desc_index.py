@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0015_product_price_range"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                models.OrderBy(
+                    models.F("min_price"), descending=True, nulls_last=True
+                ),
+                models.OrderBy(models.F("id"), descending=True),
+                name="products_product_price_desc",
+            ),
+        ),
+    ]
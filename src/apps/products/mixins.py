@@ -1,8 +1,166 @@
+import asyncio
+import json
+import weakref
+from functools import update_wrapper
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import mixins
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.fields import IntegerField
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from apps.products.models import Product
+from apps.products.object_cache import product_cache
+
+# A semaphore can only be awaited on the event loop it was first used on
+_read_slots = weakref.WeakKeyDictionary()
+
+
+def get_pagination_key_fields(paginator, queryset):
+    """
+    Return the fields `paginator` needs to build the cursor links of a page
+    of `.values()` rows, leaving out the annotations the queryset does not
+    have.
+    """
+    orderings = getattr(paginator, "orderings", {})
+    available = set(queryset.query.annotations) | {
+        field.name for field in queryset.model._meta.concrete_fields
+    }
+    return {
+        order.lstrip("-")
+        for ordering in orderings.values()
+        for order in ordering
+        if order.lstrip("-") in available
+    } or {"pk"}
+
+
+def get_read_slots():
+    """
+    Return the semaphore bounding the reads handled at once by the async
+    views on the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    slots = _read_slots.get(loop)
+    if slots is None:
+        slots = _read_slots[loop] = asyncio.Semaphore(
+            settings.ASYNC_READ_CONCURRENCY
+        )
+    return slots
+
+
+class AsyncReadMixin:
+    """
+    A mixin serving the list and retrieve actions with async handlers, so
+    that under ASGI a read waiting on the database or Redis does not hold
+    a thread.
+
+        When `ASYNC_READ_VIEWS` is on, `as_view` returns a coroutine view.
+    Requests routed to list or retrieve are dispatched on the event loop to
+    `alist` and `aretrieve`; every other action, the writes included, goes
+    through the regular view, run in a thread. Authentication, permissions
+    and throttling are DRF's own, run in a thread as well since the
+    authenticators query the database. Under WSGI the setting stays off:
+    there an async view only adds an event loop per request.
+        At most `ASYNC_READ_CONCURRENCY` reads are handled at once, the
+    others wait for a slot on the event loop. Each one in progress runs its
+    queries in a thread of its own, with its own database connection, so
+    this bounds both the way the thread pool of a WSGI server does.
+        Django's async ORM still runs each query in a thread, one hop per
+    query, so the handlers group the synchronous work that goes together
+    (filtering and paginating, serializing) into a single hop.
+    """
+
+    async_actions = ("list", "retrieve")
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_READ_VIEWS:
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            action_map = dict(actions)
+            if "get" in action_map and "head" not in action_map:
+                action_map["head"] = action_map["get"]
+            if action_map.get(request.method.lower()) not in cls.async_actions:
+                return await sync_view(request, *args, **kwargs)
+
+            self = cls(**initkwargs)
+            self.action_map = action_map
+            async with get_read_slots():
+                return await self.adispatch(request, *args, **kwargs)
+
+        # Keeps the attributes routers and schema generators read, and the
+        # exemption from CSRF checks of the DRF view
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """`dispatch` awaiting the async handler of the action."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset, page = await sync_to_async(self.get_page)()
+        items = page if page is not None else [obj async for obj in queryset]
+        data = await sync_to_async(self.serialize)(items, many=True)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(await sync_to_async(self.serialize)(instance))
+
+    async def aget_object(self):
+        """`get_object` fetching the object with the async ORM."""
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**lookup)
+        except (
+            queryset.model.DoesNotExist,
+            TypeError,
+            ValueError,
+            DjangoValidationError,
+        ):
+            raise Http404(
+                f"No {queryset.model._meta.object_name} matches the given "
+                "query."
+            )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get_page(self):
+        """Return the filtered queryset and its requested page, if any."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return queryset, self.paginate_queryset(queryset)
+
+    def serialize(self, instance, many=False):
+        return self.get_serializer(instance, many=many).data
 
 
 class ListProductMixin:
@@ -15,22 +173,37 @@ class ListProductMixin:
     status code if the product is not found.
         If the product is not
     found, a 404 status code will be returned instead of 200.
+        The check runs against the fetched page, so the product is only
+    looked up when the page is empty and the related rows are never
+    evaluated twice. `alist` does the same for `AsyncReadMixin`.
     """
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        if not queryset and "product_id" in self.kwargs:
+        page = self.paginate_queryset(queryset)
+        items = page if page is not None else queryset
+        if not items and "product_id" in self.kwargs:
             product_id = self.kwargs.get("product_id")
             get_object_or_404(Product, pk=product_id)
 
-        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(items, many=True)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    async def alist(self, request, *args, **kwargs):
+        queryset, page = await sync_to_async(self.get_page)()
+        items = page if page is not None else [obj async for obj in queryset]
+        if not items and "product_id" in self.kwargs:
+            product_id = self.kwargs.get("product_id")
+            if not await Product.objects.filter(pk=product_id).aexists():
+                raise Http404("No Product matches the given query.")
+
+        data = await sync_to_async(self.serialize)(items, many=True)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
 
 class ProductRelationsMixin:
     """
@@ -73,7 +246,13 @@ class PerformCreateProductMixin:
     def perform_create(self, serializer):
         product_id = self.kwargs.get("product_id")
         product = get_object_or_404(Product, pk=product_id)
-        serializer.save(product=product)
+        try:
+            with transaction.atomic():
+                serializer.save(product=product)
+        except IntegrityError:
+            raise ValidationError(
+                {"non_field_errors": ["The product already has this link."]}
+            )
 
 
 class CreateMixin(mixins.CreateModelMixin):
@@ -103,3 +282,330 @@ class CreateMixin(mixins.CreateModelMixin):
         if self.action == "create":
             return self.serializer_create_class
         return super().get_serializer_class()
+
+
+class DBRenderedListMixin:
+    """
+    A mixin that adds an optional "db-rendered" mode to the list action.
+
+        When the request has `?render=db`, each object of the page is
+    rendered to its final JSON by PostgreSQL and the text is streamed to the
+    client as is, instead of going through prefetches and the serializer.
+    The response has the same shape as the regular paginated list.
+
+    Attributes:
+        db_rendered_json: A callable taking the request and returning an
+         expression that renders a row to JSON text. Subclasses must provide
+         this attribute.
+    """
+
+    db_rendered_query_param = "render"
+    db_rendered_query_value = "db"
+    db_rendered_json = None
+
+    def list(self, request, *args, **kwargs):
+        render = request.query_params.get(self.db_rendered_query_param)
+        if render == self.db_rendered_query_value:
+            return self.db_rendered_list(request)
+        return super().list(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        render = request.query_params.get(self.db_rendered_query_param)
+        if render == self.db_rendered_query_value:
+            return await sync_to_async(self.db_rendered_list)(request)
+        return await super().alist(request, *args, **kwargs)
+
+    def db_rendered_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if queryset.query.distinct:
+            # DISTINCT can not be applied to a json column, and comparing the
+            # whole row is wasteful anyway.
+            queryset = queryset.model.objects.filter(
+                pk__in=queryset.values("pk")
+            )
+
+        rows = queryset.annotate(
+            rendered_json=self.db_rendered_json(request)
+        ).values(
+            *get_pagination_key_fields(self.paginator, queryset),
+            "rendered_json",
+        )
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return StreamingHttpResponse(
+                self._stream_json_array(rows.iterator()),
+                content_type="application/json",
+            )
+
+        links = {
+            "next": self.paginator.get_next_link(),
+            "previous": self.paginator.get_previous_link(),
+        }
+        return StreamingHttpResponse(
+            self._stream_paginated_json(links, page),
+            content_type="application/json",
+        )
+
+    def _stream_paginated_json(self, links, page):
+        yield json.dumps(links)[:-1] + ', "results": '
+        yield from self._stream_json_array(page)
+        yield "}"
+
+    @staticmethod
+    def _stream_json_array(rows, chunk_size=100):
+        rows = iter(rows)
+        separator = ""
+        yield "["
+        while chunk := list(islice(rows, chunk_size)):
+            yield separator + ",".join(row["rendered_json"] for row in chunk)
+            separator = ","
+        yield "]"
+
+
+class ObjectCacheMixin:
+    """
+    A mixin serving the retrieve and list actions from a per-object cache
+    of the serialized objects, see `apps.products.object_cache`.
+
+        The list only selects the keys of the page, then takes the objects
+    from the cache with one multi-get. The objects missing from it are
+    loaded with the regular queryset, serialized and cached. A retrieve
+    with query parameters, which may filter the object out, skips the
+    cache. With `AsyncReadMixin`, `alist` and `aretrieve` do the same
+    through the non-blocking Redis client of `apps.products.async_cache`.
+
+    Attributes:
+        object_cache: The `ObjectCache` holding the serialized objects.
+         Subclasses must provide this attribute, and invalidate its entries
+         when the objects change.
+    """
+
+    object_cache = None
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.get_cached_pk(request)
+        if pk is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        cached, versions = self.object_cache.get_many([pk], request)
+        if pk in cached:
+            return Response(cached[pk])
+        response = super().retrieve(request, *args, **kwargs)
+        self.object_cache.set_many({pk: response.data}, versions, request)
+        return response
+
+    async def aretrieve(self, request, *args, **kwargs):
+        pk = self.get_cached_pk(request)
+        if pk is None:
+            return await super().aretrieve(request, *args, **kwargs)
+
+        cached, versions = await self.object_cache.aget_many([pk], request)
+        if pk in cached:
+            return Response(cached[pk])
+        response = await super().aretrieve(request, *args, **kwargs)
+        await self.object_cache.aset_many(
+            {pk: response.data}, versions, request
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        page, pks = self.paginate_pks()
+        results = self.get_cached_objects(request, pks)
+        if page is not None:
+            return self.get_paginated_response(results)
+        return Response(results)
+
+    async def alist(self, request, *args, **kwargs):
+        page, pks = await sync_to_async(self.paginate_pks)()
+        cached, versions = await self.object_cache.aget_many(pks, request)
+        missing = [pk for pk in pks if pk not in cached]
+        if missing:
+            fresh = await sync_to_async(self.serialize_objects)(missing)
+            await self.object_cache.aset_many(fresh, versions, request)
+            cached.update(fresh)
+        results = [cached[pk] for pk in pks if pk in cached]
+        if page is not None:
+            return self.get_paginated_response(results)
+        return Response(results)
+
+    def paginate_pks(self):
+        """
+        Return the requested page of key rows, if any, and the primary keys
+        of the objects to list.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.prefetch_related(None).values(
+            "pk", *get_pagination_key_fields(self.paginator, queryset)
+        )
+        page = self.paginate_queryset(rows)
+        return page, [
+            row["pk"] for row in (page if page is not None else rows)
+        ]
+
+    def get_cached_objects(self, request, pks):
+        """
+        Return the representations of the objects of `pks`, in the same
+        order, taking them from the cache where possible.
+        """
+        cached, versions = self.object_cache.get_many(pks, request)
+        missing = [pk for pk in pks if pk not in cached]
+        if missing:
+            fresh = self.serialize_objects(missing)
+            self.object_cache.set_many(fresh, versions, request)
+            cached.update(fresh)
+        return [cached[pk] for pk in pks if pk in cached]
+
+    def serialize_objects(self, pks):
+        """Return a `{pk: data}` mapping of the objects of `pks` found."""
+        objects = list(self.get_queryset().filter(pk__in=pks))
+        data = self.get_serializer(objects, many=True).data
+        return {obj.pk: item for obj, item in zip(objects, data)}
+
+    def get_cached_pk(self, request):
+        if request.query_params:
+            return None
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            return int(self.kwargs[lookup_url_kwarg])
+        except (KeyError, ValueError):
+            return None
+
+
+class BulkLinkMixin:
+    """
+    A mixin adding a `bulk/` route that links or unlinks many objects to
+    the product at once.
+
+        `POST bulk/` takes a list of links and upserts them: new links are
+    created and the fields of existing links are overwritten, with one
+    INSERT ... ON CONFLICT. `DELETE bulk/?ids=1&ids=2` removes the links
+    to the given objects. Both run in one transaction and can be retried
+    or sent by concurrent editors without creating duplicates or failing
+    on links that already exist or are already gone.
+        The linked ids of a payload are checked with one query, instead of
+    one per link as with the regular create endpoint.
+
+    Attributes:
+        bulk_serializer_class: The serializer validating a single link of
+         the payload. Its `link_field` attribute names the field holding the
+         id of the linked object.
+        link_update_fields: Fields overwritten when the link already exists.
+         When empty, existing links are left as they are.
+    """
+
+    bulk_serializer_class = None
+    link_update_fields = ()
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        filter_backends=[],
+        pagination_class=None,
+    )
+    def bulk(self, request, *args, **kwargs):
+        if request.method == "DELETE":
+            return self.bulk_unlink(request)
+        return self.bulk_link(request)
+
+    def bulk_link(self, request):
+        product_id = self.get_bulk_product_id()
+        serializer = self.bulk_serializer_class(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        links = serializer.validated_data
+        link_field = self.bulk_serializer_class.link_field
+        ids = [link[link_field] for link in links]
+        self.check_linked_ids_exist(link_field, ids)
+
+        try:
+            with transaction.atomic():
+                self.perform_bulk_link(product_id, links)
+                # Bulk inserts and updates send no signals
+                product_cache.invalidate([product_id])
+        except IntegrityError:
+            # A linked object or the product was deleted since the checks
+            self.check_linked_ids_exist(link_field, ids)
+            self.get_bulk_product_id()
+            raise ValidationError(
+                {
+                    "non_field_errors": [
+                        "The links conflict with a concurrent change."
+                    ]
+                }
+            )
+
+        queryset = self.get_queryset().filter(**{f"{link_field}_id__in": ids})
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def bulk_unlink(self, request):
+        product_id = self.get_bulk_product_id()
+        ids = self.get_bulk_ids(request)
+        link_field = self.bulk_serializer_class.link_field
+        with transaction.atomic():
+            self.model.objects.filter(
+                product_id=product_id, **{f"{link_field}_id__in": ids}
+            ).delete()
+            # The category links are deleted without signals
+            product_cache.invalidate([product_id])
+        return Response(status=204)
+
+    def perform_bulk_link(self, product_id, links):
+        link_field = self.bulk_serializer_class.link_field
+        objs = [
+            self.model(
+                product_id=product_id,
+                **{
+                    f"{link_field}_id" if name == link_field else name: value
+                    for name, value in link.items()
+                },
+            )
+            for link in links
+        ]
+        if self.link_update_fields:
+            self.model.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=["product", link_field],
+                update_fields=self.link_update_fields,
+            )
+        else:
+            self.model.objects.bulk_create(objs, ignore_conflicts=True)
+
+    def get_bulk_product_id(self):
+        product_id = self.kwargs["product_id"]
+        if not Product.objects.filter(pk=product_id).exists():
+            raise NotFound()
+        return product_id
+
+    def check_linked_ids_exist(self, link_field, ids):
+        """
+        Check that all the linked objects exist with a single query and
+        report the missing ones at the position of their link.
+        """
+        related_model = self.model._meta.get_field(link_field).related_model
+        existing = set(
+            related_model.objects.filter(pk__in=ids).values_list(
+                "pk", flat=True
+            )
+        )
+        errors = [
+            {}
+            if pk in existing
+            else {link_field: [f'Invalid pk "{pk}" - object does not exist.']}
+            for pk in ids
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+
+    @staticmethod
+    def get_bulk_ids(request):
+        field = IntegerField()
+        try:
+            ids = [
+                field.to_internal_value(value)
+                for value in request.query_params.getlist("ids")
+            ]
+        except ValidationError:
+            raise ValidationError({"ids": ["A list of integers is required."]})
+        if not ids:
+            raise ValidationError({"ids": ["This parameter is required."]})
+        return ids
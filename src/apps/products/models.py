@@ -1,11 +1,127 @@
 import os
 
 from autoslug import AutoSlugField
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models import F
 
+from apps.products.cleanup import process_file_cleanup
+from apps.products.storage import image_storage
+from apps.products.tracking import DirtyFieldsMixin
 
-class Image(models.Model):
-    img = models.ImageField(upload_to="images/")
+
+class StoredFileManager(models.Manager):
+    def acquire(self, name):
+        """
+        Take a reference on the stored file `name`, tracking it on first
+        use. The row stays locked until the transaction ends, which holds
+        off a concurrent `delete_unused` of the same file.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, reference_count) VALUES (%s, 1)
+                ON CONFLICT (name) DO UPDATE
+                SET reference_count = {table}.reference_count + 1
+                """,
+                [name],
+            )
+
+    def release(self, name):
+        """
+        Drop a reference on `name`. The file of the last reference is
+        queued for deletion, which only happens if the transaction commits
+        and the file was not acquired again by then.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET reference_count = reference_count - 1
+                WHERE name = %s AND reference_count > 0
+                RETURNING reference_count
+                """,
+                [name],
+            )
+            row = cursor.fetchone()
+        if row is not None and row[0] == 0:
+            FileCleanup.objects.enqueue([name])
+
+    def delete_unused(self, names):
+        """
+        Stop tracking the files of `names` that are not used anymore and
+        return the names of the files that can be deleted: those, and the
+        names that were never tracked. The deleted rows stay locked until
+        the transaction ends, so a concurrent `acquire` waits for the file
+        to be gone and stores it again.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH unused AS (
+                    DELETE FROM {table}
+                    WHERE name = ANY(%s) AND reference_count = 0
+                    RETURNING name
+                )
+                SELECT name FROM unused
+                UNION ALL
+                SELECT candidate.name
+                FROM unnest(%s::varchar[]) AS candidate (name)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} WHERE name = candidate.name
+                )
+                """,
+                [list(names), list(names)],
+            )
+            return [name for (name,) in cursor.fetchall()]
+
+
+class StoredFile(models.Model):
+    """
+    A file of the content-addressed image storage and the number of
+    `Image` rows using it, see `apps.products.storage`.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    reference_count = models.PositiveIntegerField(default=0)
+
+    objects = StoredFileManager()
+
+    def __str__(self):
+        return self.name
+
+
+class FileCleanupManager(models.Manager):
+    def enqueue(self, names):
+        """
+        Queue the files of `names` for deletion. The rows are part of the
+        current transaction, so a rollback keeps the files, and the queue
+        is processed once it commits.
+        """
+        self.bulk_create([self.model(name=name) for name in names])
+        transaction.on_commit(process_file_cleanup)
+
+
+class FileCleanup(models.Model):
+    """
+    A file waiting to be deleted from the media storage, see
+    `apps.products.cleanup`.
+    """
+
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FileCleanupManager()
+
+    def __str__(self):
+        return self.name
+
+
+class Image(DirtyFieldsMixin, models.Model):
+    img = models.ImageField(upload_to="images/", storage=image_storage)
     size_description = models.CharField(
         max_length=100,
         blank=True,
@@ -15,8 +131,50 @@ class Image(models.Model):
     def __str__(self):
         return os.path.basename(self.img.name)
 
+    def save(self, *args, **kwargs):
+        # Saving a new file takes a reference on it before the row is
+        # written, see `StoredFileManager.acquire`, which a failed write
+        # has to drop
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+
+class ImageVariant(models.Model):
+    """
+    A resized copy of an `Image` in one of the formats served to browsers.
+
+        Variants are generated in the background after an upload, see
+    `apps.products.variants`. They remember the original file they were
+    made from, so variants of a replaced file are recognized as stale.
+    """
+
+    class Format(models.TextChoices):
+        WEBP = "webp", "WebP"
+        JPEG = "jpeg", "JPEG"
+
+    image = models.ForeignKey(
+        Image, on_delete=models.CASCADE, related_name="variants"
+    )
+    source = models.CharField(
+        max_length=100, help_text="Name of the original file it was made from"
+    )
+    width = models.PositiveIntegerField(help_text="Width in pixels")
+    format = models.CharField(max_length=10, choices=Format.choices)
+    file = models.FileField(upload_to="images/variants/", max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["image", "width", "format"],
+                name="products_imagevariant_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return os.path.basename(self.file.name)
+
 
-class Category(models.Model):
+class Category(DirtyFieldsMixin, models.Model):
     name = models.CharField(
         max_length=200, help_text="The name of the category."
     )
@@ -53,9 +211,194 @@ class Category(models.Model):
         blank=True, help_text="A description of the category"
     )
 
+    class Meta:
+        indexes = [
+            # Keyset pagination ordered by name
+            models.Index(
+                fields=["name", "id"], name="products_category_name_id"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def get_ancestors(self):
+        """
+        Return the parent categories of this category up to the root,
+        nearest first.
+        """
+        return Category.objects.filter(
+            descendant_links__descendant=self,
+            descendant_links__depth__gt=0,
+        ).order_by("descendant_links__depth")
+
+    def get_descendants(self):
+        """
+        Return all the categories nested under this category, at any depth.
+        """
+        return Category.objects.filter(
+            ancestor_links__ancestor=self, ancestor_links__depth__gt=0
+        )
+
+
+class CategoryClosureManager(models.Manager):
+    def rebuild(self):
+        """
+        Recompute the whole closure table from `Category.parent_category`
+        with a single recursive query.
+        """
+        table = self.model._meta.db_table
+        category_table = Category._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"""
+                WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+                    SELECT id, id, 0 FROM {category_table}
+                    UNION ALL
+                    SELECT tree.ancestor_id, category.id, tree.depth + 1
+                    FROM tree
+                    JOIN {category_table} category
+                      ON category.parent_category_id = tree.descendant_id
+                )
+                INSERT INTO {table} (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, depth FROM tree
+                """
+            )
+
+    def insert_node(self, category):
+        """
+        Add the rows of a new category: itself at depth 0 plus one row for
+        every ancestor of its parent.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (ancestor_id, descendant_id, depth)
+                SELECT %s, %s, 0
+                UNION ALL
+                SELECT ancestor_id, %s, depth + 1
+                FROM {table}
+                WHERE descendant_id = %s
+                """,
+                [
+                    category.pk,
+                    category.pk,
+                    category.pk,
+                    category.parent_category_id,
+                ],
+            )
+
+    def move_subtree(self, category):
+        """
+        Reattach the subtree rooted at `category` under its current
+        `parent_category`: the links between the subtree and its old
+        ancestors are dropped and the cross product of the new parent's
+        ancestors and the subtree is inserted.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE descendant_id IN (
+                    SELECT descendant_id FROM {table} WHERE ancestor_id = %s
+                )
+                AND ancestor_id NOT IN (
+                    SELECT descendant_id FROM {table} WHERE ancestor_id = %s
+                )
+                """,
+                [category.pk, category.pk],
+            )
+            if category.parent_category_id is None:
+                return
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (ancestor_id, descendant_id, depth)
+                SELECT parent.ancestor_id,
+                       subtree.descendant_id,
+                       parent.depth + subtree.depth + 1
+                FROM {table} parent
+                CROSS JOIN {table} subtree
+                WHERE parent.descendant_id = %s AND subtree.ancestor_id = %s
+                """,
+                [category.parent_category_id, category.pk],
+            )
+
+    def link_product_ancestors(self, product_ids, category_ids=None):
+        """
+        Link every product of `product_ids` to all the ancestors of its
+        categories that it is not linked to yet, in a single statement.
+
+            With `category_ids`, only the ancestors of those categories are
+        added, for every product. Without it, the ancestors of every
+        category each product is currently linked to are added.
+        """
+        table = self.model._meta.db_table
+        through_table = Product.categories.through._meta.db_table
+        if category_ids is None:
+            sql = f"""
+                INSERT INTO {through_table} (product_id, category_id)
+                SELECT DISTINCT link.product_id, closure.ancestor_id
+                FROM {through_table} link
+                JOIN {table} closure
+                  ON closure.descendant_id = link.category_id
+                 AND closure.depth > 0
+                WHERE link.product_id = ANY(%s)
+                ON CONFLICT (product_id, category_id) DO NOTHING
+            """
+            params = [list(product_ids)]
+        else:
+            sql = f"""
+                INSERT INTO {through_table} (product_id, category_id)
+                SELECT DISTINCT product.id, closure.ancestor_id
+                FROM unnest(%s::bigint[]) AS product (id)
+                CROSS JOIN {table} closure
+                WHERE closure.descendant_id = ANY(%s) AND closure.depth > 0
+                ON CONFLICT (product_id, category_id) DO NOTHING
+            """
+            params = [list(product_ids), list(category_ids)]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class CategoryClosure(models.Model):
+    """
+    Every ancestor-descendant pair of the category tree, including each
+    category paired with itself at depth 0.
+
+        Maintained by the `Category` save signal, so the ancestors or the
+    descendants of a category are a single indexed lookup instead of a walk
+    over `parent_category`, one query per level.
+    """
+
+    ancestor = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField(
+        help_text="Number of levels between the ancestor and the descendant"
+    )
+
+    objects = CategoryClosureManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"],
+                name="products_categoryclosure_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["descendant", "depth"],
+                name="products_closure_desc_depth",
+            ),
+        ]
+
 
 class Size(models.Model):
     name = models.CharField(max_length=50, help_text="The name of the size.")
@@ -64,7 +407,7 @@ class Size(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     name = models.CharField(
         max_length=200, help_text="The name of the product"
     )
@@ -96,12 +439,147 @@ class Product(models.Model):
     categories = models.ManyToManyField(Category, blank=True)
     sizes = models.ManyToManyField(Size, through="ProductSize", blank=True)
     images = models.ManyToManyField(Image, through="ProductImage", blank=True)
+    preview_image = models.ForeignKey(
+        Image,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="The preview among the product images, kept up to date "
+        "by a database trigger on ProductImage",
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text="Weighted words of the name and description, kept up to "
+        "date by a database trigger, see apps.products.search",
+    )
+    min_price = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        help_text="The lowest price of the active sizes, kept up to date by "
+        "a database trigger on ProductSize",
+    )
+    max_price = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        help_text="The highest price of the active sizes, kept up to date "
+        "by a database trigger on ProductSize",
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination ordered by name
+            models.Index(
+                fields=["name", "id"], name="products_product_name_id"
+            ),
+            GinIndex(fields=["search_vector"], name="products_product_search"),
+            # Price filters and keyset pagination ordered by price
+            models.Index(
+                fields=["min_price", "id"], name="products_product_min_price"
+            ),
+            # Scanned backwards the index above lists the NULLs first
+            models.Index(
+                F("min_price").desc(nulls_last=True),
+                F("id").desc(),
+                name="products_product_price_desc",
+            ),
+            models.Index(
+                fields=["max_price"], name="products_product_max_price"
+            ),
+            # Typo-tolerant matching of the name
+            GinIndex(
+                OpClass("name", name="gin_trgm_ops"),
+                name="products_product_name_trgm",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ProductImageManager(models.Manager):
+    def _write_preview(self, product_id, pk, statement, params):
+        """
+        Run `statement`, which writes a preview row, together with clearing
+        the other previews of the product in one statement.
+
+            The clearing UPDATE is a data-modifying CTE that the statement
+        waits for through an initplan in its WHERE clause, so the old
+        preview is already off when the partial unique index checks the
+        new one. Only the two rows involved are locked.
+        """
+        table = self.model._meta.db_table
+        sql = f"""
+            WITH cleared AS (
+                UPDATE {table} SET is_preview = false
+                WHERE product_id = %s AND is_preview
+                  AND id IS DISTINCT FROM %s
+                RETURNING id
+            )
+            {statement.format(cleared="(SELECT count(*) FROM cleared) >= 0")}
+        """
+        cursor = connection.cursor()
+        cursor.execute(sql, [product_id, pk, *params])
+        return cursor
+
+    def insert_preview(self, obj, fields, returning_fields):
+        """
+        Insert `obj` as the preview of its product and return the values
+        of `returning_fields`, the way `QuerySet._insert` does.
+        """
+        params = [
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields
+        ]
+        statement = f"""
+            INSERT INTO {self.model._meta.db_table}
+                ({", ".join(field.column for field in fields)})
+            SELECT {", ".join(["%s"] * len(fields))}
+            WHERE {{cleared}}
+            RETURNING {", ".join(f.column for f in returning_fields)}
+        """
+        with self._write_preview(
+            obj.product_id, None, statement, params
+        ) as cursor:
+            return cursor.fetchall()
+
+    def update_preview(self, obj, values):
+        """
+        Write `values`, the (field, model, value) triples `Model.save`
+        collects, to the row of `obj` and make it the preview of its
+        product. Return whether the row exists.
+        """
+        assignments = ", ".join(
+            f"{field.column} = %s" for field, _, _ in values
+        )
+        params = [
+            field.get_db_prep_save(value, connection)
+            for field, _, value in values
+        ]
+        statement = f"""
+            UPDATE {self.model._meta.db_table} SET {assignments}
+            WHERE id = %s AND {{cleared}}
+        """
+        with self._write_preview(
+            obj.product_id, obj.pk, statement, [*params, obj.pk]
+        ) as cursor:
+            return cursor.rowcount > 0
+
+
 class ProductImage(models.Model):
+    """
+    An image of a product. At most one image of a product is its preview,
+    which is also stored in `Product.preview_image`.
+
+        Saving a preview clears the previous one in the same statement, see
+    `ProductImageManager`, and the partial unique index makes sure two
+    concurrent saves cannot both leave a preview behind.
+    `Product.preview_image` is maintained by a database trigger, so it also
+    follows bulk writes and imports.
+    """
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
     is_preview = models.BooleanField(
@@ -110,21 +588,51 @@ class ProductImage(models.Model):
         help_text="Sets the image as a preview for the product",
     )
 
-    def save(self, *args, **kwargs):
+    objects = ProductImageManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "image"],
+                name="products_productimage_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["product"],
+                condition=models.Q(is_preview=True),
+                name="products_productimage_one_preview",
+            ),
+        ]
+
+    def _do_insert(self, manager, using, fields, returning_fields, raw):
         """
-        If the instance is a preview,
-        it updates the preview status of all other previews of the same
-        product to False.
+        If the instance is a preview, insert it with the statement that
+        clears the previous preview of the product.
         """
-        if self.is_preview:
-            self.__class__.objects.filter(
-                product=self.product, is_preview=True
-            ).update(is_preview=False)
+        if not self.is_preview or raw:
+            return super()._do_insert(
+                manager, using, fields, returning_fields, raw
+            )
+        return ProductImage.objects.insert_preview(
+            self, fields, returning_fields
+        )
 
-        super().save(*args, **kwargs)
+    def _do_update(
+        self, base_qs, using, pk_val, values, update_fields, forced_update
+    ):
+        """
+        If the instance is saved as a preview, update it with the statement
+        that clears the previous preview of the product.
+        """
+        if not self.is_preview or not any(
+            field.name == "is_preview" for field, _, _ in values
+        ):
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        return ProductImage.objects.update_preview(self, values)
 
 
-class ProductSize(models.Model):
+class ProductSize(DirtyFieldsMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     size = models.ForeignKey(Size, on_delete=models.CASCADE)
     price = models.PositiveIntegerField(
@@ -135,3 +643,11 @@ class ProductSize(models.Model):
         db_index=True,
         help_text="Hide size for this product from the catalog",
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "size"],
+                name="products_productsize_unique",
+            ),
+        ]
@@ -0,0 +1,178 @@
+"""
+Per-object cache of serialized API representations.
+
+cachalot drops every cached query of a table on any write to it, so a
+single price edit empties the cache of the whole catalog. `ObjectCache`
+keeps the serialized representation of each object under its own key
+instead, and the signal handlers in `apps.products.signals` invalidate
+only the entries of the objects a write affects, once the transaction
+commits. Lists are assembled from these entries with one multi-get, and
+only the missing objects are loaded and serialized.
+
+Each object has a version, bumped when it is invalidated, and an entry is
+only used while it was stored under the current version. A reader stores
+the objects it loaded under the versions it read before loading them: if
+a write commits in between, the stale representation it stores is never
+served, where a plain delete would let the reader fill the key again.
+The versions are read with the entries, in the same multi-get. An object
+without one yet gets it from the reader storing its entry, set only if no
+write has set one meanwhile.
+
+Representations contain absolute URLs, so each entry remembers the base
+URL of the images it was rendered with and is only used for requests with
+the same one.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from apps.products import async_cache
+from apps.products.db_json import get_image_base_url
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectCache:
+    """
+    Serialized objects cached by primary key.
+
+    Attributes:
+        prefix: The prefix of the cache keys, followed by the primary key.
+        timeout: How long an entry is kept. Entries are invalidated when
+         their object changes, this only bounds how long unused ones take
+         up memory.
+    """
+
+    def __init__(self, prefix, timeout=60 * 60 * 24):
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def make_key(self, pk):
+        return f"{self.prefix}:{pk}"
+
+    def make_version_key(self, pk):
+        return f"{self.prefix}:{pk}:version"
+
+    def get_many(self, pks, request=None):
+        """
+        Return a mapping of the primary keys of `pks` found in the cache to
+        their representation rendered for `request`, and the versions of
+        the objects to store the missing ones under, see `set_many`.
+        """
+        return self._read(cache.get_many(self._get_keys(pks)), pks, request)
+
+    def set_many(self, items, versions, request=None):
+        """
+        Store the representations of the `{pk: data}` mapping `items`
+        rendered for `request`, under the `versions` returned by the
+        `get_many` that missed them.
+        """
+        versions, new_versions = self._add_versions(items, versions)
+        if new_versions:
+            backend = cache.client
+            pipeline = backend.get_client(write=True).pipeline(
+                transaction=False
+            )
+            for key, version in new_versions.items():
+                pipeline.set(
+                    backend.make_key(key),
+                    backend.encode(version),
+                    ex=2 * self.timeout,
+                    nx=True,
+                )
+            try:
+                pipeline.execute()
+            except RedisError:
+                logger.warning("Writing to the cache failed", exc_info=True)
+        cache.set_many(
+            self._make_entries(items, versions, request), self.timeout
+        )
+
+    async def aget_many(self, pks, request=None):
+        """`get_many` for the async views, see `apps.products.async_cache`."""
+        found = await async_cache.get_many(self._get_keys(pks))
+        return self._read(found, pks, request)
+
+    async def aset_many(self, items, versions, request=None):
+        """`set_many` for the async views, see `apps.products.async_cache`."""
+        versions, new_versions = self._add_versions(items, versions)
+        await async_cache.set_many(new_versions, 2 * self.timeout, nx=True)
+        await async_cache.set_many(
+            self._make_entries(items, versions, request), self.timeout
+        )
+
+    def invalidate(self, pks):
+        """
+        Bump the versions of `pks` and delete their entries once the
+        current transaction commits.
+        """
+        pks = set(pks)
+        if not pks:
+            return
+
+        def bump():
+            # Outlives the entries stored under the previous versions by
+            # the requests in progress
+            cache.set_many(
+                {self.make_version_key(pk): time.time_ns() for pk in pks},
+                2 * self.timeout,
+            )
+            cache.delete_many([self.make_key(pk) for pk in pks])
+
+        transaction.on_commit(bump)
+
+    def clear(self):
+        """
+        Delete every entry and version once the current transaction
+        commits, after writes that don't say which objects they affect.
+        Unlike `invalidate`, it lets a request loading objects at the same
+        time store them again, so it is meant for maintenance commands
+        rather than for requests.
+        """
+        transaction.on_commit(lambda: cache.delete_pattern(f"{self.prefix}:*"))
+
+    def _get_keys(self, pks):
+        return [
+            key
+            for pk in pks
+            for key in (self.make_key(pk), self.make_version_key(pk))
+        ]
+
+    def _read(self, found, pks, request):
+        base_url = get_image_base_url(request)
+        cached = {}
+        versions = {}
+        for pk in pks:
+            version = versions[pk] = found.get(self.make_version_key(pk))
+            entry = found.get(self.make_key(pk))
+            if entry is not None and entry[:2] == (version, base_url):
+                cached[pk] = entry[2]
+        return cached, versions
+
+    def _add_versions(self, items, versions):
+        """
+        Return `versions` completed with new ones for the objects of `items`
+        without one, and the `{key: version}` mapping to set them with.
+        Should a write set a version first, the entry stored under the new
+        one is not used.
+        """
+        new_versions = {
+            pk: time.time_ns() for pk in items if versions.get(pk) is None
+        }
+        return {**versions, **new_versions}, {
+            self.make_version_key(pk): version
+            for pk, version in new_versions.items()
+        }
+
+    def _make_entries(self, items, versions, request):
+        base_url = get_image_base_url(request)
+        return {
+            self.make_key(pk): (versions.get(pk), base_url, data)
+            for pk, data in items.items()
+        }
+
+
+product_cache = ObjectCache("products:product")
@@ -0,0 +1,333 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
+
+from apps.products.search import SEARCH_RANK
+
+KeysetCursor = namedtuple("KeysetCursor", ["ordering", "reverse", "position"])
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a composite, unique sort key.
+
+        DRF's CursorPagination only keeps the first ordering field in the
+    cursor and falls back to an OFFSET for duplicate values, so paging by a
+    non-unique column such as `name` gets slower the deeper the client goes.
+    This class stores the values of every ordering field in the cursor and
+    filters with a row comparison (`name > x OR (name = x AND id > y)`),
+    which lets PostgreSQL seek straight to the page through a composite
+    index. No `COUNT(*)` is issued and rows inserted concurrently never
+    shift the pages a client is walking through.
+        The client picks one of `orderings` with the `ordering` query
+    parameter. Every ordering must end with a unique column (usually `id`)
+    so that the position is unambiguous.
+        NULLs of the `nullable_fields` are listed after the values in both
+    directions, as PostgreSQL can't compare them. The keyset filter matches
+    them with `IS NULL` instead.
+
+    Attributes:
+        orderings: A mapping of the public ordering name to the tuple of
+         model fields the queryset is sorted by.
+        default_ordering: The key of `orderings` used when the client does
+         not pass a valid `ordering` parameter.
+        nullable_fields: The ordering fields that may be NULL.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering_query_param = "ordering"
+    ordering_query_description = (
+        "Which field to use when ordering the results."
+    )
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+    }
+    default_ordering = "id"
+    nullable_fields = frozenset()
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering_key, self.ordering = self.get_ordering(
+            request, queryset, view
+        )
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = (
+                self.cursor.reverse,
+                self.cursor.position,
+            )
+
+        ordering = (
+            _reverse_ordering(self.ordering) if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*self.get_order_by(ordering, reverse))
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, current_position, reverse)
+            )
+
+        # Fetch one extra item to find out whether another page follows.
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following_position = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+
+        if self.page:
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering
+            )
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering
+            )
+        else:
+            self.previous_position = current_position
+            self.next_position = current_position
+
+        return self.page
+
+    def get_order_by(self, ordering, reverse):
+        """
+        Return the `order_by` arguments of `ordering`, the NULLs of the
+        nullable fields last, or first when walking `reverse`.
+        """
+        nulls = {"nulls_first": True} if reverse else {"nulls_last": True}
+        order_by = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if field_name not in self.nullable_fields:
+                order_by.append(order)
+            elif order.startswith("-"):
+                order_by.append(F(field_name).desc(**nulls))
+            else:
+                order_by.append(F(field_name).asc(**nulls))
+        return order_by
+
+    def get_keyset_filter(self, ordering, position, reverse=False):
+        """
+        Build a filter selecting the rows that come strictly after
+        `position` in the given `ordering`, walked in `reverse` or not.
+
+            The leading `>=`/`<=` condition on the first field is implied by
+        the OR-chain, but spelling it out gives the planner an index range
+        to start the scan from.
+        """
+        keyset_filter = Q()
+        preceding = Q()
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") else "gt"
+            after, equal = self.get_field_filters(
+                field_name, lookup, value, reverse
+            )
+            if after is not None:
+                keyset_filter |= preceding & after
+            preceding &= equal
+
+        if len(ordering) > 1:
+            first_field = ordering[0].lstrip("-")
+            lookup = "lte" if ordering[0].startswith("-") else "gte"
+            if position[0] is None:
+                if not reverse:
+                    keyset_filter &= Q(**{f"{first_field}__isnull": True})
+            # Followed by the NULLs otherwise, which are not in the range
+            elif reverse or first_field not in self.nullable_fields:
+                keyset_filter &= Q(**{f"{first_field}__{lookup}": position[0]})
+        return keyset_filter
+
+    def get_field_filters(self, field_name, lookup, value, reverse):
+        """
+        Return the filter selecting the rows whose `field_name` comes after
+        `value` according to `lookup`, None when no row does, and the one
+        selecting the rows whose `field_name` is equal to it.
+        """
+        if value is None:
+            # NULLs come last, and first when walking in reverse
+            after = Q(**{f"{field_name}__isnull": False}) if reverse else None
+            return after, Q(**{f"{field_name}__isnull": True})
+        after = Q(**{f"{field_name}__{lookup}": value})
+        if field_name in self.nullable_fields and not reverse:
+            after |= Q(**{f"{field_name}__isnull": True})
+        return after, Q(**{field_name: value})
+
+    def get_ordering(self, request, queryset, view):
+        ordering_key = request.query_params.get(self.ordering_query_param)
+        if ordering_key not in self.orderings:
+            ordering_key = self.default_ordering
+        return ordering_key, self.orderings[ordering_key]
+
+    def get_ordering_field(self, name):
+        """
+        Return the model field or the output field of the annotation the
+        results are ordered by.
+        """
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            KeysetCursor(
+                ordering=self.ordering_key,
+                reverse=False,
+                position=self.next_position,
+            )
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            KeysetCursor(
+                ordering=self.ordering_key,
+                reverse=True,
+                position=self.previous_position,
+            )
+        )
+
+    def decode_cursor(self, request):
+        """
+        Given a request with a cursor, return a `KeysetCursor` instance.
+
+            The cursor is rejected if it was issued for another ordering or
+        if its values cannot be converted to the types of the ordering
+        fields.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            cursor = KeysetCursor(
+                ordering=tokens["o"],
+                reverse=bool(tokens.get("r", False)),
+                position=tokens["p"],
+            )
+            if cursor.ordering != self.ordering_key or len(
+                cursor.position
+            ) != len(self.ordering):
+                raise ValueError("Cursor does not match the ordering")
+            position = [
+                self.get_ordering_field(order.lstrip("-")).to_python(value)
+                for order, value in zip(self.ordering, cursor.position)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        """
+        Given a KeysetCursor instance, return an url with encoded cursor.
+        """
+        tokens = {"o": cursor.ordering, "p": cursor.position}
+        if cursor.reverse:
+            tokens["r"] = 1
+
+        encoded = urlsafe_b64encode(
+            json.dumps(tokens, separators=(",", ":")).encode()
+        ).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            if not (attr is None or isinstance(attr, (int, str))):
+                attr = str(attr)
+            position.append(attr)
+        return position
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": force_str(self.ordering_query_description),
+                "schema": {
+                    "type": "string",
+                    "enum": list(self.orderings),
+                    "default": self.default_ordering,
+                },
+            }
+        )
+        return parameters
+
+
+class CategoryPagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "name": ("name", "id"),
+        "-name": ("-name", "-id"),
+    }
+
+
+class ProductPagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "-id": ("-id",),
+        "name": ("name", "id"),
+        "-name": ("-name", "-id"),
+        # Ids are allocated from a sequence, so the highest id is the most
+        # recently created product.
+        "newest": ("-id",),
+        # Products without an active size have no price and come last
+        "price": ("min_price", "id"),
+        "-price": ("-min_price", "-id"),
+        # Only available with a search, see `apps.products.search`
+        "relevance": (f"-{SEARCH_RANK}", "id"),
+    }
+    nullable_fields = frozenset({"min_price"})
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Search results are ordered by relevance unless the client asks for
+        another ordering. Without a search there is nothing to rank by and
+        `relevance` falls back to the default ordering.
+        """
+        ordering_key = request.query_params.get(self.ordering_query_param)
+        if SEARCH_RANK in queryset.query.annotations:
+            if ordering_key not in self.orderings:
+                ordering_key = "relevance"
+        elif ordering_key == "relevance" or ordering_key not in self.orderings:
+            ordering_key = self.default_ordering
+        return ordering_key, self.orderings[ordering_key]
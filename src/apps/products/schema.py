@@ -1,4 +1,99 @@
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+
+from apps.products.serializers import (
+    BulkLinkProductCategorySerializer,
+    BulkLinkProductImageSerializer,
+    BulkLinkProductSizeSerializer,
+    CatalogImportResultSerializer,
+    CatalogImportSerializer,
+    CategoryTreeSerializer,
+    ProductCategorySerializer,
+    ProductFacetsSerializer,
+    ProductImageSerializer,
+    ProductSizeSerializer,
+)
+
+
+def bulk_ids_parameter(name):
+    return OpenApiParameter(
+        "ids",
+        OpenApiTypes.INT,
+        many=True,
+        required=True,
+        description=f"Ids of the {name} to unlink, repeat for every id",
+    )
+
+
+class CategorySchema:
+    def tree(self):
+        return extend_schema(
+            summary="Get the whole category tree",
+            description="""Returns the root categories with their
+            subcategories nested in `children`, at any depth.
+            <br>
+            Pass `is_active=true` to leave out inactive categories together
+            with everything nested under them. The response carries an
+            `ETag`, send it back in `If-None-Match` to get a 304 while the
+            tree has not changed.""",
+            parameters=[
+                OpenApiParameter(
+                    "is_active",
+                    OpenApiTypes.BOOL,
+                    description="Only include active branches",
+                ),
+            ],
+            filters=False,
+            responses=CategoryTreeSerializer(many=True),
+        )
+
+
+class ProductSchema:
+    def list(self):
+        return extend_schema(
+            summary="Get a page of products",
+            description="""Returns products page by page, use the `next`
+            and `previous` links to move between pages.
+            <br>
+            Pass `render=db` to have PostgreSQL build the JSON of the
+            whole page in one query. The response has the same shape and
+            is meant for large category pages.""",
+            parameters=[
+                OpenApiParameter(
+                    "render",
+                    OpenApiTypes.STR,
+                    enum=["db"],
+                    description="Render the page inside the database",
+                ),
+            ],
+        )
+
+    def facets(self):
+        return extend_schema(
+            summary="Count the products per filter value",
+            description="""Takes the same filters as the product list and
+            returns, for the matching products, their number per category,
+            per size and per price bucket, to show next to the filters of
+            the catalog sidebar.
+            <br>
+            The counts are computed with one query and cached until the
+            catalog changes.""",
+            responses=ProductFacetsSerializer,
+        )
+
+    def import_catalog(self):
+        return extend_schema(
+            summary="Import products from a catalog file",
+            description="""Creates products with their sizes, images and
+            categories from an uploaded `.jsonl` or `.csv` file. Admins
+            only.
+            <br>
+            Sizes, images and categories are referenced by id. Rows with
+            errors are skipped and reported, parent categories are linked
+            the same way as with `/api/products/<id>/categories/`.""",
+            request={"multipart/form-data": CatalogImportSerializer},
+            responses=CatalogImportResultSerializer,
+        )
 
 
 class ProductSizesSchema:
@@ -41,6 +136,27 @@ class ProductSizesSchema:
             endpoint""",
         )
 
+    def bulk_link(self):
+        return extend_schema(
+            summary="Add or update many sizes of the product",
+            description="""Links every size of the list to the product in
+            one transaction. Sizes that are already linked get their price
+            and status overwritten, so the request can safely be retried.""",
+            request=BulkLinkProductSizeSerializer(many=True),
+            responses=ProductSizeSerializer(many=True),
+            methods=["POST"],
+        )
+
+    def bulk_unlink(self):
+        return extend_schema(
+            summary="Remove many sizes from the product",
+            description="""Removes the links between the product and the
+            given sizes. Sizes that are not linked are ignored.""",
+            parameters=[bulk_ids_parameter("sizes")],
+            responses={204: None},
+            methods=["DELETE"],
+        )
+
 
 class ProductImagesSchema:
     def list(self):
@@ -83,6 +199,30 @@ class ProductImagesSchema:
             endpoint""",
         )
 
+    def bulk_link(self):
+        return extend_schema(
+            summary="Add or update many images of the product",
+            description="""Links every image of the list to the product in
+            one transaction. Images that are already linked get their
+            preview flag overwritten, so the request can safely be retried.
+            <br>
+            At most one image of the list can be the preview, it replaces
+            the current preview of the product.""",
+            request=BulkLinkProductImageSerializer(many=True),
+            responses=ProductImageSerializer(many=True),
+            methods=["POST"],
+        )
+
+    def bulk_unlink(self):
+        return extend_schema(
+            summary="Remove many images from the product",
+            description="""Removes the links between the product and the
+            given images. Images that are not linked are ignored.""",
+            parameters=[bulk_ids_parameter("images")],
+            responses={204: None},
+            methods=["DELETE"],
+        )
+
 
 class ProductCategoriesSchema:
     def list(self):
@@ -105,3 +245,25 @@ class ProductCategoriesSchema:
             To delete the image itself you need to use the `/api/images`
             endpoint""",
         )
+
+    def bulk_link(self):
+        return extend_schema(
+            summary="Add many categories to the product",
+            description="""Links every category of the list and all their
+            parent categories to the product in one transaction. Categories
+            that are already linked are left as they are, so the request
+            can safely be retried.""",
+            request=BulkLinkProductCategorySerializer(many=True),
+            responses=ProductCategorySerializer(many=True),
+            methods=["POST"],
+        )
+
+    def bulk_unlink(self):
+        return extend_schema(
+            summary="Remove many categories from the product",
+            description="""Removes the links between the product and the
+            given categories. Categories that are not linked are ignored.""",
+            parameters=[bulk_ids_parameter("categories")],
+            responses={204: None},
+            methods=["DELETE"],
+        )
@@ -0,0 +1,51 @@
+"""
+Full-text product search.
+
+`Product.search_vector` holds the weighted `tsvector` of the name (A) and
+the description (B). It is filled by a `BEFORE INSERT OR UPDATE` trigger,
+see migration 0014, so bulk writes and imports keep it current too, and is
+indexed with GIN. Names are also indexed with `gin_trgm_ops`, so a
+misspelled word still finds the products whose name contains a similar
+word. Both conditions are OR-ed in one query, which PostgreSQL answers
+with a bitmap scan over the two indexes.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+# Must match the configuration used by the trigger of migration 0014
+SEARCH_CONFIG = "english"
+
+# Name of the relevance annotation added to searched querysets
+SEARCH_RANK = "search_rank"
+
+
+def search_products(queryset, text):
+    """
+    Filter `queryset` down to the products matching `text` and annotate
+    their relevance as `search_rank`.
+
+        `text` follows the web search syntax (`"quoted phrase"`, `or`,
+    `-excluded`). A product matches when its name or description contains
+    the words, or when its name contains a word close enough to one of them
+    (`pg_trgm.word_similarity_threshold`). The rank adds the full-text rank
+    to the trigram similarity of the name, so exact matches come first.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_word_similar=text)
+    ).annotate(
+        # Cast from real, whose text form does not survive the round trip
+        # through a float in the pagination cursor exactly
+        **{
+            SEARCH_RANK: Cast(
+                SearchRank(F("search_vector"), query)
+                + TrigramWordSimilarity(text, "name"),
+                output_field=FloatField(),
+            )
+        }
+    )
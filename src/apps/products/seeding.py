@@ -0,0 +1,360 @@
+"""
+Synthetic catalogs for benchmarks and staging databases.
+
+`seed_catalog` fills a database with a catalog whose shape follows the
+real one: a category tree, a few sizes, and products with several
+categories, sizes and images each, the images being shared the way photos
+of a bouquet are reused. `CatalogShape` sets the distributions.
+
+    Sizes and categories are created first, then the images and the
+products are written with `COPY` in chunks, optionally by a pool of worker
+processes. Every chunk draws from its own random generator, seeded from
+the catalog seed and the chunk's position, and the ids of the images and
+products are reserved up front, so the same seed, shape and chunk size
+produce the same catalog whatever the number of workers, ids included on
+a fresh database. Products go through the `COPY` path of
+`CatalogImporter`, so the triggers maintaining the preview image, the
+search vector and the price range run as they do for a regular import.
+    Images can get placeholder files: small PNGs encoded with `zlib`, one
+distinct file per image, stored in the content-addressed image storage.
+Their resized variants are not rendered, `regenerate_image_variants` does
+it afterwards.
+"""
+import hashlib
+import multiprocessing
+import random
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from cachalot.api import invalidate
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+
+from apps.products.cache import CATEGORY_TREE_VERSION_KEY, bump_version
+from apps.products.importers import CatalogImporter
+from apps.products.models import (
+    Category,
+    CategoryClosure,
+    Image,
+    Product,
+    Size,
+    StoredFile,
+)
+from apps.products.storage import image_storage
+
+SIZE_NAMES = ["XS", "S", "M", "L", "XL", "XXL", "15", "25", "51", "101"]
+
+WORDS = (
+    "rose peony tulip lily orchid daisy iris aster freesia gerbera "
+    "hydrangea lavender eucalyptus chamomile carnation ranunculus "
+    "bouquet basket box mix spring summer autumn winter morning evening "
+    "red white pink yellow purple blue coral cream"
+).split()
+
+PLACEHOLDER_WIDTH = 320
+PLACEHOLDER_HEIGHT = 240
+
+
+@dataclass
+class CatalogShape:
+    """
+    Distributions of a seeded catalog. Ranges are inclusive `(min, max)`
+    pairs, each product draws its count uniformly from them.
+
+    Attributes:
+        category_depth: Number of levels of the category tree.
+        category_fan_out: Number of roots, and of children of every other
+         category but the leaves.
+        sizes: Number of sizes, at most `len(SIZE_NAMES)` are named.
+        images: Number of images shared by the products, by default a
+         quarter of the products and at least 20.
+        categories_per_product: Categories a product is linked to, their
+         ancestors are linked too.
+        sizes_per_product: Sizes offered for a product.
+        images_per_product: Images of a product, the first one being the
+         preview.
+        image_files: Whether the images get placeholder files.
+    """
+
+    category_depth: int = 3
+    category_fan_out: int = 5
+    sizes: int = 10
+    images: int = None
+    categories_per_product: tuple = (1, 3)
+    sizes_per_product: tuple = (2, 5)
+    images_per_product: tuple = (1, 4)
+    image_files: bool = False
+
+    def get_images(self, products):
+        return self.images or max(20, products // 4)
+
+
+@dataclass
+class SeedContext:
+    """What the workers need to write the chunks of one catalog."""
+
+    seed: int
+    shape: CatalogShape
+    images: int
+    image_offset: int
+    product_offset: int
+    category_ids: list
+    size_ids: list
+
+
+def seed_catalog(
+    count, seed=0, shape=None, workers=0, chunk_size=5000, progress=None
+):
+    """
+    Create `count` products with their categories, sizes and images, and
+    return the number of images created.
+
+        With `workers`, the images and products are written by that many
+    processes, otherwise in this one. `progress`, when given, is called
+    with the kind (`"images"` or `"products"`) and the number of rows of
+    every chunk written.
+    """
+    shape = shape or CatalogShape()
+    rng = random.Random(seed)
+    with transaction.atomic():
+        sizes = Size.objects.bulk_create(
+            Size(name=get_size_name(index)) for index in range(shape.sizes)
+        )
+        categories = create_category_tree(
+            rng, shape.category_depth, shape.category_fan_out
+        )
+
+    images = shape.get_images(count)
+    context = SeedContext(
+        seed=seed,
+        shape=shape,
+        images=images,
+        image_offset=reserve_ids(Image, images),
+        product_offset=reserve_ids(Product, count),
+        category_ids=[category.pk for category in categories],
+        size_ids=[size.pk for size in sizes],
+    )
+    for kind, total in (("images", images), ("products", count)):
+        tasks = [
+            (kind, context, start, min(start + chunk_size, total))
+            for start in range(0, total, chunk_size)
+        ]
+        for written in run_tasks(tasks, workers):
+            if progress is not None:
+                progress(kind, written)
+    invalidate()
+    return images
+
+
+def reserve_ids(model, count):
+    """
+    Move the id sequence of `model` past a block of `count` ids and return
+    the id before the block, 0 on a fresh table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT setval(sequence::regclass, nextval(sequence) + %s - 1) - %s
+            FROM pg_get_serial_sequence(%s, 'id') AS sequence
+            """,
+            [max(count, 1), max(count, 1), model._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+def run_tasks(tasks, workers):
+    """
+    Run `seed_chunk` for every task and yield the number of rows of each.
+
+        Unlike the image variant workers, these are forked, so they inherit
+    the settings as changed at runtime, e.g. the name of a test database.
+    The connections are closed first, so no worker shares one with the
+    parent.
+    """
+    if not workers:
+        yield from map(seed_chunk, tasks)
+        return
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        yield from executor.map(seed_chunk, tasks)
+
+
+def seed_chunk(task):
+    """Write the images or products of `[start, stop)` of a catalog."""
+    kind, context, start, stop = task
+    rng = random.Random(f"{context.seed}:{kind}:{start}")
+    if kind == "images":
+        write_images(rng, context, start, stop)
+    else:
+        write_products(rng, context, start, stop)
+    return stop - start
+
+
+def write_images(rng, context, start, stop):
+    names = []
+    for index in range(start, stop):
+        if context.shape.image_files:
+            names.append(store_placeholder(rng, context.seed, index))
+        else:
+            names.append(f"images/seed/{index}.png")
+    with transaction.atomic():
+        CatalogImporter.copy(
+            Image,
+            ["id", "img", "size_description"],
+            [
+                (context.image_offset + index + 1, name, "")
+                for index, name in zip(range(start, stop), names)
+            ],
+        )
+        if context.shape.image_files:
+            acquire_stored_files(names)
+
+
+def write_products(rng, context, start, stop):
+    image_ids = range(
+        context.image_offset + 1, context.image_offset + context.images + 1
+    )
+    rows = [
+        build_product_row(rng, index, context, image_ids)
+        for index in range(start, stop)
+    ]
+    product_ids = [
+        context.product_offset + index + 1 for index in range(start, stop)
+    ]
+    importer = CatalogImporter()
+    with transaction.atomic():
+        slugs = importer.allocate_slugs([row["name"] for row in rows])
+        importer.copy_products(rows, product_ids, slugs)
+        importer.create_relations(rows, product_ids)
+
+
+def create_category_tree(rng, depth, fan_out):
+    """
+    Create a category tree with `fan_out` roots, where every category above
+    the last of the `depth` levels has `fan_out` children.
+    """
+    categories = []
+    parents = [None]
+    for _ in range(depth):
+        level = []
+        for parent in parents:
+            for _ in range(fan_out):
+                index = len(categories) + len(level)
+                name = f"{rng.choice(WORDS)} {index}".capitalize()
+                level.append(Category(name=name, parent_category=parent))
+        categories.extend(Category.objects.bulk_create(level))
+        parents = level
+    CategoryClosure.objects.rebuild()
+    # Bulk inserts send no signals
+    invalidate(Category, CategoryClosure)
+    transaction.on_commit(lambda: bump_version(CATEGORY_TREE_VERSION_KEY))
+    return categories
+
+
+def build_product_row(rng, index, context, image_ids):
+    """Return an `ImportProductSerializer` payload of a random product."""
+    shape = context.shape
+
+    def sample(population, bounds):
+        low, high = bounds
+        return rng.sample(
+            population, min(rng.randint(low, high), len(population))
+        )
+
+    images = sample(image_ids, shape.images_per_product)
+    return {
+        "name": " ".join(rng.choices(WORDS, k=3)).capitalize() + f" {index}",
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(10, 40))),
+        "is_active": rng.random() > 0.05,
+        "categories": sample(
+            context.category_ids, shape.categories_per_product
+        ),
+        "sizes": [
+            {
+                "size": size,
+                "price": rng.randrange(500, 15000, 50),
+                "is_active": rng.random() > 0.1,
+            }
+            for size in sample(context.size_ids, shape.sizes_per_product)
+        ],
+        "images": [
+            {"image": image, "is_preview": not position}
+            for position, image in enumerate(images)
+        ],
+    }
+
+
+def get_size_name(index):
+    if index < len(SIZE_NAMES):
+        return SIZE_NAMES[index]
+    return f"Size {index + 1}"
+
+
+def store_placeholder(rng, seed, index):
+    """
+    Store a placeholder image of a random color, made distinct by a text
+    chunk naming it, and return its storage name.
+    """
+    color = bytes(rng.randrange(256) for _ in range(3))
+    content = encode_png(
+        PLACEHOLDER_WIDTH,
+        PLACEHOLDER_HEIGHT,
+        color,
+        f"seed {seed} image {index}",
+    )
+    name = image_storage.hashed_name(
+        "images/placeholder.png", hashlib.sha256(content).hexdigest()
+    )
+    if not image_storage.exists(name):
+        image_storage.move_into_place(
+            image_storage.write_temporary(name, ContentFile(content)), name
+        )
+    return name
+
+
+def encode_png(width, height, color, comment):
+    """Return a PNG of `width` x `height` pixels of the RGB `color`."""
+
+    def chunk(tag, data):
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data))
+        )
+
+    # Every scanline starts with its filter type, 0 for none
+    pixels = (b"\x00" + color * width) * height
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(
+                b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+            ),
+            chunk(b"tEXt", b"Comment\x00" + comment.encode("latin-1")),
+            # A flat color compresses well even at the fastest level
+            chunk(b"IDAT", zlib.compress(pixels, 1)),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+def acquire_stored_files(names):
+    """Take a reference on every stored file of `names` in one statement."""
+    table = StoredFile._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (name, reference_count)
+            SELECT name, count(*) FROM unnest(%s::varchar[]) AS file (name)
+            GROUP BY name
+            ON CONFLICT (name) DO UPDATE
+            SET reference_count = {table}.reference_count
+                + EXCLUDED.reference_count
+            """,
+            [names],
+        )
@@ -1,8 +1,30 @@
-from rest_framework.serializers import ModelSerializer, PrimaryKeyRelatedField
+import codecs
+from collections.abc import Mapping
 
+from django.db.models import Manager
+from drf_spectacular.utils import extend_schema_field
+from rest_framework.serializers import (
+    BooleanField,
+    CharField,
+    DictField,
+    Field,
+    FileField,
+    FloatField,
+    IntegerField,
+    ListField,
+    ListSerializer,
+    ModelSerializer,
+    PrimaryKeyRelatedField,
+    Serializer,
+    SlugField,
+    ValidationError,
+)
+
+from apps.products.compiled_serializers import CompiledListSerializer
 from apps.products.models import (
     Category,
     Image,
+    ImageVariant,
     Product,
     ProductImage,
     ProductSize,
@@ -10,9 +32,53 @@ from apps.products.models import (
 )
 
 
+@extend_schema_field(
+    {"type": "object", "additionalProperties": {"type": "string"}}
+)
+class SrcsetField(Field):
+    """
+    Renders the variants of an image as `srcset` values by format, for
+    example `{"webp": "<url> 320w, <url> 640w"}`. Empty until the variants
+    are generated. Expects `variants` to be prefetched.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "variants"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        if isinstance(variants, Manager):
+            variants = variants.all()
+        entries = sorted(
+            (variant["width"], variant["format"], variant["file"])
+            if isinstance(variant, Mapping)
+            else (variant.width, variant.format, variant.file.name)
+            for variant in variants
+        )
+        storage = ImageVariant._meta.get_field("file").storage
+        request = self.context.get("request", None)
+        srcset = {}
+        for width, file_format, name in entries:
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(file_format, []).append(f"{url} {width}w")
+        return {
+            file_format: ", ".join(sources)
+            for file_format, sources in srcset.items()
+        }
+
+
 class ImageSerializer(ModelSerializer):
+    srcset = SrcsetField(
+        help_text="Resized copies of the image by format, ready for the "
+        "`srcset` attribute"
+    )
+
     class Meta:
         model = Image
+        list_serializer_class = CompiledListSerializer
         fields = "__all__"
 
 
@@ -25,14 +91,85 @@ class CategorySerializer(ModelSerializer):
 
     class Meta:
         model = Category
+        list_serializer_class = CompiledListSerializer
         fields = "__all__"
 
+    def validate_parent_category(self, value):
+        """
+        Reject a parent that is the category itself or one of its
+        descendants, which would turn the tree into a cycle.
+        """
+        if (
+            value is not None
+            and self.instance is not None
+            and value.ancestor_links.filter(ancestor=self.instance).exists()
+        ):
+            raise ValidationError(
+                "A category cannot be nested under itself or one of its "
+                "subcategories."
+            )
+        return value
+
+
+class CategoryTreeSerializer(Serializer):
+    """
+    Describes a node of the category tree. The tree is rendered by
+    `apps.products.category_tree`, this serializer only documents it.
+    """
+
+    id = IntegerField()
+    name = CharField()
+    slug = SlugField()
+    description = CharField()
+    is_active = BooleanField()
+    children = ListField(
+        child=DictField(), help_text="Nested nodes of the same shape"
+    )
+
+
+class FacetCountSerializer(Serializer):
+    id = IntegerField()
+    count = IntegerField(help_text="Number of matching products")
+
+
+class PriceBucketSerializer(Serializer):
+    min = IntegerField(
+        allow_null=True, help_text="Lowest price of the bucket, inclusive"
+    )
+    max = IntegerField(
+        allow_null=True, help_text="Highest price of the bucket, exclusive"
+    )
+    count = IntegerField(
+        help_text="Number of matching products whose lowest price is in "
+        "the bucket"
+    )
+
+
+class ProductFacetsSerializer(Serializer):
+    """
+    Describes the facet counts of the products matching a filter set. The
+    counts are computed by `apps.products.facets`, this serializer only
+    documents them.
+    """
+
+    total = IntegerField(help_text="Number of matching products")
+    categories = FacetCountSerializer(
+        many=True,
+        help_text="Matching products per category, including the products "
+        "of subcategories",
+    )
+    sizes = FacetCountSerializer(
+        many=True, help_text="Matching products with an active offer per size"
+    )
+    prices = PriceBucketSerializer(many=True)
+
 
 class ProductCategorySerializer(ModelSerializer):
     category = CategorySerializer(read_only=True)
 
     class Meta:
         model = Product.categories.through
+        list_serializer_class = CompiledListSerializer
         fields = [
             "category",
         ]
@@ -51,6 +188,7 @@ class LinkProductCategorySerializer(ModelSerializer):
 class SizeSerializer(ModelSerializer):
     class Meta:
         model = Size
+        list_serializer_class = CompiledListSerializer
         fields = "__all__"
 
 
@@ -59,6 +197,7 @@ class ProductSizeSerializer(ModelSerializer):
 
     class Meta:
         model = ProductSize
+        list_serializer_class = CompiledListSerializer
         fields = [
             "size",
             "price",
@@ -83,6 +222,7 @@ class ProductImageSerializer(ModelSerializer):
 
     class Meta:
         model = ProductImage
+        list_serializer_class = CompiledListSerializer
         fields = [
             "image",
             "is_preview",
@@ -108,7 +248,142 @@ class ProductSerializer(ModelSerializer):
     images = ProductImageSerializer(
         many=True, source="productimage_set", read_only=True
     )
+    preview_image = ImageSerializer(read_only=True)
 
     class Meta:
         model = Product
-        fields = "__all__"
+        list_serializer_class = CompiledListSerializer
+        exclude = ["search_vector"]
+
+
+class LinkListSerializer(ListSerializer):
+    """
+    A list of links between a product and other objects given by id.
+
+        Rejects lists that link the same object twice, which a single
+    INSERT ... ON CONFLICT cannot apply. The child serializer names the
+    field holding the linked id in its `link_field` attribute.
+    """
+
+    def validate(self, attrs):
+        ids = [item[self.child.link_field] for item in attrs]
+        if len(set(ids)) != len(ids):
+            raise ValidationError(
+                f"Each {self.child.link_field} can only be listed once."
+            )
+        return attrs
+
+
+class ImageLinkListSerializer(LinkListSerializer):
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if sum(item["is_preview"] for item in attrs) > 1:
+            raise ValidationError("Only one image can be the preview.")
+        return attrs
+
+
+class BulkLinkProductSizeSerializer(ModelSerializer):
+    link_field = "size"
+
+    size = IntegerField()
+
+    class Meta:
+        model = ProductSize
+        list_serializer_class = LinkListSerializer
+        fields = [
+            "size",
+            "price",
+            "is_active",
+        ]
+        extra_kwargs = {"is_active": {"default": True}}
+
+
+class BulkLinkProductImageSerializer(ModelSerializer):
+    link_field = "image"
+
+    image = IntegerField()
+
+    class Meta:
+        model = ProductImage
+        list_serializer_class = ImageLinkListSerializer
+        fields = [
+            "image",
+            "is_preview",
+        ]
+        extra_kwargs = {"is_preview": {"default": False}}
+
+
+class BulkLinkProductCategorySerializer(ModelSerializer):
+    link_field = "category"
+
+    category = IntegerField()
+
+    class Meta:
+        model = Product.categories.through
+        list_serializer_class = LinkListSerializer
+        fields = [
+            "category",
+        ]
+
+
+class ImportProductSerializer(ModelSerializer):
+    """
+    Validates a row of a catalog import. Related objects are given by id,
+    their existence is checked by the importer for a whole chunk at once.
+    """
+
+    categories = ListField(child=IntegerField(), required=False, default=list)
+    sizes = BulkLinkProductSizeSerializer(
+        many=True, required=False, default=list
+    )
+    images = BulkLinkProductImageSerializer(
+        many=True, required=False, default=list
+    )
+
+    class Meta:
+        model = Product
+        fields = [
+            "name",
+            "description",
+            "is_active",
+            "categories",
+            "sizes",
+            "images",
+        ]
+        extra_kwargs = {
+            "description": {"default": ""},
+            "is_active": {"default": True},
+        }
+
+    def validate_categories(self, value):
+        return list(dict.fromkeys(value))
+
+
+class CatalogImportSerializer(Serializer):
+    file = FileField(help_text="A .jsonl or .csv catalog file")
+
+    def validate_file(self, value):
+        """
+        Check that the whole file is UTF-8 text before anything is
+        imported, as the import commits it chunk by chunk.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for chunk in value.chunks():
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise ValidationError("The file is not valid UTF-8 text.")
+        finally:
+            value.seek(0)
+        return value
+
+
+class CatalogImportResultSerializer(Serializer):
+    created = IntegerField(help_text="Number of imported products")
+    skipped = IntegerField(help_text="Number of rejected rows")
+    errors = ListField(
+        child=DictField(),
+        help_text="Line numbers and errors of the first rejected rows",
+    )
+    rows_per_second = FloatField()
@@ -1,62 +1,270 @@
-import os
+from functools import partial
 
-from django.db.models.signals import m2m_changed, post_delete, pre_save
+from cachalot.api import invalidate
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
-from apps.products.models import Image, Product
+from apps.products.cache import CATEGORY_TREE_VERSION_KEY, bump_version
+from apps.products.models import (
+    Category,
+    CategoryClosure,
+    FileCleanup,
+    Image,
+    ImageVariant,
+    Product,
+    ProductImage,
+    ProductSize,
+    Size,
+)
+from apps.products.object_cache import product_cache
+from apps.products.variants import schedule_variants
+
+ProductCategory = Product.categories.through
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance, created, **kwargs):
+    """
+    Keep `CategoryClosure` in sync with the category tree: a new category
+    gets its ancestor rows, and a category whose `parent_category` changed
+    has its whole subtree reattached under the new parent.
+    """
+    if created:
+        CategoryClosure.objects.insert_node(instance)
+        return
+    if not instance.has_changed("parent_category"):
+        return
+
+    current_parent_id = (
+        CategoryClosure.objects.filter(descendant=instance, depth=1)
+        .values_list("ancestor_id", flat=True)
+        .first()
+    )
+    if current_parent_id != instance.parent_category_id:
+        CategoryClosure.objects.move_subtree(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """
+    Bump the version of the cached category tree once the transaction that
+    changed a category commits, so the tree is never rebuilt from data that
+    is about to be rolled back or is not visible yet.
+    """
+    transaction.on_commit(lambda: bump_version(CATEGORY_TREE_VERSION_KEY))
 
 
 @receiver(m2m_changed, sender=Product.categories.through)
-def add_parent_categories_on_add(sender, instance, action, **kwargs):
+def add_parent_categories_on_add(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
     """
     Handle the signal fired when the many-to-many relationship between
     a Product and its Categories is changed. Specifically, when a category
     is added to a product, all the parent categories of that category are
-    also added to the product. This continues up the category hierarchy
-    until all parent categories have been added.
+    also added to the product.
+
+    All the missing ancestors of the added categories are linked with a
+    single INSERT ... SELECT over `CategoryClosure`, which works the same
+    way whether the categories were added from the product side or the
+    products from the category side, and does not fire the signal again.
 
     Args:
         sender: The model class.
         instance: The actual instance of the model that the signal was
                   performed on.
         action: A string indicating the type of update that was done.
+        reverse: Whether the relation was changed from the category side.
+        pk_set: The primary keys of the objects that were added.
+    """
+    if action != "post_add" or not pk_set:
+        return
+
+    if reverse:
+        product_ids, category_ids = list(pk_set), [instance.pk]
+    else:
+        product_ids, category_ids = [instance.pk], list(pk_set)
+    CategoryClosure.objects.link_product_ancestors(product_ids, category_ids)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+def invalidate_cached_products(sender, **kwargs):
+    """
+    Drop the cached product queries when a product image or size changes.
+
+        `Product.preview_image` and the price range of products are updated
+    by triggers inside the database, which cachalot cannot see, so it only
+    invalidates the links themselves.
+    """
+    invalidate(Product)
+    product_cache.invalidate([kwargs["instance"].product_id])
+
+
+@receiver(post_save, sender=Image)
+def generate_image_variants(sender, instance, **kwargs):
+    """
+    Render the resized variants of a new or replaced image file in the
+    background once the upload is committed.
+    """
+    transaction.on_commit(partial(schedule_variants, instance.pk))
+
+
+@receiver(post_delete, sender=ImageVariant)
+def delete_variant_file(sender, instance, **kwargs):
     """
-    if action == "post_add":
-        new_parents = set()
-        categories = instance.categories.all()
-        for category in categories:
-            parent = category.parent_category
-            while parent is not None:
-                if parent not in categories:
-                    new_parents.add(parent)
-                parent = parent.parent_category
-        instance.categories.add(*new_parents)
+    Queues the file of a deleted variant for deletion after the commit.
+    """
+    if instance.file:
+        FileCleanup.objects.enqueue([instance.file.name])
 
 
 @receiver(post_delete, sender=Image)
-def delete_image_file_on_instance_delete(sender, instance, **kwargs):
+def release_image_file_on_instance_delete(sender, instance, **kwargs):
     """
-    Deletes old image file from filesystem
-    when corresponding `Image` object is deleted.
+    Releases the image file when the `Image` object is deleted. The file
+    itself is deleted once no other image uses it.
     """
-    if instance.img and os.path.isfile(instance.img.path):
-        instance.img.delete(save=False)
+    if instance.img:
+        instance.img.storage.release(instance.img.name)
 
 
 @receiver(pre_save, sender=Image)
-def delete_image_file_on_instance_change(sender, instance, **kwargs):
+def release_image_file_on_instance_change(sender, instance, **kwargs):
     """
-    Deletes the old image file from filesystem when Image instance is updated.
+    Releases the old image file when a new file is uploaded for an
+    existing Image, and drops the variants made from it.
     """
-    # Exit if Image instance is new and not saved yet
-    if not instance.pk:
+    # Exit if Image instance is new or keeps its file
+    if not instance.pk or instance.img._committed:
         return False
 
-    try:
-        old_file = sender.objects.get(pk=instance.pk).img
-    except sender.DoesNotExist:
-        return False
+    # The loaded name is known without a query unless the instance was
+    # built by hand
+    if instance.is_tracked:
+        old_name = instance.get_loaded_value("img")
+    else:
+        old_name = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("img", flat=True)
+            .first()
+        )
+        if old_name is None:
+            return False
+
+    # The variants are regenerated after the save
+    for variant in instance.variants.all():
+        variant.delete()
+    if old_name:
+        instance.img.storage.release(old_name)
+
+
+def invalidate_cached_products_of(categories=(), images=()):
+    """
+    Drop the cached representations of the products showing any of the
+    `categories` or `images`, found with one query.
+    """
+    categories = [pk for pk in categories if pk is not None]
+    images = [pk for pk in images if pk is not None]
+    product_ids = (
+        ProductCategory.objects.filter(category_id__in=categories)
+        .values_list("product_id", flat=True)
+        .union(
+            ProductCategory.objects.filter(
+                category__image_id__in=images
+            ).values_list("product_id", flat=True),
+            ProductImage.objects.filter(image_id__in=images).values_list(
+                "product_id", flat=True
+            ),
+        )
+    )
+    product_cache.invalidate(product_ids)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_cached_product(sender, instance, **kwargs):
+    """
+    Drop the cached representation of a product when it or one of its
+    category links is written.
+    """
+    product_cache.invalidate(
+        [instance.pk if sender is Product else instance.product_id]
+    )
+
+
+@receiver(m2m_changed, sender=ProductCategory)
+def invalidate_cached_products_on_links_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Drop the cached representations of the products whose categories were
+    added, removed or cleared. Clearing the products of a category does not
+    tell which they were afterwards, so they are looked up before.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            product_cache.invalidate([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        product_cache.invalidate(pk_set)
+    elif action == "pre_clear":
+        invalidate_cached_products_of(categories=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_cached_products_on_category_change(sender, instance, **kwargs):
+    """
+    Drop the cached representations of the products showing the category
+    or its parents, which list it among their `child_categories`.
+    """
+    # A new category has no products yet
+    categories = [instance.parent_category_id]
+    if not kwargs.get("created"):
+        categories.append(instance.pk)
+        if instance.is_tracked:
+            categories.append(instance.get_loaded_value("parent_category"))
+    if any(categories):
+        invalidate_cached_products_of(categories=categories)
+
+
+@receiver(post_save, sender=Image)
+@receiver(pre_delete, sender=Image)
+@receiver(post_save, sender=ImageVariant)
+def invalidate_cached_products_on_image_change(sender, instance, **kwargs):
+    """
+    Drop the cached representations of the products showing the image,
+    directly or through one of their categories, including its `srcset`.
+    """
+    if sender is Image:
+        if kwargs.get("created"):
+            return
+        image_id = instance.pk
+    else:
+        image_id = instance.image_id
+    invalidate_cached_products_of(images=[image_id])
+
 
-    new_file = instance.img
-    if old_file != new_file and os.path.isfile(old_file.path):
-        old_file.delete(save=False)
+@receiver(post_save, sender=Size)
+def invalidate_cached_products_on_size_change(
+    sender, instance, created, **kwargs
+):
+    if created:
+        return
+    product_cache.invalidate(
+        ProductSize.objects.filter(size=instance).values_list(
+            "product_id", flat=True
+        )
+    )
@@ -0,0 +1,145 @@
+"""
+Content-addressed storage of uploaded images.
+
+Files are stored under the SHA-256 of their content, so the same photo
+uploaded for many products is kept once, and a stored file never changes:
+its URL can be cached forever (`Cache-Control: public, max-age=31536000,
+immutable` for the `images/` prefix of the media server). The number of
+`Image` rows using a file is tracked by `StoredFile`, and the file is only
+deleted when the last of them lets it go.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.utils.deconstruct import deconstructible
+
+
+class HashingUploadHandlerMixin:
+    """
+    Hash the uploaded files while the request body is streamed through the
+    handler, so the storage knows where a file goes without reading it
+    again. The digest is set as `content_hash` on the uploaded file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Set first, the memory handler stops the chain from `new_file`
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.content_hash = self.hasher.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(
+    HashingUploadHandlerMixin, MemoryFileUploadHandler
+):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadHandlerMixin, TemporaryFileUploadHandler
+):
+    pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    A file system storage that names files after their content.
+
+        `images/photo.JPG` is stored as `images/<2 hex>/<sha256>.jpg`. The
+    content is hashed while it is copied to a temporary file next to its
+    destination, which is then renamed into place, unless a file with the
+    same content is already stored. Uploads hashed by the
+    `Hashing*UploadHandler`s are not read at all when their content is
+    already stored.
+        Every save takes a reference on the stored name, released by
+    `release` when an `Image` drops the file.
+    """
+
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # Names are decided by the content in `_save`, never renamed
+        return name
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], f"{digest}{extension}")
+
+    def _save(self, name, content):
+        stored_files = apps.get_model("products", "StoredFile").objects
+        digest = getattr(content, "content_hash", None)
+        if digest is not None:
+            name = self.hashed_name(name, digest)
+            # Taking the reference first keeps a concurrent release from
+            # deleting the file between the check and the save
+            stored_files.acquire(name)
+            if self.exists(name):
+                return name
+            if hasattr(content, "temporary_file_path"):
+                self.move_into_place(content.temporary_file_path(), name)
+            else:
+                self.move_into_place(self.write_temporary(name, content), name)
+            return name
+
+        hasher = hashlib.sha256()
+        temp_path = self.write_temporary(name, content, hasher)
+        name = self.hashed_name(name, hasher.hexdigest())
+        stored_files.acquire(name)
+        if self.exists(name):
+            os.remove(temp_path)
+        else:
+            self.move_into_place(temp_path, name)
+        return name
+
+    def write_temporary(self, name, content, hasher=None):
+        """
+        Copy `content` to a temporary file in the directory of `name`,
+        feeding it to `hasher` on the way, and return its path.
+        """
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            try:
+                for chunk in content.chunks(self.chunk_size):
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    temp.write(chunk)
+            except BaseException:
+                os.remove(temp.name)
+                raise
+        return temp.name
+
+    def move_into_place(self, source_path, name):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_move_safe(source_path, path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+    def release(self, name):
+        """
+        Drop the reference an `Image` held on `name`. The file is deleted
+        after the transaction commits if nothing else uses it by then.
+        """
+        apps.get_model("products", "StoredFile").objects.release(name)
+
+
+image_storage = ContentAddressedStorage()
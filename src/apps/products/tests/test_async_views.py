@@ -0,0 +1,138 @@
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+
+from apps.products.models import Product
+from apps.products.object_cache import product_cache
+from apps.products.views import ProductViewSet, SizeViewSet
+
+
+@pytest.fixture
+def async_request(settings):
+    """
+    Send a request to the async variant of the view of its URL, built the
+    way the URLconf builds it under ASGI.
+    """
+    settings.ASYNC_READ_VIEWS = True
+    factory = APIRequestFactory()
+
+    def send(method, url, data=None):
+        match = resolve(urlsplit(url).path)
+        view = match.func.cls.as_view(
+            match.func.actions, **match.func.initkwargs
+        )
+        request = getattr(factory, method)(url, data, format="json")
+        response = async_to_sync(view)(request, **match.kwargs)
+        if not response.streaming:
+            response.render()
+        return response
+
+    return send
+
+
+def test_as_view_is_async_only_when_enabled(settings):
+    settings.ASYNC_READ_VIEWS = False
+    assert not asyncio.iscoroutinefunction(
+        ProductViewSet.as_view({"get": "list"})
+    )
+
+    settings.ASYNC_READ_VIEWS = True
+    view = ProductViewSet.as_view({"get": "list", "post": "create"})
+    assert asyncio.iscoroutinefunction(view)
+    assert view.cls is ProductViewSet
+    assert view.actions == {"get": "list", "post": "create"}
+    assert view.csrf_exempt
+    assert not asyncio.iscoroutinefunction(
+        SizeViewSet.as_view({"get": "list"})
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_cache")
+class TestAsyncReadViews:
+    @pytest.fixture(autouse=True)
+    def setup_products(self, products_with_associations):
+        self.product = products_with_associations[5]
+        self.category = self.product.categories.first()
+        self.size = self.product.productsize_set.first()
+
+    @pytest.mark.parametrize(
+        "name, params, kwargs",
+        [
+            ("product-list", "", {}),
+            ("product-list", "?render=db", {}),
+            ("product-list", "?ordering=name&page_size=3", {}),
+            ("product-detail", "", {"pk": "product"}),
+            ("category-list", "?is_active=true", {}),
+            ("category-detail", "", {"pk": "category"}),
+            ("productimages-list", "", {"product_id": "product"}),
+            (
+                "productsizes-detail",
+                "",
+                {"product_id": "product", "size_id": "size"},
+            ),
+            ("productcategories-list", "", {"product_id": "product"}),
+        ],
+    )
+    def test_reads_match_the_sync_views(
+        self, api_client, async_request, name, params, kwargs
+    ):
+        ids = {
+            "product": self.product.pk,
+            "category": self.category.pk,
+            "size": self.size.size_id,
+        }
+        url = reverse(
+            f"products:{name}",
+            kwargs={key: ids[value] for key, value in kwargs.items()},
+        )
+
+        response = async_request("get", url + params)
+
+        assert response.status_code == status.HTTP_200_OK
+        expected = api_client.get(url + params)
+        assert json.loads(b"".join(response)) == json.loads(b"".join(expected))
+
+    def test_product_cache_is_shared_with_the_sync_views(self, async_request):
+        url = reverse(
+            "products:product-detail", kwargs={"pk": self.product.pk}
+        )
+
+        data = async_request("get", url).data
+
+        assert cache.get(product_cache.make_key(self.product.pk))[2] == data
+        with CaptureQueriesContext(connection) as queries:
+            response = async_request("get", url)
+        assert len(queries) == 0
+        assert response.data == data
+
+    def test_missing_objects_are_not_found(self, async_request):
+        for url in [
+            reverse("products:product-detail", kwargs={"pk": 9999}),
+            reverse("products:category-detail", kwargs={"pk": 9999}),
+            reverse("products:productsizes-list", kwargs={"product_id": 9999}),
+        ]:
+            response = async_request("get", url)
+
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_writes_go_through_the_sync_view(
+        self, async_request, product_serializer_write_data
+    ):
+        response = async_request(
+            "post",
+            reverse("products:product-list"),
+            product_serializer_write_data,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Product.objects.filter(pk=response.data["id"]).exists()
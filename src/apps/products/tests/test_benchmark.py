@@ -0,0 +1,58 @@
+import pytest
+from cachalot.api import cachalot_disabled
+
+from apps.products.benchmark import (
+    WRITE_ONLY_ROUTES,
+    benchmark_routes,
+    find_query_growth,
+    get_percentile,
+    get_route_names,
+    get_routes,
+)
+from apps.products.models import Product
+from apps.products.seeding import seed_catalog
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_cache")
+class TestCatalogBenchmark:
+    def test_every_read_route_is_benchmarked(self):
+        seed_catalog(10)
+
+        names = {name for _, name, _ in get_routes()}
+
+        assert names | WRITE_ONLY_ROUTES == get_route_names()
+
+    def test_query_counts_do_not_grow_with_products(self):
+        seed_catalog(60)
+        # Inside the test transaction cachalot keeps its entries in memory,
+        # where emptying the cache does not reach them.
+        with cachalot_disabled():
+            results = benchmark_routes(60, repeat=1)
+            Product.objects.filter(
+                pk__in=Product.objects.order_by("-pk").values("pk")[:50]
+            ).delete()
+            results += benchmark_routes(10, repeat=1)
+
+        assert {result["cold"]["status"] for result in results} == {200}
+        assert find_query_growth(results) == {}
+
+    def test_find_query_growth(self):
+        results = [
+            {"route": route, "products": products, "cold": {"queries": q}}
+            for route, products, q in [
+                ("flat", 10, 3),
+                ("flat", 100, 3),
+                ("n-plus-one", 10, 12),
+                ("n-plus-one", 100, 102),
+            ]
+        ]
+
+        assert find_query_growth(results) == {"n-plus-one": {10: 12, 100: 102}}
+
+    def test_get_percentile(self):
+        values = [0.5, 0.1, 0.4, 0.2, 0.3]
+
+        assert get_percentile(values, 50) == 0.3
+        assert get_percentile(values, 99) == 0.5
+        assert get_percentile([0.7], 90) == 0.7
@@ -0,0 +1,104 @@
+import io
+import os
+import time
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+
+from apps.products.cleanup import find_orphans, process_queue
+from apps.products.models import FileCleanup, StoredFile
+from apps.products.storage import image_storage
+from apps.products.tests.factories import ImageFactory
+
+
+def make_old(path):
+    old = time.time() - 2 * 3600
+    os.utime(path, (old, old))
+
+
+@pytest.mark.django_db
+def test_rolled_back_deletion_keeps_the_file(
+    media_root, django_capture_on_commit_callbacks
+):
+    image = ImageFactory()
+    path = media_root / image.img.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                image.delete()
+                raise RuntimeError
+
+    assert path.is_file()
+    assert not FileCleanup.objects.exists()
+    assert StoredFile.objects.get(name=image.img.name).reference_count == 1
+
+
+@pytest.mark.django_db
+def test_queue_is_processed_in_batches(media_root):
+    images = [
+        ImageFactory(img__color=color) for color in ["red", "green", "blue"]
+    ]
+    paths = [media_root / image.img.name for image in images]
+    for image in images:
+        image.delete()
+    assert FileCleanup.objects.count() == 3
+    assert all(path.is_file() for path in paths)
+
+    assert process_queue(batch_size=2) == 3
+
+    assert not any(path.exists() for path in paths)
+    assert not FileCleanup.objects.exists()
+
+
+@pytest.mark.django_db
+def test_queue_keeps_files_uploaded_again(media_root):
+    image = ImageFactory(img__color="red")
+    image.delete()
+    again = ImageFactory(img__color="red")
+
+    process_queue()
+
+    assert again.img.name == image.img.name
+    assert (media_root / again.img.name).is_file()
+    assert not FileCleanup.objects.exists()
+
+
+@pytest.mark.django_db
+def test_queue_deletes_from_the_image_storage(media_root, monkeypatch):
+    image = ImageFactory()
+    image.delete()
+    deleted = []
+    monkeypatch.setattr(image_storage, "delete", deleted.append)
+
+    process_queue()
+
+    assert deleted == [image.img.name]
+
+
+@pytest.mark.django_db
+def test_sweeper_deletes_only_old_orphans(
+    media_root, django_capture_on_commit_callbacks
+):
+    kept = ImageFactory(img__color="red")
+    make_old(media_root / kept.img.name)
+    orphans = ["images/00/orphan.jpg", "images/ff/orphan.jpg", "images/a.jpg"]
+    for name in orphans + ["images/recent.jpg"]:
+        (media_root / name).parent.mkdir(parents=True, exist_ok=True)
+        (media_root / name).write_bytes(b"orphan")
+    for name in orphans:
+        make_old(media_root / name)
+
+    assert list(find_orphans()) == sorted(orphans)
+
+    stdout = io.StringIO()
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command(
+            "sweep_orphan_files", delete=True, batch_size=2, stdout=stdout
+        )
+
+    assert "Found 3 orphaned files, queued 3" in stdout.getvalue()
+    assert not any((media_root / name).exists() for name in orphans)
+    assert (media_root / "images/recent.jpg").is_file()
+    assert (media_root / kept.img.name).is_file()
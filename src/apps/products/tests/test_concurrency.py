@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from apps.products.benchmark import get_routes
+from apps.products.concurrency import get_async_routes, measure_throughput
+from apps.products.seeding import seed_catalog
+
+
+def test_asgi_clients_run_concurrently():
+    active = peak = 0
+
+    async def application(scope, receive, send):
+        nonlocal active, peak
+        await receive()
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        status = 200 if scope["query_string"] == b"page=1" else 404
+        await send({"type": "http.response.start", "status": status})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    result = measure_throughput(application, "/api/products/?page=1", 5, 20)
+
+    assert result["requests"] == 20
+    assert result["errors"] == 0
+    assert peak == 5
+
+    result = measure_throughput(application, "/api/products/", 5, 20)
+    assert result["errors"] == 20
+
+
+def test_wsgi_clients_share_the_thread_pool():
+    threads = set()
+
+    def application(environ, start_response):
+        threads.add(threading.get_ident())
+        status = "200 OK" if environ["PATH_INFO"] == "/ok/" else "500 Error"
+        start_response(status, [])
+        return [b"{}"]
+
+    result = measure_throughput(application, "/ok/", 10, 30, threads=2)
+
+    assert result["requests"] == 30
+    assert result["errors"] == 0
+    assert len(threads) <= 2
+    assert (
+        measure_throughput(application, "/error/", 2, 4, threads=2)["errors"]
+        == 4
+    )
+
+
+@pytest.mark.django_db
+def test_async_routes():
+    seed_catalog(5)
+
+    labels = {label for label, _, _ in get_async_routes()}
+
+    assert labels < {label for label, _, _ in get_routes()}
+    assert {"product-list", "product-detail", "category-detail"} <= labels
+    assert not labels & {"size-list", "category-tree", "product-facets"}
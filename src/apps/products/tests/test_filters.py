@@ -1,8 +1,14 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from apps.products.filters import ProductFilter
 from apps.products.models import Product
-from apps.products.tests.factories import ProductFactory
+from apps.products.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductSizeFactory,
+)
 
 
 @pytest.mark.django_db
@@ -31,3 +37,116 @@ def test_no_categories_filter_excludes_categorized_products(category):
 
     # Check that a product with a category is not returned by the filter
     assert product_with_category not in no_categories_filter.qs
+
+
+@pytest.mark.django_db
+def test_search_ranks_name_matches_first():
+    in_description = ProductFactory(
+        name="Bouquet", description="Seven red tulips"
+    )
+    in_name = ProductFactory(name="Red tulips", description="Fresh")
+    ProductFactory(name="Roses", description="White roses")
+
+    search_filter = ProductFilter(
+        {"search": "tulip"}, queryset=Product.objects.all()
+    )
+
+    assert list(search_filter.qs.order_by("-search_rank")) == [
+        in_name,
+        in_description,
+    ]
+
+
+@pytest.mark.django_db
+def test_search_matches_misspelled_names():
+    tulips = ProductFactory(name="Red tulips", description="")
+    ProductFactory(name="Roses", description="")
+
+    search_filter = ProductFilter(
+        {"search": "tulipz"}, queryset=Product.objects.all()
+    )
+
+    assert list(search_filter.qs) == [tulips]
+
+
+@pytest.mark.django_db
+def test_search_vector_follows_queryset_updates():
+    product = ProductFactory(name="Roses", description="")
+
+    Product.objects.filter(pk=product.pk).update(name="Peonies")
+
+    search_filter = ProductFilter(
+        {"search": "peony"}, queryset=Product.objects.all()
+    )
+    assert list(search_filter.qs) == [product]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params, expected",
+    [
+        ({"price_min": 2500}, ["mid", "high"]),
+        ({"price_max": 2500}, ["low", "mid"]),
+        ({"price_min": 2500, "price_max": 2500}, ["mid"]),
+    ],
+)
+def test_price_filters_match_any_active_size(params, expected):
+    for name, prices in [
+        ("low", [1000]),
+        ("mid", [2000, 3000]),
+        ("high", [4000]),
+    ]:
+        product = ProductFactory(name=name)
+        for price in prices:
+            ProductSizeFactory(product=product, price=price)
+    ProductSizeFactory(product__name="inactive", price=2500, is_active=False)
+
+    price_filter = ProductFilter(params, queryset=Product.objects.all())
+
+    assert (
+        list(price_filter.qs.order_by("id").values_list("name", flat=True))
+        == expected
+    )
+
+
+@pytest.mark.django_db
+def test_categories_filter_returns_each_product_once_without_distinct():
+    first, second = CategoryFactory.create_batch(2)
+    both = ProductFactory(categories=[first, second])
+    ProductFactory(categories=[CategoryFactory()])
+    ProductFactory()
+
+    categories_filter = ProductFilter(
+        {"categories": f"{first.id},{second.id}"},
+        queryset=Product.objects.all(),
+    )
+    with CaptureQueriesContext(connection) as context:
+        products = list(categories_filter.qs)
+
+    assert products == [both]
+    assert "DISTINCT" not in context.captured_queries[0]["sql"]
+    assert "EXISTS" in context.captured_queries[0]["sql"]
+
+
+@pytest.mark.django_db
+def test_categories_tree_filter_matches_descendants():
+    root = CategoryFactory()
+    child = CategoryFactory(parent_category=root)
+    grandchild = CategoryFactory(parent_category=child)
+    in_root = ProductFactory(categories=[root])
+    in_grandchild = ProductFactory()
+    # Linked without the ancestors the m2m_changed handler would add
+    Product.categories.through.objects.create(
+        product=in_grandchild, category=grandchild
+    )
+    ProductFactory(categories=[CategoryFactory()])
+
+    def filtered(category):
+        tree_filter = ProductFilter(
+            {"categories_tree": str(category.id)},
+            queryset=Product.objects.order_by("id"),
+        )
+        return list(tree_filter.qs)
+
+    assert filtered(root) == [in_root, in_grandchild]
+    assert filtered(child) == [in_grandchild]
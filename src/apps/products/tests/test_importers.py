@@ -0,0 +1,224 @@
+import io
+import json
+from functools import partial
+
+import pytest
+from cachalot.api import cachalot_disabled
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from apps.products.importers import CatalogImporter
+from apps.products.models import Product
+from apps.products.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    SizeFactory,
+)
+
+
+@pytest.fixture
+def catalog(image_no_save_file):
+    """
+    The objects a catalog file refers to: a category nested in another
+    one, two sizes and two images.
+    """
+    parent = CategoryFactory()
+    return {
+        "parent": parent,
+        "category": CategoryFactory(parent_category=parent),
+        "sizes": SizeFactory.create_batch(2),
+        "images": image_no_save_file.create_batch(2),
+    }
+
+
+def make_rows(catalog, count, name="Roses"):
+    small, large = catalog["sizes"]
+    first, second = catalog["images"]
+    return [
+        {
+            "name": name,
+            "description": f"Bouquet {i}",
+            "categories": [catalog["category"].id],
+            "sizes": [
+                {"size": small.id, "price": 1000},
+                {"size": large.id, "price": 2500, "is_active": False},
+            ],
+            "images": [
+                {"image": first.id, "is_preview": True},
+                {"image": second.id},
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def to_jsonl(rows):
+    return io.StringIO("".join(json.dumps(row) + "\n" for row in rows))
+
+
+@pytest.mark.django_db
+def test_import_jsonl(catalog):
+    """
+    Test that imported products get their sizes, images, categories and
+    the ancestors of their categories, and unique slugs numbered after the
+    existing ones.
+    """
+    ProductFactory(name="Roses")
+
+    result = CatalogImporter(chunk_size=2).run(
+        to_jsonl(make_rows(catalog, 3)), "jsonl"
+    )
+
+    assert (result.created, result.skipped) == (3, 0)
+    products = Product.objects.filter(description__startswith="Bouquet")
+    assert sorted(products.values_list("slug", flat=True)) == [
+        "roses-2",
+        "roses-3",
+        "roses-4",
+    ]
+    for product in products:
+        assert set(product.categories.all()) == {
+            catalog["category"],
+            catalog["parent"],
+        }
+        assert sorted(
+            product.productsize_set.values_list("price", "is_active")
+        ) == [(1000, True), (2500, False)]
+        assert list(
+            product.productimage_set.order_by("image_id").values_list(
+                "is_preview", flat=True
+            )
+        ) == [True, False]
+
+
+@pytest.mark.django_db
+def test_import_csv(catalog):
+    small, large = catalog["sizes"]
+    first, second = catalog["images"]
+    stream = io.StringIO(
+        "name,description,is_active,categories,sizes,images,preview_image\n"
+        f"Tulips,Spring,false,{catalog['category'].id},"
+        f"{small.id}:700|{large.id}:900,{first.id}|{second.id},{second.id}\n"
+    )
+
+    result = CatalogImporter().run(stream, "csv")
+
+    assert result.created == 1
+    product = Product.objects.get(name="Tulips")
+    assert product.is_active is False
+    assert product.categories.count() == 2
+    assert sorted(product.productsize_set.values_list("price", flat=True)) == [
+        700,
+        900,
+    ]
+    assert product.productimage_set.get(is_preview=True).image == second
+
+
+@pytest.mark.django_db
+def test_import_skips_invalid_rows(catalog):
+    rows = make_rows(catalog, 3)
+    rows[0]["sizes"][0]["size"] = 9999
+    del rows[1]["name"]
+    stream = io.StringIO(to_jsonl(rows).getvalue() + "{not json\n")
+
+    result = CatalogImporter().run(stream, "jsonl")
+
+    assert (result.created, result.skipped) == (1, 3)
+    errors = {error["line"]: error["errors"] for error in result.errors}
+    assert sorted(errors) == [1, 2, 4]
+    assert "sizes" in errors[1]
+    assert "name" in errors[2]
+    assert Product.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_query_count_does_not_grow_with_rows(catalog):
+    def count_queries(rows):
+        with cachalot_disabled(), CaptureQueriesContext(connection) as context:
+            CatalogImporter(chunk_size=100).run(to_jsonl(rows), "jsonl")
+        return len(context)
+
+    assert count_queries(make_rows(catalog, 5, "Lilies")) == count_queries(
+        make_rows(catalog, 50, "Peonies")
+    )
+
+
+@pytest.mark.django_db
+def test_import_catalog_command(catalog, tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text(to_jsonl(make_rows(catalog, 2)).getvalue())
+    stdout = io.StringIO()
+
+    call_command("import_catalog", str(path), stdout=stdout)
+
+    assert Product.objects.count() == 2
+    assert "Imported 2 products, skipped 0 rows" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+class TestImportEndpoint:
+    url = reverse("products:product-import-catalog")
+
+    def upload(self, catalog, name="catalog.jsonl"):
+        content = to_jsonl(make_rows(catalog, 2)).getvalue().encode()
+        return {"file": SimpleUploadedFile(name, content)}
+
+    def test_import(self, api_client, admin_user, catalog):
+        api_client.force_authenticate(admin_user)
+
+        response = api_client.post(
+            self.url, self.upload(catalog), format="multipart"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 2
+        assert response.data["skipped"] == 0
+        assert Product.objects.count() == 2
+
+    def test_import_rejects_unknown_format(
+        self, api_client, admin_user, catalog
+    ):
+        api_client.force_authenticate(admin_user)
+
+        response = api_client.post(
+            self.url, self.upload(catalog, "catalog.xml"), format="multipart"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_import_rejects_invalid_utf8(
+        self, api_client, admin_user, catalog, monkeypatch
+    ):
+        api_client.force_authenticate(admin_user)
+        content = to_jsonl(make_rows(catalog, 3)).getvalue().encode()
+        # Past the first buffer the import decodes
+        content += b"\n" * 2**16 + b"\xff\n"
+        upload = {"file": SimpleUploadedFile("catalog.jsonl", content)}
+        # Every row is committed on its own
+        monkeypatch.setattr(
+            "apps.products.views.CatalogImporter",
+            partial(CatalogImporter, chunk_size=1),
+        )
+
+        response = api_client.post(self.url, upload, format="multipart")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "file" in response.data
+        assert not Product.objects.exists()
+
+    def test_import_requires_admin(
+        self, api_client, django_user_model, catalog
+    ):
+        user = django_user_model.objects.create_user("user", "user@x.com")
+        api_client.force_authenticate(user)
+
+        response = api_client.post(
+            self.url, self.upload(catalog), format="multipart"
+        )
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not Product.objects.exists()
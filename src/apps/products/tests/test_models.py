@@ -1,6 +1,14 @@
 import pytest
+from cachalot.api import cachalot_disabled
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 
-from apps.products.tests.factories import ProductImageFactory
+from apps.products.models import Product, ProductImage, ProductSize
+from apps.products.tests.factories import (
+    CategoryFactory,
+    ProductImageFactory,
+    ProductSizeFactory,
+)
 
 
 @pytest.mark.django_db
@@ -18,3 +26,131 @@ def test_only_one_image_per_product_as_preview(mock_image_save, product):
 
     assert image1.is_preview is False
     assert image2.is_preview
+
+
+@pytest.mark.django_db
+def test_switching_preview_is_a_single_statement(mock_image_save, product):
+    image1 = ProductImageFactory(product=product, is_preview=True)
+    image2 = ProductImageFactory(product=product)
+
+    image2.is_preview = True
+    with CaptureQueriesContext(connection) as context:
+        image2.save(update_fields=["is_preview"])
+
+    assert len(context) == 1
+    assert list(product.productimage_set.filter(is_preview=True)) == [image2]
+    image1.refresh_from_db()
+    assert image1.is_preview is False
+
+
+@pytest.mark.django_db
+def test_two_previews_are_rejected(mock_image_save, product):
+    ProductImageFactory(product=product, is_preview=True)
+    image = ProductImageFactory(product=product)
+
+    with pytest.raises(IntegrityError):
+        ProductImage.objects.filter(pk=image.pk).update(is_preview=True)
+
+
+@pytest.mark.django_db
+def test_product_preview_image_follows_links(mock_image_save, product):
+    """
+    Test that `Product.preview_image` is kept up to date by the database
+    whichever way the preview links are written. Queryset updates do not
+    invalidate the cached products, so cachalot is off here.
+    """
+    with cachalot_disabled():
+        first = ProductImageFactory(product=product, is_preview=True)
+        product.refresh_from_db()
+        assert product.preview_image == first.image
+
+        second = ProductImageFactory(product=product, is_preview=True)
+        product.refresh_from_db()
+        assert product.preview_image == second.image
+
+        ProductImage.objects.filter(pk=second.pk).update(is_preview=False)
+        product.refresh_from_db()
+        assert product.preview_image is None
+
+        ProductImage.objects.filter(pk=first.pk).update(is_preview=True)
+        first.delete()
+        product.refresh_from_db()
+        assert product.preview_image is None
+
+
+@pytest.mark.django_db
+def test_product_price_range_follows_sizes(product):
+    """
+    Test that the price range of the active sizes is kept on the product
+    by the database. Queryset updates do not invalidate the cached
+    products, so cachalot is off here.
+    """
+    with cachalot_disabled():
+        cheap = ProductSizeFactory(product=product, price=1000)
+        ProductSizeFactory(product=product, price=3000)
+        ProductSizeFactory(product=product, price=9000, is_active=False)
+        product.refresh_from_db()
+        assert (product.min_price, product.max_price) == (1000, 3000)
+
+        ProductSize.objects.filter(product=product).update(is_active=True)
+        product.refresh_from_db()
+        assert (product.min_price, product.max_price) == (1000, 9000)
+
+        cheap.delete()
+        ProductSize.objects.filter(product=product, price=9000).delete()
+        product.refresh_from_db()
+        assert (product.min_price, product.max_price) == (3000, 3000)
+
+        ProductSize.objects.filter(product=product).delete()
+        product.refresh_from_db()
+        assert (product.min_price, product.max_price) == (None, None)
+
+
+@pytest.mark.django_db
+def test_category_ancestors_and_descendants():
+    root = CategoryFactory()
+    child = CategoryFactory(parent_category=root)
+    grandchild = CategoryFactory(parent_category=child)
+    CategoryFactory()
+
+    assert list(grandchild.get_ancestors()) == [child, root]
+    assert list(root.get_ancestors()) == []
+    assert set(root.get_descendants()) == {child, grandchild}
+    assert list(grandchild.get_descendants()) == []
+
+
+@pytest.mark.django_db
+def test_saving_an_unchanged_instance_writes_nothing(product):
+    product = Product.objects.get(pk=product.pk)
+
+    with CaptureQueriesContext(connection) as context:
+        product.save()
+
+    assert len(context) == 0
+    assert product.get_dirty_fields() == []
+
+
+@pytest.mark.django_db
+def test_snapshot_is_made_when_needed(product):
+    product = Product.objects.only("name").get(pk=product.pk)
+
+    assert "_loaded_values" not in product.__dict__
+    product.name = "Tulips"
+    assert product.get_dirty_fields() == ["name"]
+    assert product.get_loaded_value("name") != "Tulips"
+
+
+@pytest.mark.django_db
+def test_save_updates_only_the_changed_columns(product):
+    product = Product.objects.get(pk=product.pk)
+    product.description = "Fresh tulips"
+
+    assert product.get_dirty_fields() == ["description"]
+    with CaptureQueriesContext(connection) as context:
+        product.save()
+
+    (query,) = context.captured_queries
+    assert '"description"' in query["sql"]
+    assert '"name"' not in query["sql"]
+    assert product.get_dirty_fields() == []
+    assert product.get_loaded_value("description") == "Fresh tulips"
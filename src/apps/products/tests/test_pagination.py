@@ -0,0 +1,147 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from apps.products.models import Product
+from apps.products.tests.factories import ProductFactory
+
+
+@pytest.fixture
+def products_with_duplicate_names(db):
+    names = ["rose", "tulip", "rose", "peony", "tulip", "rose", "lily"]
+    return [ProductFactory(name=name) for name in names]
+
+
+def walk_pages(api_client, url, params, direction="next"):
+    """
+    Follow the pagination links starting from `url` and return the ids of
+    all the products seen, together with the last response.
+    """
+    seen = []
+    response = api_client.get(url, params)
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(item["id"] for item in response.data["results"])
+        link = response.data[direction]
+        if link is None:
+            return seen, response
+        response = api_client.get(link)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "ordering, expected_order_by",
+    [
+        ("id", ("id",)),
+        ("-id", ("-id",)),
+        ("newest", ("-id",)),
+        ("name", ("name", "id")),
+        ("-name", ("-name", "-id")),
+    ],
+)
+def test_product_pages_cover_every_product_once(
+    api_client, products_with_duplicate_names, ordering, expected_order_by
+):
+    """
+    Test that walking the product list page by page returns every product
+    exactly once and in the requested order, even when the ordering field
+    has duplicate values.
+    """
+    url = reverse("products:product-list")
+    seen, _ = walk_pages(
+        api_client, url, {"ordering": ordering, "page_size": 2}
+    )
+
+    expected = list(
+        Product.objects.order_by(*expected_order_by).values_list(
+            "id", flat=True
+        )
+    )
+    assert seen == expected
+
+
+@pytest.mark.django_db
+def test_previous_link_returns_previous_page(
+    api_client, products_with_duplicate_names
+):
+    """
+    Test that following the `previous` link from the last page walks back
+    through the same pages in reverse.
+    """
+    url = reverse("products:product-list")
+    forward, last_response = walk_pages(
+        api_client, url, {"ordering": "name", "page_size": 3}
+    )
+    response = last_response
+    backward = [item["id"] for item in response.data["results"]]
+    while response.data["previous"] is not None:
+        response = api_client.get(response.data["previous"])
+        page_ids = [item["id"] for item in response.data["results"]]
+        backward = page_ids + backward
+
+    assert backward == forward
+
+
+@pytest.mark.django_db
+def test_product_list_does_not_count(
+    api_client, products_with_duplicate_names
+):
+    """
+    Test that paginating the product list never runs a COUNT query and
+    that the response has no `count` key.
+    """
+    url = reverse("products:product-list")
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(url, {"page_size": 2})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "count" not in response.data
+    assert not any("COUNT(" in query["sql"] for query in context)
+
+
+@pytest.mark.django_db
+def test_page_is_stable_under_concurrent_inserts(
+    api_client, products_with_duplicate_names
+):
+    """
+    Test that products created while a client is paging do not shift the
+    rest of the pages the client has not seen yet.
+    """
+    url = reverse("products:product-list")
+    first_page = api_client.get(url, {"ordering": "newest", "page_size": 3})
+    ProductFactory.create_batch(3)
+    second_page = api_client.get(first_page.data["next"])
+
+    first_ids = [item["id"] for item in first_page.data["results"]]
+    second_ids = [item["id"] for item in second_page.data["results"]]
+    assert not set(first_ids) & set(second_ids)
+    assert max(second_ids) < min(first_ids)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("cursor", ["garbage", "eyJvIjoiaWQifQ=="])
+def test_invalid_cursor_returns_404(api_client, cursor):
+    """
+    Test that a malformed cursor results in a 404 status code.
+    """
+    url = reverse("products:product-list")
+    response = api_client.get(url, {"cursor": cursor})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_cursor_from_other_ordering_returns_404(
+    api_client, products_with_duplicate_names
+):
+    """
+    Test that a cursor issued for one ordering can not be reused with
+    another ordering.
+    """
+    url = reverse("products:product-list")
+    response = api_client.get(url, {"ordering": "name", "page_size": 2})
+    next_link = response.data["next"].replace("ordering=name", "ordering=id")
+
+    response = api_client.get(next_link)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,130 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Count
+from django.urls import reverse
+from PIL import Image as PILImage
+
+from apps.products.models import Category, Image, Product, StoredFile
+from apps.products.seeding import CatalogShape, encode_png, seed_catalog
+
+
+@pytest.mark.django_db
+class TestSeedCatalog:
+    def test_catalog_follows_the_shape(self):
+        shape = CatalogShape(
+            category_depth=2,
+            category_fan_out=3,
+            sizes=4,
+            images=10,
+            sizes_per_product=(2, 2),
+            images_per_product=(3, 3),
+        )
+
+        seed_catalog(25, shape=shape, chunk_size=10)
+
+        assert Product.objects.count() == 25
+        assert Image.objects.count() == 10
+        assert Category.objects.filter(parent_category=None).count() == 3
+        assert Category.objects.count() == 3 + 9
+        counts = Product.objects.annotate(
+            sizes_count=Count("sizes", distinct=True),
+            images_count=Count("images", distinct=True),
+        ).values_list("sizes_count", "images_count")
+        assert set(counts) == {(2, 3)}
+        assert not Product.objects.filter(preview_image=None).exists()
+        assert not Product.objects.filter(search_vector=None).exists()
+
+    def test_same_seed_makes_the_same_catalog(self):
+        def catalog():
+            products = Product.objects.order_by("pk")
+            return [
+                (
+                    product.name,
+                    product.description,
+                    sorted(product.productsize_set.values_list("price")),
+                )
+                for product in products.prefetch_related("productsize_set")
+            ]
+
+        seed_catalog(12, seed=3, chunk_size=5)
+        first = catalog()
+        Product.objects.all().delete()
+        seed_catalog(12, seed=3, chunk_size=5)
+
+        assert catalog() == first
+        Product.objects.all().delete()
+        seed_catalog(12, seed=4, chunk_size=5)
+        assert catalog() != first
+
+    @pytest.mark.usefixtures("media_root")
+    def test_placeholder_files(self):
+        seed_catalog(8, shape=CatalogShape(image_files=True))
+
+        image = Image.objects.first()
+        assert image.img.name.startswith("images/")
+        with image.img.open() as file:
+            assert PILImage.open(file).size == (320, 240)
+        names = Image.objects.values_list("img", flat=True)
+        assert len(set(names)) == Image.objects.count()
+        assert set(
+            StoredFile.objects.values_list("name", "reference_count")
+        ) == {(name, 1) for name in names}
+
+    def test_command_clears_the_catalog(self):
+        call_command(
+            "seed_catalog",
+            "5",
+            "--workers=0",
+            "--no-image-files",
+            "--images-per-product=1-2",
+            stdout=io.StringIO(),
+        )
+        call_command(
+            "seed_catalog",
+            "7",
+            "--clear",
+            "--workers=0",
+            "--no-image-files",
+            stdout=io.StringIO(),
+        )
+
+        assert list(
+            Product.objects.order_by("pk").values_list("pk", flat=True)
+        ) == list(range(1, 8))
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_cached_catalog_is_dropped(
+        self, api_client, django_capture_on_commit_callbacks
+    ):
+        options = ["--clear", "--workers=0", "--no-image-files"]
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command("seed_catalog", "2", *options, stdout=io.StringIO())
+        tree_url = reverse("products:category-tree")
+        product_url = reverse("products:product-detail", kwargs={"pk": 1})
+        old_tree = api_client.get(tree_url).json()
+        old_product = api_client.get(product_url).json()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            call_command(
+                "seed_catalog",
+                "2",
+                "--seed=1",
+                *options,
+                stdout=io.StringIO(),
+            )
+
+        assert api_client.get(tree_url).json() != old_tree
+        product = Product.objects.get(pk=1)
+        assert product.name != old_product["name"]
+        assert api_client.get(product_url).json()["name"] == product.name
+
+
+def test_encode_png():
+    content = encode_png(4, 3, b"\x10\x20\x30", "placeholder")
+
+    image = PILImage.open(io.BytesIO(content))
+    assert image.size == (4, 3)
+    assert image.getpixel((3, 2)) == (0x10, 0x20, 0x30)
+    assert image.info["Comment"] == "placeholder"
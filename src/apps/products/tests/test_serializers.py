@@ -0,0 +1,167 @@
+import pytest
+from rest_framework.serializers import ListSerializer
+from rest_framework.test import APIRequestFactory
+
+from apps.products.compiled_serializers import (
+    CompiledListSerializer,
+    CompiledSerializer,
+)
+from apps.products.models import Category, Image, ProductSize
+from apps.products.serializers import (
+    CategorySerializer,
+    ImageSerializer,
+    ProductSerializer,
+    ProductSizeSerializer,
+)
+from apps.products.tests.factories import CategoryFactory
+from apps.products.views import CategoryViewSet, ProductViewSet
+
+
+@pytest.fixture
+def serializer_context():
+    return {"request": APIRequestFactory().get("/")}
+
+
+@pytest.fixture
+def category_tree(db, image_no_save_file):
+    """
+    A category with an image, a parent and two child categories, so that
+    every kind of field of `CategorySerializer` has a value.
+    """
+    parent = CategoryFactory()
+    category = CategoryFactory(
+        parent_category=parent,
+        image=image_no_save_file.create(size_description="Large bouquet"),
+    )
+    CategoryFactory.create_batch(2, parent_category=category)
+    return category
+
+
+@pytest.fixture
+def serialize_with_drf(monkeypatch):
+    """
+    Return a function serializing instances with the regular DRF list
+    serializer, including for nested lists, to compare the compiled output
+    against.
+    """
+
+    def serialize(serializer_class, instances, context):
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                CompiledListSerializer,
+                "to_representation",
+                ListSerializer.to_representation,
+            )
+            return serializer_class(instances, many=True, context=context).data
+
+    return serialize
+
+
+@pytest.mark.django_db
+def test_product_list_serializer_is_compiled():
+    assert isinstance(ProductSerializer(many=True), CompiledListSerializer)
+    assert isinstance(CategorySerializer(many=True), CompiledListSerializer)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("with_request", [True, False])
+def test_compiled_product_serializer_matches_serializer(
+    products_with_associations,
+    category_tree,
+    serializer_context,
+    serialize_with_drf,
+    with_request,
+):
+    """
+    Test that the compiled list output of `ProductSerializer` is identical
+    to the output of the regular serializer for prefetched products.
+    """
+    products_with_associations[0].categories.add(category_tree)
+    context = serializer_context if with_request else {}
+    products = ProductViewSet.queryset.all()
+
+    expected = serialize_with_drf(ProductSerializer, products, context)
+    data = ProductSerializer(products, many=True, context=context).data
+
+    assert data == expected
+
+
+@pytest.mark.django_db
+def test_compiled_category_serializer_matches_serializer(
+    category_tree, serializer_context, serialize_with_drf
+):
+    """
+    Test that the compiled list output of `CategorySerializer` is identical
+    to the output of the regular serializer.
+    """
+    categories = CategoryViewSet.queryset.all()
+
+    expected = serialize_with_drf(
+        CategorySerializer, categories, serializer_context
+    )
+    data = CategorySerializer(
+        categories, many=True, context=serializer_context
+    ).data
+
+    assert data == expected
+
+
+@pytest.mark.django_db
+def test_compiled_category_serializer_without_prefetch(
+    category_tree, serialize_with_drf
+):
+    """
+    Test that the compiled serializer falls back to querying relations
+    that were not prefetched.
+    """
+    categories = Category.objects.all()
+
+    expected = serialize_with_drf(CategorySerializer, categories, {})
+    data = CategorySerializer(categories, many=True).data
+
+    assert data == expected
+
+
+@pytest.mark.django_db
+def test_compiled_serializer_reads_values_rows(
+    category_tree, serializer_context, serialize_with_drf
+):
+    """
+    Test that a compiled serializer renders `.values()` rows the same way
+    the regular serializer renders model instances.
+    """
+    images = Image.objects.order_by("id")
+    rows = [
+        {**row, "variants": []}
+        for row in images.values("id", "img", "size_description")
+    ]
+
+    expected = serialize_with_drf(ImageSerializer, images, serializer_context)
+    data = ImageSerializer(rows, many=True, context=serializer_context).data
+
+    assert data == expected
+
+
+@pytest.mark.django_db
+def test_compiled_serializer_reads_nested_rows(products_with_associations):
+    """
+    Test that nested serializers of a compiled plan read nested rows.
+    """
+    product_sizes = ProductSize.objects.select_related("size").order_by("id")
+    rows = [
+        {
+            "size": {
+                "id": product_size.size.id,
+                "name": product_size.size.name,
+            },
+            "price": product_size.price,
+            "is_active": product_size.is_active,
+        }
+        for product_size in product_sizes
+    ]
+    compiled = CompiledSerializer(ProductSizeSerializer(), from_mapping=True)
+
+    expected = ListSerializer(child=ProductSizeSerializer()).to_representation(
+        product_sizes
+    )
+    assert [compiled.to_representation(row) for row in rows] == expected
@@ -1,9 +1,23 @@
 import os
 
 import pytest
-from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from apps.products.tests.factories import CategoryFactory, ImageFactory
+from apps.products.models import CategoryClosure
+from apps.products.tests.factories import (
+    CategoryFactory,
+    ImageFactory,
+    ProductFactory,
+)
+
+
+def get_closure_rows():
+    return set(
+        CategoryClosure.objects.values_list(
+            "ancestor_id", "descendant_id", "depth"
+        )
+    )
 
 
 @pytest.mark.django_db
@@ -27,37 +41,111 @@ def test_add_parent_categories_on_add(product):
 
 
 @pytest.mark.django_db
-def test_delete_image_file_on_instance_delete(image):
+def test_add_parent_categories_on_reverse_add():
+    """
+    Test that adding products from the category side also adds the parent
+    categories to the products.
+    """
+    category_parent = CategoryFactory()
+    category_child = CategoryFactory(parent_category=category_parent)
+    products = ProductFactory.create_batch(3)
+
+    category_child.product_set.add(*products)
+
+    for product in products:
+        assert set(product.categories.all()) == {
+            category_child,
+            category_parent,
+        }
+
+
+@pytest.mark.django_db
+def test_add_parent_categories_query_count_does_not_grow_with_depth(product):
+    """
+    Test that linking categories of a deep tree takes the same number of
+    queries as linking categories without parents.
+    """
+    parent = None
+    for _ in range(10):
+        parent = CategoryFactory(parent_category=parent)
+    leaves = CategoryFactory.create_batch(3, parent_category=parent)
+    roots = CategoryFactory.create_batch(3)
+    other_product = ProductFactory()
+
+    with CaptureQueriesContext(connection) as shallow:
+        other_product.categories.add(*roots)
+    with CaptureQueriesContext(connection) as deep:
+        product.categories.add(*leaves)
+
+    assert len(deep) == len(shallow)
+    assert product.categories.count() == 13
+
+
+@pytest.mark.django_db
+def test_category_closure_follows_tree_changes():
+    """
+    Test that the closure table maintained on save matches a full rebuild
+    after categories are created and moved between subtrees.
+    """
+    root = CategoryFactory()
+    other_root = CategoryFactory()
+    child = CategoryFactory(parent_category=root)
+    grandchild = CategoryFactory(parent_category=child)
+    CategoryFactory(parent_category=grandchild)
+
+    child.parent_category = other_root
+    child.save()
+    grandchild.parent_category = None
+    grandchild.save()
+    root.parent_category = grandchild
+    root.save()
+
+    rows = get_closure_rows()
+    CategoryClosure.objects.rebuild()
+    assert rows == get_closure_rows()
+    assert (grandchild.id, root.id, 1) in rows
+    assert (other_root.id, child.id, 1) in rows
+    assert (root.id, child.id, 1) not in rows
+
+
+@pytest.mark.django_db
+def test_delete_image_file_on_instance_delete(
+    image, media_root, django_capture_on_commit_callbacks
+):
     """
     Test that the image file is deleted from the filesystem when the
     Image model instance's file field is deleted.
     """
-    image_path = os.path.join(settings.MEDIA_ROOT, image.img.name)
+    image_path = media_root / image.img.name
 
     # Check that the file exists in the filesystem
     assert os.path.isfile(image_path)
 
-    # Delete the image instance
-    image.delete()
+    # Delete the image instance, the file goes once the deletion commits
+    with django_capture_on_commit_callbacks(execute=True):
+        image.delete()
 
     # Check that the file is also deleted from the filesystem
     assert not os.path.isfile(image_path)
 
 
 @pytest.mark.django_db
-def test_delete_image_file_on_instance_change(image):
+def test_delete_image_file_on_instance_change(
+    image, media_root, django_capture_on_commit_callbacks
+):
     """
     Test that the image file is deleted from the filesystem when the
     Image model instance's file field is updated.
     """
-    old_image_path = os.path.join(settings.MEDIA_ROOT, image.img.name)
+    old_image_path = media_root / image.img.name
 
     # Check that the file exists in the filesystem
     assert os.path.isfile(old_image_path)
 
-    new_image = ImageFactory.build()
+    new_image = ImageFactory.build(img__color="red")
     image.img = new_image.img
-    image.save()
+    with django_capture_on_commit_callbacks(execute=True):
+        image.save()
 
     assert not os.path.isfile(old_image_path)
     image.delete()
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DataError
+from django.urls import reverse
+from rest_framework import status
+
+from apps.products.models import Image, StoredFile
+from apps.products.tests.factories import ImageFactory
+
+
+def stored_files(media_root):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), media_root)
+        for directory, _, names in os.walk(media_root / "images")
+        for name in names
+    )
+
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_file(media_root):
+    first = ImageFactory(img__filename="first.JPG", img__color="red")
+    second = ImageFactory(img__filename="second.jpg", img__color="red")
+    other = ImageFactory(img__color="green")
+
+    assert first.img.name == second.img.name != other.img.name
+    directory, filename = os.path.split(first.img.name)
+    assert filename.endswith(".jpg")
+    assert directory == f"images/{filename[:2]}"
+    assert stored_files(media_root) == sorted([first.img.name, other.img.name])
+    assert StoredFile.objects.get(name=first.img.name).reference_count == 2
+
+
+@pytest.mark.django_db
+def test_failed_insert_drops_the_reference(media_root):
+    image = ImageFactory.build(size_description="x" * 101)
+
+    with pytest.raises(DataError):
+        image.save()
+
+    assert not StoredFile.objects.exists()
+
+
+@pytest.mark.django_db
+def test_file_is_deleted_with_its_last_image(
+    media_root, django_capture_on_commit_callbacks
+):
+    first, second = ImageFactory.create_batch(2, img__color="red")
+    path = media_root / first.img.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert path.is_file()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not path.exists()
+    assert not StoredFile.objects.exists()
+
+
+@pytest.mark.django_db
+def test_reuploading_through_the_api_stores_nothing(
+    api_client, media_root, django_capture_on_commit_callbacks
+):
+    content = ImageFactory.build(img__color="blue").img.read()
+    url = reverse("products:image-list")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        responses = [
+            api_client.post(
+                url,
+                {"img": SimpleUploadedFile("photo.jpg", content)},
+                format="multipart",
+            )
+            for _ in range(2)
+        ]
+
+    assert [r.status_code for r in responses] == [status.HTTP_201_CREATED] * 2
+    assert responses[0].data["img"] == responses[1].data["img"]
+    names = set(Image.objects.values_list("img", flat=True))
+    assert len(names) == 1
+    originals = [
+        name for name in stored_files(media_root) if "variants" not in name
+    ]
+    assert originals == list(names)
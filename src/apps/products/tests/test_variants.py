@@ -0,0 +1,175 @@
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from PIL import Image as PILImage
+from rest_framework import status
+
+from apps.products import variants
+from apps.products.imaging import render_variants
+from apps.products.models import ImageVariant
+from apps.products.tests.factories import ImageFactory
+from apps.products.variants import save_variants
+
+
+@pytest.fixture
+def media_root(media_root, settings):
+    settings.IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+    settings.IMAGE_VARIANT_FORMATS = ["webp", "jpeg"]
+    return media_root
+
+
+def test_render_variants_does_not_upscale():
+    original = io.BytesIO()
+    PILImage.new("RGBA", (800, 400)).save(original, "PNG")
+
+    variants = render_variants(original.getvalue(), [320, 640, 1280], ["webp"])
+
+    assert [width for width, _, _ in variants] == [320, 640, 800]
+    with PILImage.open(io.BytesIO(variants[0][2])) as smallest:
+        assert smallest.format == "WEBP"
+        assert smallest.size == (320, 160)
+
+
+@pytest.mark.django_db
+def test_variants_are_generated_after_upload(
+    media_root, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ImageFactory(img__width=800, img__height=400)
+
+    variants = image.variants.order_by("format", "width")
+    assert [(v.format, v.width) for v in variants] == [
+        ("jpeg", 320),
+        ("jpeg", 640),
+        ("jpeg", 800),
+        ("webp", 320),
+        ("webp", 640),
+        ("webp", 800),
+    ]
+    assert all(v.source == image.img.name for v in variants)
+    assert all((media_root / v.file.name).is_file() for v in variants)
+
+
+@pytest.mark.django_db
+def test_replacing_the_file_regenerates_variants(
+    media_root, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ImageFactory(img__width=800, img__height=400)
+    old_files = [v.file.name for v in image.variants.all()]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        image.img = ImageFactory.build(img__width=200, img__height=200).img
+        image.save()
+
+    assert list(image.variants.values_list("width", flat=True)) == [200, 200]
+    assert not any((media_root / name).exists() for name in old_files)
+
+
+@pytest.mark.django_db
+def test_image_api_exposes_srcset(
+    api_client, media_root, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ImageFactory(img__width=800, img__height=400)
+
+    response = api_client.get(
+        reverse("products:image-detail", kwargs={"pk": image.pk})
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    srcset = response.data["srcset"]
+    assert sorted(srcset) == ["jpeg", "webp"]
+    sources = srcset["webp"].split(", ")
+    assert [source.rsplit(" ", 1)[1] for source in sources] == [
+        "320w",
+        "640w",
+        "800w",
+    ]
+    assert sources[0].startswith("http://testserver/media/images/variants/")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("workers", [0, 2])
+def test_regenerate_command_resumes(media_root, workers):
+    images = ImageFactory.create_batch(3, img__width=400, img__height=300)
+    call_command("regenerate_image_variants", workers=0, stdout=io.StringIO())
+    images[1].variants.all().delete()
+    stdout = io.StringIO()
+
+    call_command("regenerate_image_variants", workers=workers, stdout=stdout)
+
+    assert "Generated the variants of 1 images, 0 failed" in stdout.getvalue()
+    assert ImageVariant.objects.count() == 3 * 4
+
+
+@pytest.fixture
+def two_images(media_root):
+    return [
+        ImageFactory(img__color=color, img__width=400, img__height=300)
+        for color in ["red", "green"]
+    ]
+
+
+@pytest.mark.django_db
+def test_regenerate_command_skips_undecodable_images(two_images, monkeypatch):
+    broken = two_images[1].img.read()
+
+    def render(content, *options):
+        if content == broken:
+            raise PILImage.DecompressionBombError("Too many pixels")
+        return render_variants(content, *options)
+
+    monkeypatch.setattr("apps.products.variants.render_variants", render)
+    stdout = io.StringIO()
+
+    call_command("regenerate_image_variants", workers=0, stdout=stdout)
+
+    assert "Generated the variants of 1 images, 1 failed" in stdout.getvalue()
+    assert not two_images[1].variants.exists()
+
+
+@pytest.mark.django_db
+def test_regenerate_command_skips_failing_images(two_images, monkeypatch):
+    def save(image_id, source, rendered):
+        if image_id == two_images[1].pk:
+            raise ValueError("Cannot save")
+        save_variants(image_id, source, rendered)
+
+    monkeypatch.setattr(
+        "apps.products.management.commands.regenerate_image_variants."
+        "save_variants",
+        save,
+    )
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    call_command(
+        "regenerate_image_variants", workers=2, stdout=stdout, stderr=stderr
+    )
+
+    assert "Generated the variants of 1 images, 1 failed" in stdout.getvalue()
+    assert "Cannot save" in stderr.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pool_variants_are_saved_by_the_saver_thread(
+    media_root, settings, monkeypatch
+):
+    settings.IMAGE_VARIANT_WORKERS = 1
+    executor = ProcessPoolExecutor(max_workers=1)
+    monkeypatch.setattr(variants, "_executor", executor)
+
+    try:
+        # Scheduled once the image is committed
+        image = ImageFactory(img__width=400, img__height=300)
+        deadline = time.monotonic() + 30
+        while not image.variants.exists() and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        executor.shutdown()
+
+    assert image.variants.count() == 4
@@ -1,11 +1,21 @@
+import json
 from abc import ABC, abstractmethod
 
 import pytest
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
 from apps.products.models import Category, Image, Product, Size
-from apps.products.tests.factories import ProductFactory
+from apps.products.object_cache import product_cache
+from apps.products.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductSizeFactory,
+)
+from apps.products.views import ProductSizesViewSet
 
 
 class ProductRelatedViewSetTestBase(ABC):
@@ -29,6 +39,14 @@ class ProductRelatedViewSetTestBase(ABC):
         self.url_detail_not_found_product = self.build_url(
             product_id=self.NON_EXISTENT_ID, item_id=self.target_item.id
         )
+        self.url_bulk = reverse(
+            f"products:{self.get_url_name()}-bulk",
+            kwargs={"product_id": self.product.id},
+        )
+        self.url_bulk_not_found = reverse(
+            f"products:{self.get_url_name()}-bulk",
+            kwargs={"product_id": self.NON_EXISTENT_ID},
+        )
 
     @abstractmethod
     def get_target_item(self, product):
@@ -69,7 +87,7 @@ class TestProductImagesViewSet(ProductRelatedViewSetTestBase):
         """
         response = api_client.get(self.url_list)
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == self.product.images.count()
+        assert len(response.data["results"]) == self.product.images.count()
 
     def test_list_returns_404_when_product_not_found(self, api_client):
         """
@@ -92,7 +110,7 @@ class TestProductImagesViewSet(ProductRelatedViewSetTestBase):
         response = api_client.get(self.build_url(product_id=product.id))
 
         assert response.status_code == status.HTTP_200_OK
-        assert response.data == []
+        assert response.data["results"] == []
 
     def test_create(
         self,
@@ -117,6 +135,40 @@ class TestProductImagesViewSet(ProductRelatedViewSetTestBase):
             == initial_images_association_count + 1
         )
 
+    def test_bulk_link_replaces_preview(self, api_client, image_no_save_file):
+        """
+        Test that a preview image in the bulk payload replaces the current
+        preview of the product.
+        """
+        self.product.productimage_set.filter(image=self.target_item).update(
+            is_preview=True
+        )
+        image = image_no_save_file.create()
+        data = [
+            {"image": image.id, "is_preview": True},
+            {"image": self.target_item.id},
+        ]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(
+            self.product.productimage_set.filter(is_preview=True).values_list(
+                "image_id", flat=True
+            )
+        ) == [image.id]
+
+    def test_bulk_link_rejects_two_previews(
+        self, api_client, image_no_save_file
+    ):
+        images = image_no_save_file.create_batch(2)
+        data = [{"image": image.id, "is_preview": True} for image in images]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert self.product.images.count() == 4
+
     def test_create_returns_404_when_product_not_found(
         self,
         api_client,
@@ -243,7 +295,234 @@ class TestProductViewSet:
         url = reverse("products:product-list")
         response = api_client.get(url)
         assert response.status_code == status.HTTP_200_OK
-        assert Product.objects.all().count() == len(response.data)
+        assert Product.objects.all().count() == len(response.data["results"])
+
+    @pytest.mark.parametrize("filtered", [False, True])
+    def test_list_products_db_rendered_matches_serializer(
+        self,
+        api_client,
+        products_with_associations,
+        image_no_save_file,
+        filtered,
+    ):
+        """
+        Test that the db-rendered list mode returns the same page as the
+        serializer-based list, including nested categories with images and
+        child categories, in a single query.
+        """
+        parent = products_with_associations[0].categories.first()
+        parent.image = image_no_save_file.create()
+        parent.save()
+        CategoryFactory(parent_category=parent)
+        url = reverse("products:product-list")
+        params = {"page_size": 4}
+        if filtered:
+            params["categories"] = parent.id
+
+        expected = api_client.get(url, params)
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url, {"render": "db", **params})
+            content = b"".join(response.streaming_content)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(context) == 1
+        assert json.loads(content)["results"] == expected.json()["results"]
+
+    def test_search_is_ordered_by_relevance_across_pages(self, api_client):
+        best = ProductFactory(name="Tulips", description="Tulips and tulips")
+        good = ProductFactory(name="Tulips", description="Fresh")
+        weak = ProductFactory(name="Bouquet", description="With tulips")
+        ProductFactory(name="Roses", description="White roses")
+        url = reverse("products:product-list")
+
+        ids = []
+        response = api_client.get(url, {"search": "tulips", "page_size": 2})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            ids += [product["id"] for product in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = api_client.get(response.data["next"])
+
+        assert ids == [best.id, good.id, weak.id]
+        assert "search_vector" not in response.data["results"][0]
+
+    def test_relevance_ordering_without_search(self, api_client):
+        products = ProductFactory.create_batch(2)
+        url = reverse("products:product-list")
+
+        response = api_client.get(url, {"ordering": "relevance"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [p["id"] for p in response.data["results"]] == [
+            product.id for product in products
+        ]
+
+    @pytest.mark.parametrize("ordering", ["price", "-price"])
+    def test_price_ordering_across_pages(self, api_client, ordering):
+        prices = [3000, 1000, 2000, 1000]
+        products = [ProductFactory() for _ in prices]
+        for product, price in zip(products, prices):
+            ProductSizeFactory(product=product, price=price)
+        unpriced = [product.id for product in ProductFactory.create_batch(3)]
+        url = reverse("products:product-list")
+
+        pages = []
+        response = api_client.get(url, {"ordering": ordering, "page_size": 2})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            pages.append(
+                [product["id"] for product in response.data["results"]]
+            )
+            if not response.data["next"]:
+                break
+            response = api_client.get(response.data["next"])
+        previous_pages = []
+        while response.data["previous"]:
+            response = api_client.get(response.data["previous"])
+            previous_pages.insert(
+                0, [product["id"] for product in response.data["results"]]
+            )
+
+        descending = ordering.startswith("-")
+        expected = sorted(
+            zip(prices, [product.id for product in products]),
+            reverse=descending,
+        )
+        # Products without a price come last in both directions
+        assert sum(pages, []) == [pk for _, pk in expected] + sorted(
+            unpriced, reverse=descending
+        )
+        assert previous_pages == pages[:-1]
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_facets_count_the_filtered_products(self, api_client, settings):
+        settings.PRODUCT_PRICE_BUCKETS = [1000, 3000]
+        parent = CategoryFactory()
+        child = CategoryFactory(parent_category=parent)
+        cheap = ProductFactory(is_active=True, categories=[child])
+        dear = ProductFactory(is_active=True, categories=[parent])
+        ProductFactory(is_active=False, categories=[child])
+        small = ProductSizeFactory(product=cheap, price=500).size
+        ProductSizeFactory(product=cheap, size__name="L", price=2000)
+        ProductSizeFactory(product=dear, size=small, price=5000)
+        url = reverse("products:product-facets")
+
+        response = api_client.get(url, {"is_active": "true"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total"] == 2
+        assert response.data["categories"] == [
+            {"id": parent.id, "count": 2},
+            {"id": child.id, "count": 1},
+        ]
+        assert {"id": small.id, "count": 2} in response.data["sizes"]
+        assert response.data["prices"] == [
+            {"min": None, "max": 1000, "count": 1},
+            {"min": 1000, "max": 3000, "count": 0},
+            {"min": 3000, "max": None, "count": 1},
+        ]
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_facets_are_cached_until_the_catalog_changes(self, api_client):
+        product = ProductFactory(name="Tulips")
+        url = reverse("products:product-facets")
+        api_client.get(url, {"search": "tulips", "is_archived": "false"})
+
+        with CaptureQueriesContext(connection) as context:
+            cached = api_client.get(
+                url, {"is_archived": "false", "search": " tulips "}
+            )
+        assert len(context) == 0
+        assert cached.data["total"] == 1
+
+        ProductSizeFactory(product=product, price=500)
+        response = api_client.get(
+            url, {"search": "tulips", "is_archived": "false"}
+        )
+        assert response.data["prices"][0]["count"] == 1
+
+    def test_facets_reject_invalid_filters(self, api_client):
+        url = reverse("products:product-facets")
+
+        response = api_client.get(url, {"price_min": "cheap"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "price_min" in response.data
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_list_is_assembled_from_cached_products(
+        self, api_client, products_with_associations
+    ):
+        url = reverse("products:product-list")
+        expected = api_client.get(url, {"page_size": 4})
+
+        with CaptureQueriesContext(connection) as context:
+            cached = api_client.get(url, {"page_size": 4})
+
+        # Only the keys of the page, unless cachalot already has them
+        assert len(context) <= 1
+        assert cached.json() == expected.json()
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_size_edit_invalidates_only_its_product(
+        self,
+        api_client,
+        products_with_associations,
+        django_capture_on_commit_callbacks,
+    ):
+        edited, other = products_with_associations[:2]
+        api_client.get(reverse("products:product-list"))
+        size = edited.productsize_set.first()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            size.price = 12345
+            size.save()
+
+        assert cache.get(product_cache.make_key(edited.id)) is None
+        assert cache.get(product_cache.make_key(other.id)) is not None
+        response = api_client.get(
+            reverse("products:product-detail", kwargs={"pk": edited.id})
+        )
+        assert {"size": size.size_id, "price": 12345} in [
+            {"size": item["size"]["id"], "price": item["price"]}
+            for item in response.data["sizes"]
+        ]
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_stale_refill_is_not_served(
+        self, product, django_capture_on_commit_callbacks
+    ):
+        cached, versions = product_cache.get_many([product.pk])
+
+        # Commits while the reader serializes the row it loaded before
+        with django_capture_on_commit_callbacks(execute=True):
+            product_cache.invalidate([product.pk])
+        product_cache.set_many({product.pk: {"name": "stale"}}, versions)
+
+        assert cached == {}
+        assert product_cache.get_many([product.pk])[0] == {}
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_retrieve_is_invalidated_by_category_rename(
+        self, api_client, product, django_capture_on_commit_callbacks
+    ):
+        category = CategoryFactory()
+        product.categories.add(category)
+        url = reverse("products:product-detail", kwargs={"pk": product.id})
+        api_client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            category.name = "Peonies"
+            category.save()
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url)
+        assert len(context) > 0
+        assert response.data["categories"][0]["name"] == "Peonies"
+        with CaptureQueriesContext(connection) as context:
+            api_client.get(url)
+        assert len(context) == 0
 
     def test_retrieve_product(self, api_client, product):
         url = reverse("products:product-detail", kwargs={"pk": product.id})
@@ -268,6 +547,17 @@ class TestProductViewSet:
         assert response.status_code == status.HTTP_200_OK
         assert product.name == partial_update_data["name"]
 
+    def test_partial_update_without_changes_writes_nothing(
+        self, api_client, product
+    ):
+        url = reverse("products:product-detail", kwargs={"pk": product.id})
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.patch(url, {"name": product.name})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not [q for q in context if q["sql"].startswith("UPDATE")]
+
     def test_destroy_product(self, api_client, product):
         url = reverse("products:product-detail", kwargs={"pk": product.id})
         response = api_client.delete(url)
@@ -322,6 +612,117 @@ class TestProductSizesViewSet(ProductRelatedViewSetTestBase):
 
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
+    def test_create_rejects_duplicate(self, api_client):
+        data = {"size": self.target_item.id, "price": 100}
+
+        response = api_client.post(self.url_list, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_bulk_link(self, api_client, size):
+        """
+        Test that bulk linking creates new links and overwrites existing
+        ones, and that repeating the request changes nothing.
+        """
+        data = [
+            {"size": self.target_item.id, "price": 111, "is_active": False},
+            {"size": size.id, "price": 222},
+        ]
+
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as context:
+                response = api_client.post(self.url_bulk, data, format="json")
+
+            assert response.status_code == status.HTTP_200_OK
+            assert self.product.sizes.count() == 5
+            assert sorted(
+                self.product.productsize_set.filter(
+                    size__in=[self.target_item, size]
+                ).values_list("price", "is_active")
+            ) == [(111, False), (222, True)]
+        assert len(response.data) == 2
+        assert sum("INSERT" in q["sql"] for q in context.captured_queries) == 1
+
+    def test_bulk_link_rejects_invalid_payload(self, api_client, size):
+        data = [
+            {"size": size.id, "price": 100},
+            {"size": self.NON_EXISTENT_ID, "price": 100},
+        ]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+        duplicate = api_client.post(
+            self.url_bulk, [data[0], data[0]], format="json"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert "size" in response.data[1]
+        assert duplicate.status_code == status.HTTP_400_BAD_REQUEST
+        assert not self.product.sizes.filter(pk=size.id).exists()
+
+    def test_bulk_link_rejects_ids_deleted_after_the_check(
+        self, api_client, size, monkeypatch
+    ):
+        check_linked_ids_exist = ProductSizesViewSet.check_linked_ids_exist
+
+        def check_then_delete(self, link_field, ids):
+            check_linked_ids_exist(self, link_field, ids)
+            if Size.objects.filter(pk=size.pk).exists():
+                # Deleted by another request once the ids are checked
+                size.delete()
+                with connection.cursor() as cursor:
+                    # Checked on commit otherwise, after the test
+                    cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        monkeypatch.setattr(
+            ProductSizesViewSet, "check_linked_ids_exist", check_then_delete
+        )
+        data = [
+            {"size": self.target_item.id, "price": 100},
+            {"size": size.id, "price": 100},
+        ]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert "size" in response.data[1]
+
+    def test_bulk_link_reports_other_conflicts(
+        self, api_client, size, monkeypatch
+    ):
+        def conflict(self, product_id, links):
+            raise IntegrityError
+
+        monkeypatch.setattr(ProductSizesViewSet, "perform_bulk_link", conflict)
+        data = [{"size": size.id, "price": 100}]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "non_field_errors" in response.data
+
+    def test_bulk_unlink(self, api_client):
+        sizes = list(self.product.sizes.all()[:2])
+        ids = [size.id for size in sizes] + [self.NON_EXISTENT_ID]
+
+        response = api_client.delete(
+            f"{self.url_bulk}?ids={ids[0]}&ids={ids[1]}&ids={ids[2]}"
+        )
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.product.sizes.count() == 2
+        assert Size.objects.filter(pk__in=ids[:2]).count() == 2
+
+    def test_bulk_returns_404_when_product_not_found(self, api_client, size):
+        data = [{"size": size.id, "price": 100}]
+
+        response = api_client.post(
+            self.url_bulk_not_found, data, format="json"
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
     def test_list(self, api_client):
         """
         Test that the API endpoint for listing product sizes returns the
@@ -329,7 +730,7 @@ class TestProductSizesViewSet(ProductRelatedViewSetTestBase):
         """
         response = api_client.get(self.url_list)
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == self.product.sizes.count()
+        assert len(response.data["results"]) == self.product.sizes.count()
 
     def test_list_returns_404_when_product_not_found(self, api_client):
         """
@@ -352,7 +753,7 @@ class TestProductSizesViewSet(ProductRelatedViewSetTestBase):
         response = api_client.get(self.build_url(product_id=product.id))
 
         assert response.status_code == status.HTTP_200_OK
-        assert response.data == []
+        assert response.data["results"] == []
 
     def test_retrieve(self, api_client):
         """
@@ -472,6 +873,50 @@ class TestProductCategoriesViewSet(ProductRelatedViewSetTestBase):
             == initial_categories_association_count + 1
         )
 
+    def test_bulk_link_adds_parent_categories(self, api_client):
+        parent = CategoryFactory()
+        child = CategoryFactory(parent_category=parent)
+        data = [{"category": child.id}, {"category": self.target_item.id}]
+
+        response = api_client.post(self.url_bulk, data, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 2
+        assert {child, parent} <= set(self.product.categories.all())
+
+    def test_bulk_unlink(self, api_client):
+        response = api_client.delete(
+            f"{self.url_bulk}?ids={self.target_item.id}"
+        )
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert not self.product.categories.filter(
+            pk=self.target_item.id
+        ).exists()
+
+    def test_bulk_unlink_requires_ids(self, api_client):
+        response = api_client.delete(f"{self.url_bulk}?ids=abc")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert self.product.categories.count() == 4
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_bulk_unlink_invalidates_the_product(
+        self, api_client, django_capture_on_commit_callbacks
+    ):
+        url = reverse(
+            "products:product-detail", kwargs={"pk": self.product.id}
+        )
+        api_client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.delete(f"{self.url_bulk}?ids={self.target_item.id}")
+
+        categories = api_client.get(url).json()["categories"]
+        assert self.target_item.id not in [
+            category["id"] for category in categories
+        ]
+
     def test_create_returns_404_when_product_not_found(
         self, api_client, category
     ):
@@ -496,7 +941,7 @@ class TestProductCategoriesViewSet(ProductRelatedViewSetTestBase):
         """
         response = api_client.get(self.url_list)
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == self.product.categories.count()
+        assert len(response.data["results"]) == self.product.categories.count()
 
     def test_list_returns_404_when_product_not_found(self, api_client):
         """
@@ -519,7 +964,7 @@ class TestProductCategoriesViewSet(ProductRelatedViewSetTestBase):
         response = api_client.get(self.build_url(product_id=product.id))
 
         assert response.status_code == status.HTTP_200_OK
-        assert response.data == []
+        assert response.data["results"] == []
 
     def test_destroy(self, api_client):
         """
@@ -556,3 +1001,125 @@ class TestProductCategoriesViewSet(ProductRelatedViewSetTestBase):
 
         response = api_client.delete(getattr(self, url))
         assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestCategoryViewSet:
+    @pytest.mark.parametrize("nest_under", ["itself", "descendant"])
+    def test_partial_update_rejects_cycle(self, api_client, nest_under):
+        """
+        Test that a category cannot be moved under itself or one of its
+        subcategories.
+        """
+        category = CategoryFactory()
+        child = CategoryFactory(parent_category=category)
+        grandchild = CategoryFactory(parent_category=child)
+        parent = category if nest_under == "itself" else grandchild
+        url = reverse("products:category-detail", kwargs={"pk": category.id})
+
+        response = api_client.patch(url, {"parent_category": parent.id})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        category.refresh_from_db()
+        assert category.parent_category is None
+
+    def test_partial_update_moves_subtree(self, api_client):
+        category = CategoryFactory()
+        child = CategoryFactory(parent_category=category)
+        new_parent = CategoryFactory()
+        url = reverse("products:category-detail", kwargs={"pk": category.id})
+
+        response = api_client.patch(url, {"parent_category": new_parent.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(child.get_ancestors()) == [category, new_parent]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_cache")
+class TestCategoryTree:
+    url = reverse("products:category-tree")
+
+    @pytest.fixture(autouse=True)
+    def setup_tree(self):
+        self.root = CategoryFactory(name="b-root")
+        self.other_root = CategoryFactory(name="a-root")
+        self.child = CategoryFactory(parent_category=self.root)
+        self.hidden = CategoryFactory(
+            parent_category=self.root, is_active=False
+        )
+        self.grandchild = CategoryFactory(parent_category=self.hidden)
+
+    @staticmethod
+    def node_ids(nodes):
+        return [
+            (node["id"], TestCategoryTree.node_ids(node["children"]))
+            for node in nodes
+        ]
+
+    def test_tree(self, api_client):
+        """
+        Test that the tree is nested, ordered by name and built with one
+        query, then served from the cache without queries.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(context) == 1
+        assert self.node_ids(response.json()) == [
+            (self.other_root.id, []),
+            (
+                self.root.id,
+                [
+                    (self.child.id, []),
+                    (self.hidden.id, [(self.grandchild.id, [])]),
+                ],
+            ),
+        ]
+        assert response.json()[1]["children"][0] == {
+            "id": self.child.id,
+            "name": self.child.name,
+            "slug": self.child.slug,
+            "description": self.child.description,
+            "is_active": True,
+            "children": [],
+        }
+
+        with CaptureQueriesContext(connection) as context:
+            cached = api_client.get(self.url)
+        assert len(context) == 0
+        assert cached.content == response.content
+
+    def test_tree_active_only(self, api_client):
+        response = api_client.get(self.url, {"is_active": "true"})
+
+        assert self.node_ids(response.json()) == [
+            (self.other_root.id, []),
+            (self.root.id, [(self.child.id, [])]),
+        ]
+
+    def test_tree_not_modified(self, api_client):
+        etag = api_client.get(self.url)["ETag"]
+
+        response = api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        assert not response.content
+
+    def test_tree_invalidated_by_category_write(
+        self, api_client, django_capture_on_commit_callbacks
+    ):
+        etag = api_client.get(self.url)["ETag"]
+        detail_url = reverse(
+            "products:category-detail", kwargs={"pk": self.other_root.id}
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.patch(detail_url, {"name": "c-root"})
+        response = api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert response.json()[1]["name"] == "c-root"
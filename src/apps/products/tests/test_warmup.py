@@ -0,0 +1,132 @@
+import importlib
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished, request_started
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.products import warmup
+from apps.products.object_cache import product_cache
+from apps.products.warmup import (
+    get_warmup_base_url,
+    make_wsgi_request,
+    request_catalog,
+    warm_up,
+)
+
+
+@pytest.fixture
+def keep_connections():
+    """
+    Keep the connection of the test transaction open through the requests
+    sent to the WSGI application, as the test client does.
+    """
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    yield
+    request_started.connect(close_old_connections)
+    request_finished.connect(close_old_connections)
+
+
+@pytest.fixture
+def warmup_base_url(settings):
+    settings.WARMUP_BASE_URL = "https://shop.example.com"
+    settings.ALLOWED_HOSTS = ["shop.example.com", "testserver"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_cache", "keep_connections", "warmup_base_url")
+class TestWarmUp:
+    def test_every_phase_runs(self, caplog, products_with_associations):
+        timings = warm_up()
+
+        assert list(timings) == ["urls", "schema", "connections", "catalog"]
+        assert connection.connection is not None
+        assert not caplog.records
+
+    def test_catalog_is_cached(self, api_client, products_with_associations):
+        statuses = request_catalog(get_wsgi_application())
+
+        assert set(statuses.values()) == {200}
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("api:category-tree"))
+        assert response.status_code == 200
+        assert len(queries) == 0
+
+    def test_products_are_cached_for_the_clients(
+        self, rf, products_with_associations
+    ):
+        request_catalog(get_wsgi_application())
+
+        request = rf.get("/", secure=True, HTTP_HOST="shop.example.com")
+        pks = [product.pk for product in products_with_associations]
+        cached, _ = product_cache.get_many(pks, request)
+        assert set(cached) == set(pks)
+
+    def test_failed_phase_does_not_stop_the_others(self, monkeypatch):
+        def fail():
+            raise RuntimeError
+
+        monkeypatch.setattr(warmup, "generate_schema", fail)
+        monkeypatch.setattr(warmup, "request_catalog", lambda app: None)
+
+        assert set(warm_up()) == {"urls", "schema", "connections", "catalog"}
+
+
+def test_requests_use_the_base_url():
+    environs = []
+
+    def application(environ, start_response):
+        environs.append(environ)
+        start_response("200 OK", [])
+        return []
+
+    request = make_wsgi_request(
+        application, "/api/?page=2", "https://shop.example.com"
+    )
+
+    assert request() == 200
+    (environ,) = environs
+    assert environ["wsgi.url_scheme"] == "https"
+    assert environ["HTTP_HOST"] == "shop.example.com"
+    assert environ["SERVER_PORT"] == "443"
+    assert environ["QUERY_STRING"] == "page=2"
+
+
+@pytest.mark.parametrize(
+    "base_url, debug, expected",
+    [
+        ("", True, "http://localhost"),
+        ("https://shop.example.com", False, "https://shop.example.com"),
+        ("http://localhost:8000", True, "http://localhost:8000"),
+    ],
+)
+def test_warmup_base_url(settings, base_url, debug, expected):
+    settings.WARMUP_BASE_URL = base_url
+    settings.DEBUG = debug
+
+    assert get_warmup_base_url() == expected
+
+
+@pytest.mark.parametrize("base_url", ["", "shop.example.com"])
+def test_missing_base_url_stops_the_warmup(settings, base_url):
+    settings.WARMUP_BASE_URL = base_url
+
+    with pytest.raises(ImproperlyConfigured):
+        warm_up(application=lambda environ, start_response: [])
+
+
+def test_gunicorn_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    config = importlib.import_module("config.gunicorn")
+
+    assert importlib.reload(config).workers == 3
+    assert config.preload_app
+
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    cpu_count = config.get_cpu_count()
+    assert cpu_count >= 1
+    assert importlib.reload(config).workers == 2 * cpu_count + 1
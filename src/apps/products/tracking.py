@@ -0,0 +1,159 @@
+"""
+Tracking of the fields changed on model instances since they were loaded.
+
+`DirtyFieldsMixin` keeps the values an instance was loaded with, so a save
+only writes the columns that changed, or nothing at all, and signal
+handlers can compare the old and new values without querying the row
+again.
+"""
+
+
+class DirtyFieldsMixin:
+    """
+    A model mixin that snapshots the loaded field values and saves only the
+    changed fields.
+
+        An instance loaded from the database keeps the row it was built
+    from, and the snapshot is made of it the first time it is needed, so
+    the reads that never save pay nothing for it. It is taken again after
+    every save and refreshed by `refresh_from_db`. The values are kept as
+    they are, not copied: a value changed in place, like the dict of a JSON
+    field, is not a change.
+        A plain save of a tracked instance becomes
+    `save(update_fields=<changed fields>)`, and is skipped entirely,
+    signals included, when nothing changed.
+    Instances that were never loaded or saved, and saves given explicit
+    `update_fields` or `force_insert`, behave as usual.
+        Handlers of `pre_save` and `post_save` still see the changes of the
+    save in progress, as the snapshot is only taken once it is done.
+    Values are compared in their database form, so a new file assigned to
+    a file field counts as a change until it is committed.
+    """
+
+    def get_tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        return [
+            field
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+        ]
+
+    def get_named_fields(self, names):
+        if names is None:
+            return None
+        return [
+            field
+            for field in self.get_tracked_fields()
+            if field.name in names or field.attname in names
+        ]
+
+    def snapshot_fields(self, fields=None):
+        fields = self.get_tracked_fields() if fields is None else fields
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            loaded = self.__dict__["_loaded_values"] = {}
+        for field in fields:
+            loaded[field.attname] = self.get_field_state(field)
+
+    def get_loaded_values(self):
+        """
+        Return the snapshot of the `{attname: value}` loaded values, made
+        from the loaded row on first use, or None when the instance is not
+        tracked.
+        """
+        loaded = self.__dict__.get("_loaded_values")
+        row = self.__dict__.pop("_loaded_row", None)
+        if loaded is None and row is not None:
+            fields = {
+                field.attname: field
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+            }
+            loaded = self.__dict__["_loaded_values"] = {
+                attname: fields[attname].get_prep_value(value)
+                for attname, value in zip(*row)
+                if attname in fields
+            }
+        return loaded
+
+    def get_field_state(self, field):
+        value = field.value_from_object(self)
+        if getattr(value, "_committed", True) is False:
+            # An uploaded file that is not stored yet, never equal to the
+            # loaded value even when it has the same name
+            return object()
+        return field.get_prep_value(value)
+
+    @property
+    def is_tracked(self):
+        return (
+            "_loaded_values" in self.__dict__ or "_loaded_row" in self.__dict__
+        )
+
+    def get_loaded_value(self, name):
+        """
+        Return the value the field `name` had when the instance was loaded
+        or last saved, in its database form.
+
+        Raises:
+            KeyError: If the instance is not tracked or the field was not
+             loaded.
+        """
+        attname = self._meta.get_field(name).attname
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            raise KeyError(attname)
+        return loaded[attname]
+
+    def get_dirty_fields(self):
+        """
+        Return the names of the fields changed since the instance was
+        loaded or last saved, in the order of the model fields. Every
+        loaded field is dirty on an instance that is not tracked.
+        """
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            return [field.name for field in self.get_tracked_fields()]
+        return [
+            field.name
+            for field in self.get_tracked_fields()
+            if field.attname not in loaded
+            or loaded[field.attname] != self.get_field_state(field)
+        ]
+
+    def has_changed(self, name):
+        return name in self.get_dirty_fields()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.__dict__["_loaded_row"] = (field_names, values)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot_fields(self.get_named_fields(fields))
+
+    def save(self, *args, **kwargs):
+        if (
+            self.is_tracked
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not args
+        ):
+            changed = self.get_dirty_fields()
+            if not changed:
+                return
+            changed += [
+                field.name
+                for field in self.get_tracked_fields()
+                if getattr(field, "auto_now", False)
+                and field.name not in changed
+            ]
+            kwargs["update_fields"] = changed
+        super().save(*args, **kwargs)
+
+        self.snapshot_fields(
+            self.get_named_fields(kwargs.get("update_fields"))
+        )
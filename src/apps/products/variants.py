@@ -0,0 +1,200 @@
+"""
+Background generation of the resized variants of uploaded images.
+
+After an `Image` is saved, its missing variants are rendered by a pool of
+worker processes, so neither the upload request nor the other requests
+served by the process wait for Pillow. The rendered variants are handed
+to a thread of the process that writes them back one image at a time, so
+the pool's result thread never waits for the database.
+
+With `IMAGE_VARIANT_WORKERS = 0` the variants are rendered inline instead,
+which is what the tests and the management command with `--workers 0` use.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Count, F, Q
+
+from apps.products.imaging import render_variants
+from apps.products.models import Image, ImageVariant
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_saver = None
+_saver_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """
+    Return the process pool shared by the uploads of this process.
+
+        Workers are spawned rather than forked, so they do not inherit the
+    database connections and threads of the web server.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max_workers or settings.IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+class VariantSaver(threading.Thread):
+    """
+    A daemon thread saving the variants rendered by the pool, in the order
+    they are put in its queue as `(image id, source, future)` triples.
+    """
+
+    def __init__(self):
+        super().__init__(name="variant-saver", daemon=True)
+        self.queue = queue.SimpleQueue()
+
+    def run(self):
+        while True:
+            image_id, source, future = self.queue.get()
+            try:
+                save_variants(image_id, source, future.result())
+            except Exception:
+                logger.exception(
+                    "Cannot generate the variants of %s", image_id
+                )
+            finally:
+                if self.queue.empty():
+                    connections.close_all()
+
+
+def get_saver():
+    global _saver
+    with _saver_lock:
+        if _saver is None or not _saver.is_alive():
+            _saver = VariantSaver()
+            _saver.start()
+    return _saver
+
+
+def needs_variants(image):
+    """
+    Return whether the variants of `image` are missing or were made from
+    another file than its current one.
+    """
+    if not image.img:
+        return False
+    current = set(
+        image.variants.filter(source=image.img.name).values_list(
+            "format", flat=True
+        )
+    )
+    return current != set(settings.IMAGE_VARIANT_FORMATS)
+
+
+def images_needing_variants():
+    """
+    Return the images whose variants are missing or stale, the queryset
+    form of `needs_variants`.
+    """
+    return (
+        Image.objects.exclude(img="")
+        .annotate(
+            current_formats=Count(
+                "variants__format",
+                filter=Q(variants__source=F("img")),
+                distinct=True,
+            )
+        )
+        .filter(current_formats__lt=len(settings.IMAGE_VARIANT_FORMATS))
+    )
+
+
+def render_options():
+    return (
+        settings.IMAGE_VARIANT_WIDTHS,
+        settings.IMAGE_VARIANT_FORMATS,
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+
+
+def read_original(image):
+    """
+    Return the content of the original file, or None when it cannot be
+    read, so a broken upload does not stop the others.
+    """
+    try:
+        with image.img.open("rb") as original:
+            return original.read()
+    except OSError:
+        logger.warning("Cannot read the original of image %s", image.pk)
+        return None
+
+
+def save_variants(image_id, source, rendered):
+    """
+    Replace the variants of the image with the `rendered` ones, unless the
+    image was deleted or got another file while they were being made.
+    """
+    with transaction.atomic():
+        image = Image.objects.select_for_update().filter(pk=image_id).first()
+        if image is None or image.img.name != source:
+            return
+        for variant in image.variants.all():
+            variant.delete()
+        for width, file_format, content in rendered:
+            variant = ImageVariant(
+                image=image, source=source, width=width, format=file_format
+            )
+            name = os.path.splitext(os.path.basename(source))[0]
+            variant.file.save(
+                f"{name}-{width}.{file_format}",
+                ContentFile(content),
+                save=False,
+            )
+            variant.save()
+
+
+def generate_variants(image):
+    """
+    Render and save the variants of `image` in the current process.
+    Returns whether variants were saved.
+    """
+    content = read_original(image)
+    if content is None:
+        return False
+    try:
+        rendered = render_variants(content, *render_options())
+    except Exception:
+        logger.warning(
+            "Cannot decode the original of image %s", image.pk, exc_info=True
+        )
+        return False
+    save_variants(image.pk, image.img.name, rendered)
+    return True
+
+
+def schedule_variants(image_id):
+    """
+    Generate the missing variants of an image in the background. Meant to
+    run once the transaction that saved the image has committed.
+    """
+    image = Image.objects.filter(pk=image_id).first()
+    if image is None or not needs_variants(image):
+        return
+    if not settings.IMAGE_VARIANT_WORKERS:
+        generate_variants(image)
+        return
+
+    content = read_original(image)
+    if content is None:
+        return
+    source = image.img.name
+    future = get_executor().submit(render_variants, content, *render_options())
+    future.add_done_callback(
+        lambda future: get_saver().queue.put((image_id, source, future))
+    )
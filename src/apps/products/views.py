@@ -1,30 +1,63 @@
+import io
+
+from cachalot.api import invalidate
 from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from django_filters.utils import translate_validation
 from drf_spectacular.utils import extend_schema_view
 from rest_framework import mixins as drf_mixins
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
 from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from apps.products.category_tree import get_category_tree
+from apps.products.db_json import product_json
+from apps.products.facets import get_facets
 from apps.products.filters import ProductFilter
+from apps.products.importers import CatalogImporter, detect_format
 from apps.products.mixins import (
+    AsyncReadMixin,
+    BulkLinkMixin,
     CreateMixin,
+    DBRenderedListMixin,
     ListProductMixin,
+    ObjectCacheMixin,
     PerformCreateProductMixin,
     ProductRelationsMixin,
 )
 from apps.products.models import (
     Category,
+    CategoryClosure,
     Image,
     Product,
     ProductImage,
     ProductSize,
     Size,
 )
+from apps.products.object_cache import product_cache
+from apps.products.pagination import (
+    CategoryPagination,
+    KeysetPagination,
+    ProductPagination,
+)
 from apps.products.schema import (
+    CategorySchema,
     ProductCategoriesSchema,
     ProductImagesSchema,
+    ProductSchema,
     ProductSizesSchema,
 )
 from apps.products.serializers import (
+    BulkLinkProductCategorySerializer,
+    BulkLinkProductImageSerializer,
+    BulkLinkProductSizeSerializer,
+    CatalogImportResultSerializer,
+    CatalogImportSerializer,
     CategorySerializer,
     ImageSerializer,
     LinkProductCategorySerializer,
@@ -38,20 +71,44 @@ from apps.products.serializers import (
 )
 
 
-class CategoryViewSet(ModelViewSet):
+@extend_schema_view(tree=CategorySchema().tree())
+class CategoryViewSet(AsyncReadMixin, ModelViewSet):
     queryset = (
         Category.objects.select_related("image")
         .prefetch_related(
             Prefetch(
                 "child_categories",
                 queryset=Category.objects.only("id", "parent_category_id"),
-            )
+            ),
+            "image__variants",
         )
         .all()
     )
     serializer_class = CategorySerializer
+    pagination_class = CategoryPagination
     filterset_fields = ("is_active", "parent_category", "slug")
 
+    @action(detail=False, pagination_class=None)
+    def tree(self, request):
+        """
+        Return the whole category tree, rendered once per tree version and
+        revalidated by the client with `If-None-Match`.
+        """
+        active_only = (
+            request.query_params.get("is_active") in BooleanField.TRUE_VALUES
+        )
+        etag, content = get_category_tree(active_only)
+        etag = quote_etag(etag)
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
 
 class SizeViewSet(ModelViewSet):
     queryset = Size.objects.all()
@@ -59,29 +116,98 @@ class SizeViewSet(ModelViewSet):
 
 
 class ImageViewSet(ModelViewSet):
-    queryset = Image.objects.all()
+    queryset = Image.objects.prefetch_related("variants")
     serializer_class = ImageSerializer
     parser_classes = (MultiPartParser,)
     http_method_names = ["get", "post", "put", "delete"]
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.prefetch_related(
-        Prefetch(
-            "categories",
-            queryset=Category.objects.prefetch_related("child_categories"),
-        ),
-        Prefetch(
-            "productimage_set",
-            queryset=ProductImage.objects.select_related("image"),
-        ),
-        Prefetch(
-            "productsize_set",
-            queryset=ProductSize.objects.select_related("size"),
-        ),
-    ).all()
+@extend_schema_view(
+    list=ProductSchema().list(),
+    facets=ProductSchema().facets(),
+    import_catalog=ProductSchema().import_catalog(),
+)
+class ProductViewSet(
+    DBRenderedListMixin, ObjectCacheMixin, AsyncReadMixin, ModelViewSet
+):
+    queryset = (
+        Product.objects.select_related("preview_image")
+        .defer("search_vector")
+        .prefetch_related(
+            Prefetch(
+                "categories",
+                queryset=Category.objects.select_related("image")
+                .prefetch_related(
+                    Prefetch(
+                        "child_categories",
+                        queryset=Category.objects.only(
+                            "id", "parent_category_id"
+                        ).order_by("id"),
+                    ),
+                    "image__variants",
+                )
+                .order_by("id"),
+            ),
+            Prefetch(
+                "productimage_set",
+                queryset=ProductImage.objects.select_related("image")
+                .prefetch_related("image__variants")
+                .order_by("id"),
+            ),
+            "preview_image__variants",
+            Prefetch(
+                "productsize_set",
+                queryset=ProductSize.objects.select_related("size").order_by(
+                    "id"
+                ),
+            ),
+        )
+        .all()
+    )
     filterset_class = ProductFilter
     serializer_class = ProductSerializer
+    pagination_class = ProductPagination
+    db_rendered_json = staticmethod(product_json)
+    object_cache = product_cache
+
+    @action(detail=False, pagination_class=None)
+    def facets(self, request):
+        """
+        Return the facet counts of the products matching the filters of
+        the request.
+        """
+        filterset = self.filterset_class(
+            request.query_params,
+            queryset=Product.objects.all(),
+            request=request,
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return Response(get_facets(filterset))
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+        serializer_class=CatalogImportSerializer,
+        filter_backends=[],
+        pagination_class=None,
+    )
+    def import_catalog(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        uploaded = serializer.validated_data["file"]
+        file_format = detect_format(uploaded.name)
+        if file_format is None:
+            raise ValidationError(
+                {"file": ["Only .jsonl and .csv files are supported."]}
+            )
+
+        stream = io.TextIOWrapper(uploaded.file, encoding="utf-8", newline="")
+        result = CatalogImporter().run(stream, file_format)
+        return Response(CatalogImportResultSerializer(result).data)
 
 
 @extend_schema_view(
@@ -90,22 +216,46 @@ class ProductViewSet(ModelViewSet):
     retrieve=ProductImagesSchema().retrieve(),
     partial_update=ProductImagesSchema().partial_update(),
     destroy=ProductImagesSchema().destroy(),
+    bulk=[
+        ProductImagesSchema().bulk_link(),
+        ProductImagesSchema().bulk_unlink(),
+    ],
 )
 class ProductImagesViewSet(
+    BulkLinkMixin,
     ListProductMixin,
     CreateMixin,
     PerformCreateProductMixin,
     ProductRelationsMixin,
+    AsyncReadMixin,
     ModelViewSet,
 ):
     model = ProductImage
     serializer_class = ProductImageSerializer
+    pagination_class = KeysetPagination
     serializer_create_class = LinkProductImageSerializer
+    bulk_serializer_class = BulkLinkProductImageSerializer
+    link_update_fields = ["is_preview"]
     http_method_names = ["get", "post", "patch", "delete"]
     lookup_field = "image_id"
 
     def get_queryset(self):
-        return super().get_queryset().select_related("image")
+        return (
+            super()
+            .get_queryset()
+            .select_related("image")
+            .prefetch_related("image__variants")
+        )
+
+    def perform_bulk_link(self, product_id, links):
+        previews = [link["image"] for link in links if link["is_preview"]]
+        if previews:
+            ProductImage.objects.filter(
+                product_id=product_id, is_preview=True
+            ).exclude(image_id__in=previews).update(is_preview=False)
+        super().perform_bulk_link(product_id, links)
+        # The preview pointer moved by the trigger is invisible to cachalot
+        invalidate(Product)
 
 
 @extend_schema_view(
@@ -114,17 +264,26 @@ class ProductImagesViewSet(
     retrieve=ProductSizesSchema().retrieve(),
     partial_update=ProductSizesSchema().partial_update(),
     destroy=ProductSizesSchema().destroy(),
+    bulk=[
+        ProductSizesSchema().bulk_link(),
+        ProductSizesSchema().bulk_unlink(),
+    ],
 )
 class ProductSizesViewSet(
+    BulkLinkMixin,
     ListProductMixin,
     CreateMixin,
     PerformCreateProductMixin,
     ProductRelationsMixin,
+    AsyncReadMixin,
     ModelViewSet,
 ):
     model = ProductSize
     serializer_class = ProductSizeSerializer
+    pagination_class = KeysetPagination
     serializer_create_class = LinkProductSizeSerializer
+    bulk_serializer_class = BulkLinkProductSizeSerializer
+    link_update_fields = ["price", "is_active"]
     http_method_names = ["get", "post", "patch", "delete"]
     lookup_field = "size_id"
     filterset_fields = ("is_active",)
@@ -132,23 +291,36 @@ class ProductSizesViewSet(
     def get_queryset(self):
         return super().get_queryset().select_related("size")
 
+    def perform_bulk_link(self, product_id, links):
+        super().perform_bulk_link(product_id, links)
+        # The price range updated by the trigger is invisible to cachalot
+        invalidate(Product)
+
 
 @extend_schema_view(
     create=ProductCategoriesSchema().create(),
     list=ProductCategoriesSchema().list(),
     destroy=ProductCategoriesSchema().destroy(),
+    bulk=[
+        ProductCategoriesSchema().bulk_link(),
+        ProductCategoriesSchema().bulk_unlink(),
+    ],
 )
 class ProductCategoriesViewSet(
+    BulkLinkMixin,
     ListProductMixin,
     PerformCreateProductMixin,
     CreateMixin,
     ProductRelationsMixin,
+    AsyncReadMixin,
     drf_mixins.DestroyModelMixin,
     GenericViewSet,
 ):
     model = Product.categories.through
     serializer_class = ProductCategorySerializer
+    pagination_class = KeysetPagination
     serializer_create_class = LinkProductCategorySerializer
+    bulk_serializer_class = BulkLinkProductCategorySerializer
     lookup_field = "category_id"
     filterset_fields = ("category__is_active",)
 
@@ -161,6 +333,13 @@ class ProductCategoriesViewSet(
                 Prefetch(
                     "category__child_categories",
                     queryset=Category.objects.only("id", "parent_category_id"),
-                )
+                ),
+                "category__image__variants",
             )
         )
+
+    def perform_bulk_link(self, product_id, links):
+        super().perform_bulk_link(product_id, links)
+        CategoryClosure.objects.link_product_ancestors(
+            [product_id], [link["category"] for link in links]
+        )
@@ -0,0 +1,191 @@
+"""
+Work done once before a server process takes traffic.
+
+Without it the first requests served after every deploy pay for what
+Django builds lazily: the URL resolvers, the OpenAPI schema with the
+introspection of every serializer behind it, the database and Redis
+connections, and the cached catalog documents. `warm_up` runs each of
+these phases and returns how long they took:
+- `urls` builds the lookups of every URL resolver,
+- `schema` generates the drf-spectacular schema once,
+- `connections` opens a connection to every database and cache,
+- `catalog` requests the `WARMUP_ROUTES` through the WSGI application,
+  which fills the catalog cache for every process sharing it. The cached
+  representations contain absolute URLs, so the requests are sent for the
+  scheme and host of `WARMUP_BASE_URL`, those of the clients.
+    Under gunicorn, see config/gunicorn.py, the master process runs
+`warm_up` before forking the workers, so what the first three phases load
+is shared with them copy-on-write. The connections can't be shared across
+a fork: the master closes its own, and every worker opens new ones with
+`warm_up_connections` before it accepts a connection.
+"""
+import io
+import logging
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.urls import URLResolver, get_resolver, reverse
+from drf_spectacular.generators import SchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+# Catalog reads requested by the warmup, as `(route name, query string)`
+WARMUP_ROUTES = [
+    ("api-root", ""),
+    ("category-tree", ""),
+    ("category-tree", "?is_active=true"),
+    ("category-list", ""),
+    ("product-list", ""),
+    ("product-facets", ""),
+]
+
+
+def warm_up(application=None):
+    """
+    Run every warmup phase against the WSGI `application`, by default the
+    one of `WSGI_APPLICATION`, and return the seconds each phase took.
+    """
+    if application is None:
+        application = get_wsgi_application()
+    # Unlike a failed phase, a missing setting is reported before the
+    # server starts
+    get_warmup_base_url()
+    phases = {
+        "urls": populate_resolvers,
+        "schema": generate_schema,
+        "connections": warm_up_connections,
+        "catalog": lambda: request_catalog(application),
+    }
+    timings = {}
+    for name, phase in phases.items():
+        start = time.perf_counter()
+        try:
+            phase()
+        except Exception:
+            # A failed phase leaves its work to the first requests, it must
+            # not keep the server from starting
+            logger.exception("Warmup phase %s failed", name)
+        timings[name] = round(time.perf_counter() - start, 3)
+    logger.info(
+        "Warmed up in %.3fs (%s)",
+        sum(timings.values()),
+        ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in timings.items()
+        ),
+    )
+    return timings
+
+
+def populate_resolvers(resolver=None):
+    """Build the lookups of `resolver` and of every resolver under it."""
+    resolver = get_resolver() if resolver is None else resolver
+    # Reading the reverse dict populates the resolver, importing the
+    # URLconf modules and the views they route to
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            populate_resolvers(pattern)
+
+
+def generate_schema():
+    """Generate the public schema, as the schema view would."""
+    return SchemaGenerator().get_schema(request=None, public=True)
+
+
+def warm_up_connections():
+    """Open a connection to every database and every cache."""
+    for connection in connections.all():
+        connection.ensure_connection()
+    for cache in caches.all():
+        cache.has_key("warmup")
+
+
+def request_catalog(application):
+    """
+    Send a GET of every `WARMUP_ROUTES` URL to the WSGI `application` and
+    return the status of each one, by URL.
+    """
+    base_url = get_warmup_base_url()
+    statuses = {}
+    for name, params in WARMUP_ROUTES:
+        url = reverse(f"api:{name}") + params
+        statuses[url] = make_wsgi_request(application, url, base_url)()
+        if statuses[url] != 200:
+            logger.warning(
+                "Warmup request of %s returned %s", url, statuses[url]
+            )
+    return statuses
+
+
+def make_wsgi_request(application, url, base_url):
+    """
+    Return a function sending a GET of `url` to the WSGI `application` as
+    a request to `base_url`, reading the whole response and returning its
+    status.
+    """
+    parts = urlsplit(url)
+    base = urlsplit(base_url)
+    default_port = 443 if base.scheme == "https" else 80
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "SERVER_NAME": base.hostname,
+        "SERVER_PORT": str(base.port or default_port),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": base.netloc,
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": base.scheme,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+    def send_request():
+        status = None
+
+        def start_response(response_status, headers, exc_info=None):
+            nonlocal status
+            status = int(response_status.split(" ", 1)[0])
+
+        body = application(
+            {**environ, "wsgi.input": io.BytesIO()}, start_response
+        )
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        return status
+
+    return send_request
+
+
+def get_warmup_base_url():
+    """
+    Return `WARMUP_BASE_URL`, or a local URL while DEBUG is on.
+
+    Raises:
+        ImproperlyConfigured: If the setting is missing or not an http or
+         https URL.
+    """
+    base_url = settings.WARMUP_BASE_URL
+    if not base_url and settings.DEBUG:
+        return "http://localhost"
+    parts = urlsplit(base_url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImproperlyConfigured(
+            "Set WARMUP_BASE_URL to the scheme and host the clients reach "
+            "the site with, e.g. https://shop.example.com."
+        )
+    return base_url
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class TelemetryConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.telemetry"
+
+    def ready(self):
+        from apps.telemetry.metrics import instrument_serializers
+
+        instrument_serializers()
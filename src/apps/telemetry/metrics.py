@@ -0,0 +1,169 @@
+"""
+Counters of the work done while handling a request.
+
+A sampled request gets a `RequestMetrics` instance in `current_metrics`
+for its duration, see `apps.telemetry.middleware`. The hooks below add to
+it when one is set and do nothing else otherwise, so requests that are not
+sampled pay for one context variable lookup per query, cache operation and
+serializer:
+- `record_query` is installed as a database execute wrapper,
+- the pooled database backend adds the time it waited for a connection,
+  see config/postgresql/base.py,
+- `InstrumentedRedisClient` is the django-redis client class of the
+  cache, see `CACHES`,
+- `instrument_serializers` times the outermost `.data` of DRF
+  serializers.
+"""
+import time
+from contextvars import ContextVar
+
+from django_redis.client import DefaultClient
+from rest_framework.serializers import BaseSerializer
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+# Distinguishes a cache miss from a cached `None`
+_MISSING = object()
+
+
+class RequestMetrics:
+    """
+    The work done while handling one request.
+
+    Attributes:
+        queries: The number of SQL statements executed.
+        db_time: The seconds spent executing them, fetching the rows of
+         server-side cursors excluded.
+        pool_wait: The seconds spent waiting for a connection of the
+         database pool.
+        cache_calls: The number of Redis round trips of the cache.
+        cache_hits: The number of keys read from the cache and found.
+        cache_misses: The number of keys read from the cache and not found.
+        serializer_time: The seconds spent building serializer output,
+         the queries of lazy querysets it evaluates included.
+    """
+
+    __slots__ = (
+        "queries",
+        "db_time",
+        "pool_wait",
+        "cache_calls",
+        "cache_hits",
+        "cache_misses",
+        "serializer_time",
+        "serializer_depth",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.cache_calls = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "pool_wait_ms": round(self.pool_wait * 1000, 2),
+            "cache_calls": self.cache_calls,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "serializer_ms": round(self.serializer_time * 1000, 2),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def get_pool_stats(connection):
+    """
+    Return the state of the pool of the database `connection`, None when
+    it is not pooled:
+    - `size`, the connections open or being opened,
+    - `in_use`, the ones given to a thread,
+    - `overflow`, the ones open above the `min_size` of the pool,
+    - `waiting`, the threads waiting for a connection.
+    """
+    pool = getattr(connection, "pool", None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        "size": stats["pool_size"],
+        "in_use": stats["pool_size"] - stats["pool_available"],
+        "overflow": max(stats["pool_size"] - stats["pool_min"], 0),
+        "waiting": stats.get("requests_waiting", 0),
+    }
+
+
+class InstrumentedRedisClient(DefaultClient):
+    """
+    A django-redis client counting the round trips and the hits and misses
+    of the cache.
+
+        Every operation asks `get_client` for a connection once, or is given
+    one by the operation it is part of, so its calls are the round trips.
+    """
+
+    def get_client(self, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.cache_calls += 1
+        return super().get_client(*args, **kwargs)
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _MISSING, version=version, client=client)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None, client=None):
+        found = super().get_many(keys, version=version, client=client)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+def instrument_serializers():
+    """
+    Time the `.data` of every DRF serializer. Nested and list serializers
+    run inside their parent's, so only the outermost one is counted.
+    """
+    data = BaseSerializer.data
+    if getattr(data.fget, "instrumented", False):
+        return
+
+    def timed_data(serializer):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return data.fget(serializer)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - start
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
@@ -0,0 +1,165 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.telemetry.metrics import (
+    RequestMetrics,
+    current_metrics,
+    get_pool_stats,
+    record_query,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """
+    Measure a sample of the requests and report the numbers in a
+    `Server-Timing` header and a log line.
+
+        `SERVER_TIMING_SAMPLE_RATE` of the requests, between 0 and 1, are
+    measured. For those the queries and their time, the Redis round trips
+    and the cache hits and misses, and the serializer time are counted, see
+    `apps.telemetry.metrics`, and reported with the total time as:
+
+        Server-Timing: db;dur=12.5;desc="14 queries",
+            cache;desc="5 calls / 3 hits / 1 misses",
+            serializer;dur=4.1, total;dur=25.3
+
+    When the database is pooled, the time waited for a connection and the
+    state of the pool when the response is ready are added as:
+
+        db-pool;dur=0.2;desc="3 in use / 4 open / 2 overflow / 0 waiting"
+
+    which browsers show in the network panel, and logged to
+    `apps.telemetry.middleware` with the numbers in the `timing` attribute
+    of the record for structured log handlers. Requests that are not
+    sampled only cost a random number.
+        The body of a streaming response is produced after the middleware
+    returns, so the work done while streaming it is not counted.
+        Under ASGI the middleware runs async, and installs the query
+    counter on the connections of the thread the ORM calls of the request
+    run in.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with self.record_queries():
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.report(
+            request, response, metrics, time.perf_counter() - start
+        )
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            # Database connections belong to a thread, the queries of the
+            # request run in the one of its `sync_to_async` calls
+            queries = await sync_to_async(self.record_queries)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(queries.close)()
+        finally:
+            current_metrics.reset(token)
+        return self.report(
+            request, response, metrics, time.perf_counter() - start
+        )
+
+    @staticmethod
+    def is_sampled():
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    @staticmethod
+    def record_queries():
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record_query))
+        return stack
+
+    def report(self, request, response, metrics, total):
+        pool = get_pool_stats(connections[DEFAULT_DB_ALIAS])
+        response["Server-Timing"] = self.format_header(metrics, total, pool)
+        logger.info(
+            "%s %s %s queries=%d db_ms=%.1f pool_wait_ms=%.1f cache_calls=%d "
+            "cache_hits=%d cache_misses=%d serializer_ms=%.1f total_ms=%.1f",
+            request.method,
+            request.path,
+            response.status_code,
+            metrics.queries,
+            metrics.db_time * 1000,
+            metrics.pool_wait * 1000,
+            metrics.cache_calls,
+            metrics.cache_hits,
+            metrics.cache_misses,
+            metrics.serializer_time * 1000,
+            total * 1000,
+            extra={
+                "timing": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    **metrics.as_dict(),
+                    "pool": pool,
+                    "total_ms": round(total * 1000, 2),
+                }
+            },
+        )
+        return response
+
+    @staticmethod
+    def format_header(metrics, total, pool=None):
+        entries = [
+            f"db;dur={metrics.db_time * 1000:.1f};"
+            f'desc="{metrics.queries} queries"',
+        ]
+        if pool is not None:
+            description = (
+                "{in_use} in use / {size} open / {overflow} overflow / "
+                "{waiting} waiting".format(**pool)
+            )
+            entries.append(
+                f"db-pool;dur={metrics.pool_wait * 1000:.1f};"
+                f'desc="{description}"'
+            )
+        entries += [
+            f'cache;desc="{metrics.cache_calls} calls / '
+            f'{metrics.cache_hits} hits / {metrics.cache_misses} misses"',
+            f"serializer;dur={metrics.serializer_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ]
+        return ", ".join(entries)
@@ -0,0 +1,129 @@
+import logging
+import re
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.products.models import Product
+from apps.telemetry.metrics import RequestMetrics
+from apps.telemetry.middleware import ServerTimingMiddleware
+
+
+def parse_server_timing(header):
+    """Return a `{name: {param: value}}` mapping of a Server-Timing header."""
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = {}
+        for param in params:
+            key, value = param.split("=", 1)
+            metrics[name][key] = value.strip('"')
+    return metrics
+
+
+@pytest.mark.django_db
+class TestServerTimingMiddleware:
+    @pytest.fixture(autouse=True)
+    def sample_every_request(self, settings):
+        settings.SERVER_TIMING_SAMPLE_RATE = 1
+
+    def test_unsampled_request_has_no_header(self, api_client, settings):
+        settings.SERVER_TIMING_SAMPLE_RATE = 0
+
+        response = api_client.get(reverse("products:size-list"))
+
+        assert "Server-Timing" not in response
+
+    def test_reports_queries_and_serializer_time(
+        self, api_client, products_with_associations
+    ):
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(
+                reverse("products:product-list"), {"render": "db"}
+            )
+        timing = parse_server_timing(response["Server-Timing"])
+
+        assert timing["db"]["desc"] == f"{len(context)} queries"
+        assert float(timing["total"]["dur"]) >= float(timing["db"]["dur"])
+
+        response = api_client.get(reverse("products:size-list"))
+        timing = parse_server_timing(response["Server-Timing"])
+        assert float(timing["serializer"]["dur"]) > 0
+
+    @pytest.mark.usefixtures("clear_cache")
+    def test_reports_cache_hits_and_misses(self, api_client, product):
+        url = reverse("products:product-detail", kwargs={"pk": product.id})
+        api_client.get(url)
+
+        response = api_client.get(url)
+        timing = parse_server_timing(response["Server-Timing"])
+
+        assert timing["db"]["desc"] == "0 queries"
+        assert re.fullmatch(
+            r"[1-9]\d* calls / [1-9]\d* hits / 0 misses",
+            timing["cache"]["desc"],
+        )
+
+    def test_reports_the_database_pool(self, api_client):
+        response = api_client.get(reverse("products:size-list"))
+        timing = parse_server_timing(response["Server-Timing"])
+
+        assert float(timing["db-pool"]["dur"]) >= 0
+        assert re.fullmatch(
+            r"[1-9]\d* in use / [1-9]\d* open / \d+ overflow / 0 waiting",
+            timing["db-pool"]["desc"],
+        )
+
+    def test_logs_structured_timing(self, api_client, caplog):
+        with caplog.at_level(logging.INFO, logger="apps.telemetry"):
+            api_client.get(reverse("products:size-list"))
+
+        (record,) = caplog.records
+        assert record.timing["path"] == reverse("products:size-list")
+        assert record.timing["status"] == 200
+        assert {"queries", "db_ms", "cache_hits", "total_ms"} <= set(
+            record.timing
+        )
+        assert record.timing["pool"]["in_use"] >= 1
+
+    def test_measures_async_requests(self, product):
+        async def get_response(request):
+            await sync_to_async(Product.objects.count)()
+            return HttpResponse()
+
+        middleware = ServerTimingMiddleware(get_response)
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+        assert iscoroutinefunction(middleware)
+        timing = parse_server_timing(response["Server-Timing"])
+        assert timing["db"]["desc"] == "1 queries"
+
+    def test_format_header(self):
+        metrics = RequestMetrics()
+        metrics.queries = 3
+        metrics.db_time = 0.0042
+        metrics.cache_calls = 2
+        metrics.cache_hits = 1
+        metrics.cache_misses = 1
+        metrics.serializer_time = 0.001
+
+        header = ServerTimingMiddleware.format_header(metrics, 0.01)
+
+        assert header == (
+            'db;dur=4.2;desc="3 queries", '
+            'cache;desc="2 calls / 1 hits / 1 misses", '
+            "serializer;dur=1.0, total;dur=10.0"
+        )
+
+        pool = {"size": 4, "in_use": 3, "overflow": 2, "waiting": 1}
+        metrics.pool_wait = 0.0005
+        header = ServerTimingMiddleware.format_header(metrics, 0.01, pool)
+
+        assert header.split(", ")[1] == (
+            'db-pool;dur=0.5;desc="3 in use / 4 open / 2 overflow / 1 waiting"'
+        )
@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+
+from apps.telemetry.metrics import (
+    RequestMetrics,
+    current_metrics,
+    get_pool_stats,
+)
+from config.postgresql import base
+from config.postgresql.base import DatabaseWrapper
+
+
+@pytest.fixture
+def other_connection(db):
+    """A second connection to the test database, outside its transaction."""
+    other = connections.create_connection("default")
+    yield other
+    other.close()
+
+
+@pytest.mark.django_db
+class TestPooledDatabase:
+    def test_connection_comes_from_the_pool(self):
+        connection.ensure_connection()
+
+        assert connection.connection._pool is connection.pool
+        assert get_pool_stats(connection)["in_use"] >= 1
+
+    def test_closing_gives_the_connection_back(self, other_connection):
+        other_connection.ensure_connection()
+        in_use = get_pool_stats(connection)["in_use"]
+
+        other_connection.close()
+
+        assert other_connection.connection is None
+        assert get_pool_stats(connection)["in_use"] == in_use - 1
+        with other_connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            assert cursor.fetchone() == (1,)
+
+    def test_waiting_for_a_connection_is_measured(self, other_connection):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            other_connection.ensure_connection()
+        finally:
+            current_metrics.reset(token)
+
+        assert metrics.pool_wait > 0
+
+    def test_forked_process_opens_its_own_pool(self, monkeypatch):
+        pool = connection.pool
+        monkeypatch.setattr(base.os, "getpid", lambda: -1)
+        try:
+            assert connection.pool is not pool
+        finally:
+            connection.close_pool()
+        monkeypatch.undo()
+        assert connection.pool is pool
+
+    def test_persistent_connections_are_refused(self):
+        pooled = DatabaseWrapper(
+            {**connection.settings_dict, "CONN_MAX_AGE": 60}, alias="default"
+        )
+
+        with pytest.raises(ImproperlyConfigured):
+            pooled.pool
+
+    def test_pool_can_be_turned_off(self):
+        settings_dict = {**connection.settings_dict}
+        settings_dict["OPTIONS"] = {**settings_dict["OPTIONS"], "pool": None}
+        unpooled = DatabaseWrapper(settings_dict, alias="default")
+
+        assert unpooled.pool is None
+        assert get_pool_stats(unpooled) is None
+        unpooled.ensure_connection()
+        try:
+            assert getattr(unpooled.connection, "_pool", None) is None
+        finally:
+            unpooled.close()
+
+
+@pytest.mark.parametrize(
+    "command_timeout, statement_timeout",
+    [(None, "0"), ("600000", "600000")],
+)
+def test_commands_lift_the_statement_timeout(
+    command_timeout, statement_timeout
+):
+    env = {**os.environ, "DJANGO_DB_STATEMENT_TIMEOUT": "30000"}
+    if command_timeout is not None:
+        env["DJANGO_COMMAND_STATEMENT_TIMEOUT"] = command_timeout
+    code = (
+        "from django.conf import settings; "
+        "print(settings.DATABASES['default']['OPTIONS']['options'])"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "manage.py", "shell", "-c", code],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == (
+        f"-c statement_timeout={statement_timeout}"
+    )
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# The catalog reads are served by async views, see AsyncReadMixin
+os.environ.setdefault("DJANGO_ASYNC_READ_VIEWS", "true")
 
 application = get_asgi_application()
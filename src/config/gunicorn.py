@@ -0,0 +1,82 @@
+"""
+gunicorn configuration of the production server.
+
+    gunicorn --config config/gunicorn.py config.wsgi
+
+The master process loads Django and warms it up, see
+apps/products/warmup.py, before it listens and forks the workers. They
+start with the imported modules, the URL resolvers and the schema already
+built, and share them copy-on-write. Every worker then opens its own
+database and Redis connections before it accepts a connection.
+
+Options given on the command line or in `GUNICORN_CMD_ARGS` override the
+ones below. For more information on this file, see
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+import gc
+import os
+
+
+def get_cpu_count():
+    """
+    Return the number of cores the server may run on: the ones it is
+    pinned to, fewer when the container has a CPU quota (cgroup v2).
+    """
+    count = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+    except (OSError, ValueError):
+        return count
+    if quota == "max":
+        return count
+    return max(1, min(count, -(-int(quota) // int(period))))
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# The usual 2 workers per core plus one, one process waits on the database
+# or Redis while another one runs
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or 2 * get_cpu_count() + 1
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = True
+# Workers are replaced after that many requests, forked from the warm
+# master, so a leak in one of them can't grow forever
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = timeout
+keepalive = 5
+# The heartbeat file of the workers, on a disk-backed /tmp a slow write
+# can get a worker killed
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+accesslog = "-"
+
+
+def on_starting(server):
+    """
+    Warm up the preloaded application in the master, before it listens and
+    forks the workers. Its handler of SIGCHLD isn't installed yet either,
+    which would reap the processes started by the warmup.
+    """
+    from django.db import connections
+
+    from apps.products.warmup import warm_up
+    from config.postgresql.base import close_pools
+
+    warm_up(server.app.wsgi())
+    # A connection can't be shared with the forked workers, which open
+    # their own pool
+    connections.close_all()
+    close_pools()
+    # Moves what is loaded so far out of the collections of the garbage
+    # collector, which would otherwise write to the shared pages of every
+    # object it goes through in the workers
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Open the connections of the worker before it accepts one."""
+    from apps.products.warmup import warm_up_connections
+
+    warm_up_connections()
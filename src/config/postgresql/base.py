@@ -0,0 +1,150 @@
+"""
+PostgreSQL backend handing out the connections of a psycopg pool.
+
+Django opens a connection when a request runs its first query and closes
+it when the request finishes. With `OPTIONS["pool"]` set this backend
+takes the connection from a `psycopg_pool.ConnectionPool` instead, and
+gives it back when Django would close it, so a request no longer pays for
+the connection setup. The pool options are passed to `ConnectionPool`:
+- `min_size` connections are kept open, up to `max_size` are opened under
+  load and the ones above `min_size` are closed after `max_idle` seconds,
+- a request waits at most `timeout` seconds for a connection before
+  `PoolTimeout` is raised,
+- with `CONN_HEALTH_CHECKS` a connection is checked before it is handed
+  out, and replaced when the server went away.
+    A pool belongs to the process that opened it: a forked process opens
+its own rather than sharing the sockets of its parent. The time a request
+waits for a connection and the state of the pool are reported with the
+request metrics, see `apps.telemetry.metrics`.
+    Django 5.1 comes with the same option, this backend can be dropped
+for the stock one after the upgrade.
+"""
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+from apps.telemetry.metrics import current_metrics
+
+# Open pools by process, database alias and database name
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools():
+    """
+    Close every pool of the current process, e.g. before forking workers
+    that must not share its connections.
+    """
+    with _pools_lock:
+        for key in [key for key in _pools if key[0] == os.getpid()]:
+            _pools.pop(key).close()
+
+
+class PooledDatabaseCreation(DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Connections left in the pool would keep the test database from
+        # being dropped
+        self.connection.close_pool()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = PooledDatabaseCreation
+
+    @property
+    def pool(self):
+        """Return the pool of the database, or None when not pooled."""
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        if self.settings_dict["CONN_MAX_AGE"]:
+            raise ImproperlyConfigured(
+                "A pooled database can't keep its connections, "
+                "CONN_MAX_AGE must be 0."
+            )
+        key = (os.getpid(), self.alias, self.settings_dict["NAME"])
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+        with _pools_lock:
+            if key not in _pools:
+                pool = ConnectionPool(
+                    kwargs={
+                        **self.get_connection_params(),
+                        # Django sets autocommit when it gets the connection
+                        "autocommit": True,
+                    },
+                    check=(
+                        ConnectionPool.check_connection
+                        if self.settings_dict["CONN_HEALTH_CHECKS"]
+                        else None
+                    ),
+                    name=f"{self.alias}:{self.settings_dict['NAME']}",
+                    open=True,
+                    **({} if options is True else options),
+                )
+                try:
+                    # Rather than opening one more connection for the one
+                    # asked for while the pool is filled to `min_size`
+                    pool.wait(pool.timeout)
+                except PoolTimeout:
+                    pool.close()
+                    raise
+                _pools[key] = pool
+            return _pools[key]
+
+    def close_pool(self):
+        """Close the pools of the database opened by the current process."""
+        with _pools_lock:
+            for key in list(_pools):
+                if key[:2] == (os.getpid(), self.alias):
+                    _pools.pop(key).close()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        try:
+            self.isolation_level = IsolationLevel(
+                IsolationLevel.READ_COMMITTED
+                if isolation_level is None
+                else isolation_level
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {isolation_level} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+        start = time.perf_counter()
+        connection = pool.getconn()
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.pool_wait += time.perf_counter() - start
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        pool = getattr(self.connection, "_pool", None)
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+        # Back in the pool, the connection may already be someone else's
+        self.connection = None
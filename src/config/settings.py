@@ -44,7 +44,12 @@ if DEBUG:
         'cachalot.panels.CachalotPanel',
     ]
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=[])
+# The scheme and host the clients reach the site with, e.g.
+# https://shop.example.com. The warmup requests the catalog with them, as
+# the cached representations contain absolute URLs, see
+# apps/products/warmup.py. Required unless DEBUG is on.
+WARMUP_BASE_URL = env('DJANGO_WARMUP_BASE_URL', default='')
 
 
 # Application definition
@@ -56,6 +61,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework.authtoken',
@@ -68,10 +74,11 @@ INSTALLED_APPS = [
 
     'apps.products',
     'apps.jwt_auth',
+    'apps.telemetry',
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'apps.telemetry.middleware.ServerTimingMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -113,12 +120,42 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # ------------------------------------------------------------------------------
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # The stock backend taking its connections from a psycopg pool, see
+        # config/postgresql/base.py
+        'ENGINE': 'config.postgresql',
         'NAME': env('POSTGRES_DB'),
         'USER': env('POSTGRES_USER'),
         'PASSWORD': env('POSTGRES_PASSWORD'),
         'HOST': env('POSTGRES_HOST'),
         'PORT': env('POSTGRES_PORT'),
+        # Seconds a connection is kept between requests when the pool is
+        # turned off, e.g. behind PgBouncer
+        'CONN_MAX_AGE': env.int('DJANGO_CONN_MAX_AGE', 0),
+        # A connection is checked before it is used
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Connections of each process. The async views run up to
+            # ASYNC_READ_CONCURRENCY queries at once, each on its own.
+            'pool': {
+                'min_size': env.int('DJANGO_DB_POOL_MIN_SIZE', 1),
+                'max_size': env.int('DJANGO_DB_POOL_MAX_SIZE', 32),
+                # Seconds a request waits for a connection before failing
+                'timeout': env.float('DJANGO_DB_POOL_TIMEOUT', 10.0),
+            } if env.bool('DJANGO_DB_POOL', True) else None,
+            # Statements of the requests running longer are cancelled, in
+            # milliseconds. The commands run by manage.py, migrate among
+            # them, use DJANGO_COMMAND_STATEMENT_TIMEOUT, by default none.
+            'options': '-c statement_timeout={}'.format(
+                env.int('DJANGO_DB_STATEMENT_TIMEOUT', 30000)
+            ),
+            # Parameters are sent apart from the query, and a query run 5
+            # times on a connection is prepared. Turn off behind PgBouncer
+            # in transaction mode, its connections change under a session.
+            'server_side_binding': env.bool('DJANGO_DB_PREPARED_STATEMENTS', True),
+            'prepare_threshold': (
+                5 if env.bool('DJANGO_DB_PREPARED_STATEMENTS', True) else None
+            ),
+        },
     }
 }
 
@@ -129,7 +166,8 @@ CACHES = {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": env("REDIS_URL"),
         "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Counts the calls, hits and misses, see apps/telemetry/metrics.py
+            "CLIENT_CLASS": "apps.telemetry.metrics.InstrumentedRedisClient",
             # Mimicing memcache behavior.
             # https://github.com/jazzband/django-redis#memcached-exceptions-behavior
             "IGNORE_EXCEPTIONS": True,
@@ -177,6 +215,40 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
 
+# Hash uploads while they are received, see apps/products/storage.py
+FILE_UPLOAD_HANDLERS = [
+    'apps.products.storage.HashingMemoryFileUploadHandler',
+    'apps.products.storage.HashingTemporaryFileUploadHandler',
+]
+
+# Deleted media files are removed after the commit by a background thread,
+# see apps/products/cleanup.py
+FILE_CLEANUP_IN_BACKGROUND = env.bool('FILE_CLEANUP_IN_BACKGROUND', True)
+FILE_CLEANUP_BATCH_SIZE = 500
+
+# Bounds of the price buckets counted by /api/products/facets/, see
+# apps/products/facets.py
+PRODUCT_PRICE_BUCKETS = [1000, 2000, 3000, 5000, 10000]
+
+# Resized copies of uploaded images, see apps/products/variants.py
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = 80
+# Processes rendering the variants in the background, 0 renders them inline
+IMAGE_VARIANT_WORKERS = env.int('IMAGE_VARIANT_WORKERS', 2)
+
+# Share of the requests measured and reported in a Server-Timing header and
+# a log line, see apps/telemetry/middleware.py
+SERVER_TIMING_SAMPLE_RATE = env.float('SERVER_TIMING_SAMPLE_RATE', 0.0)
+
+# Serve the catalog reads with async views, see AsyncReadMixin in
+# apps/products/mixins.py. Turned on by config/asgi.py, under WSGI async
+# views only add an event loop per request.
+ASYNC_READ_VIEWS = env.bool('DJANGO_ASYNC_READ_VIEWS', False)
+# Reads handled at once by the async views, each with its own database
+# connection, and size of their Redis connection pool
+ASYNC_READ_CONCURRENCY = env.int('DJANGO_ASYNC_READ_CONCURRENCY', 32)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -191,7 +263,7 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'dj_rest_auth.jwt_auth.JWTCookieAuthentication',
+        'apps.jwt_auth.authentication.CachedJWTCookieAuthentication',
     )
 }
 
@@ -206,16 +278,36 @@ REST_AUTH = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(weeks=1),
+    # A refresh hands out a new refresh token and revokes the one it was
+    # given, in Redis rather than in the token_blacklist tables, see
+    # apps/jwt_auth/token_store.py
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Users of the access tokens cached in Redis, no longer than the lifetime
+# of an access token, and for a few seconds in the process, see
+# apps/jwt_auth/user_cache.py
+JWT_USER_CACHE_TIMEOUT = env.int('DJANGO_JWT_USER_CACHE_TIMEOUT', 60 * 30)
+JWT_USER_LOCAL_CACHE_TIMEOUT = env.float(
+    'DJANGO_JWT_USER_LOCAL_CACHE_TIMEOUT', 5.0
+)
+JWT_USER_LOCAL_CACHE_SIZE = env.int('DJANGO_JWT_USER_LOCAL_CACHE_SIZE', 1024)
+
 SPECTACULAR_SETTINGS = {
     'OAS_VERSION': '3.1.0',
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
+# The pooled PostgreSQL backend, see DATABASES
+CACHALOT_ADDITIONAL_SUPPORTED_DATABASES = {'config.postgresql'}
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000'
 ]
 
 if DEBUG:
     INTERNAL_IPS = type('c', (), {'__contains__': lambda *a: True})()
+    # Only in debug: the toolbar middleware is synchronous, and would have
+    # the whole stack below it run in a thread under ASGI
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
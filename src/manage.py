@@ -7,6 +7,12 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    if sys.argv[1:2] != ["runserver"]:
+        # Migrations and batch commands may take longer than the statement
+        # timeout of the requests, see config/settings.py
+        os.environ["DJANGO_DB_STATEMENT_TIMEOUT"] = os.environ.get(
+            "DJANGO_COMMAND_STATEMENT_TIMEOUT", "0"
+        )
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: